@@ -1,29 +1,117 @@
 import os
+import atexit
+import bisect
+import functools
 import json
-import pandas as pd
+import hashlib
+import importlib
 import logging
+import numbers
 import subprocess
 import re
-from datetime import datetime
+import queue
+import shutil
+import tempfile
+import threading
+import unicodedata
+import uuid
+import zipfile
+from collections import Counter, deque, namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from flask import Flask, render_template, request, jsonify, send_from_directory
 from flask_socketio import SocketIO
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import Select
 import time
 from werkzeug.utils import secure_filename
 
+
+# ========= IMPORTAÇÕES SOB DEMANDA =========
+# pandas/numpy, Selenium e pypdf (processamento_pdf) só são importados no primeiro uso,
+# para que o servidor suba e responda às rotas simples (/status_arquivos, /get_parcerias,
+# /verificar_chromedriver) sem carregar os módulos de uma execução do robô
+class ModuloTardio:
+    def __init__(self, modulo, atributo=None):
+        self._modulo = modulo
+        self._atributo = atributo
+        self._alvo = None
+        self._lock = threading.Lock()
+
+    def _carregar(self):
+        if self._alvo is None:
+            with self._lock:
+                if self._alvo is None:
+                    alvo = importlib.import_module(self._modulo)
+                    self._alvo = getattr(alvo, self._atributo) if self._atributo else alvo
+        return self._alvo
+
+    def __getattr__(self, nome):
+        return getattr(self._carregar(), nome)
+
+    def __call__(self, *args, **kwargs):
+        return self._carregar()(*args, **kwargs)
+
+    def __repr__(self):
+        estado = "carregado" if self._alvo is not None else "não carregado"
+        return f"<ModuloTardio {self._modulo}{'.' + self._atributo if self._atributo else ''} ({estado})>"
+
+np = ModuloTardio("numpy")
+pd = ModuloTardio("pandas")
+webdriver = ModuloTardio("selenium.webdriver")
+By = ModuloTardio("selenium.webdriver.common.by", "By")
+Keys = ModuloTardio("selenium.webdriver.common.keys", "Keys")
+Service = ModuloTardio("selenium.webdriver.chrome.service", "Service")
+WebDriverWait = ModuloTardio("selenium.webdriver.support.ui", "WebDriverWait")
+EC = ModuloTardio("selenium.webdriver.support.expected_conditions")
+Select = ModuloTardio("selenium.webdriver.support.ui", "Select")
+processamento_pdf = ModuloTardio("processamento_pdf")
+
 # ========= CONFIGURAÇÃO =========
 # Alterar para `True` para rodar headless, `False` para rodar com navegador visível
 HEADLESS_MODE = True
 
+# Caminho do ChromeDriver
+CAMINHO_CHROMEDRIVER = "chromedriver.exe"
+
 # Tempo máximo de espera para elementos (em segundos)
 TIMEOUT = 15
 
+# Limite (em segundos) das esperas por sinais de prontidão da página.
+# Antes eram sleeps fixos; agora só se espera tudo isso quando o sinal não aparece
+LIMITE_ESPERA = 3
+
+# Intervalo de verificação das esperas (em segundos)
+INTERVALO_ESPERA = 0.1
+
+# Manter navegadores já logados abertos entre execuções para reaproveitar a sessão
+MANTER_SESSOES = True
+
+# Quantidade máxima de navegadores ociosos mantidos e tempo máximo ocioso (em segundos)
+MAX_SESSOES_OCIOSAS = 4
+SESSAO_OCIOSA_MAX = 30 * 60
+
+# Preencher os campos do modal de desembolso com um único execute_script
+# (`False` volta ao preenchimento campo a campo com send_keys)
+PREENCHIMENTO_EM_LOTE = True
+
+# Modo enxuto do navegador: bloqueia imagens, fontes, mídia e scripts de terceiros,
+# não espera o carregamento completo da página (estratégia "eager"), desliga extensões e
+# tráfego em segundo plano e reaproveita perfil/cache em disco. Desligado por padrão: liga-se
+# por execução (`"modo_enxuto": true` no payload) ou para todas em config.json
+MODO_ENXUTO = False
+
+# Pasta dos perfis do Chrome no modo enxuto (um por navegador aberto ao mesmo tempo)
+PASTA_PERFIS = "perfis_navegador"
+
+# Padrões de URL bloqueados no modo enxuto (Network.setBlockedURLs do DevTools)
+URLS_BLOQUEADAS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.ico", "*.svg",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.mp3",
+    "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+    "*hotjar.com*", "*facebook.net*", "*fonts.googleapis.com*", "*fonts.gstatic.com*"
+]
+
 # Configuração do Flask
 app = Flask(__name__)
 socketio = SocketIO(app)
@@ -31,15 +119,60 @@ socketio = SocketIO(app)
 # Configurar diretórios
 diretorio = "arquivos"
 log_dir = "logs"
-if not os.path.exists(log_dir):
-    os.makedirs(log_dir)
-if not os.path.exists(diretorio):
-    os.makedirs(diretorio)
+
+# Espaços de trabalho: cada um tem sua planilha, seus PDFs e suas execuções.
+# O espaço padrão usa a planilha.xlsx e a pasta arquivos/ do diretório atual
+ESPACO_PADRAO = "padrao"
+PASTA_ESPACOS = "espacos"
 
 # Configurar o arquivo de log
+# Nível mínimo gravado (DEBUG inclui o detalhe de cada PDF analisado na busca de arquivos)
+NIVEL_LOG = os.environ.get("ROBO_NIVEL_LOG", "INFO").upper()
+# Rotação: tamanho máximo de cada arquivo, quantidade de arquivos por início e dias de retenção em logs/
+LOG_TAMANHO_MAXIMO = 10 * 1024 * 1024
+LOG_ARQUIVOS_ROTACAO = 5
+LOG_DIAS_RETENCAO = 30
+
 log_filename = datetime.now().strftime("%Y%m%d_%H%M%S") + ".log"
 log_path = os.path.join(log_dir, log_filename)
-logging.basicConfig(filename=log_path, level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Cada linha do log é um objeto JSON (ts, nivel, msg), fácil de filtrar sem interpretar texto livre
+class FormatadorJson(logging.Formatter):
+    def format(self, record):
+        return json.dumps({
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "nivel": record.levelname,
+            "thread": record.threadName,
+            "msg": record.getMessage()
+        }, ensure_ascii=False)
+
+# Função para apagar logs de inícios antigos (os diários de execução não são apagados)
+def limpar_logs_antigos(dias=LOG_DIAS_RETENCAO):
+    limite = time.time() - dias * 86400
+    for nome in os.listdir(log_dir):
+        caminho = os.path.join(log_dir, nome)
+        if not re.match(r"^\d{8}_\d{6}(\.log(\.\d+)?|_(tempos|lote)_\d{6}\.json)$", nome):
+            continue
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError:
+            pass
+
+# Função para configurar o log: as chamadas só enfileiram o registro e uma thread grava no arquivo
+def configurar_log():
+    manipulador_arquivo = RotatingFileHandler(log_path, maxBytes=LOG_TAMANHO_MAXIMO, backupCount=LOG_ARQUIVOS_ROTACAO, encoding="utf-8")
+    manipulador_arquivo.setFormatter(FormatadorJson())
+
+    fila_log = queue.SimpleQueue()
+    ouvinte = QueueListener(fila_log, manipulador_arquivo, respect_handler_level=True)
+    raiz = logging.getLogger()
+    raiz.setLevel(getattr(logging, NIVEL_LOG, logging.INFO))
+    raiz.addHandler(QueueHandler(fila_log))
+    ouvinte.start()
+    atexit.register(ouvinte.stop)  # Grava o que ainda estiver na fila ao encerrar
+
+    limpar_logs_antigos()
 
 # Configurações de upload
 ALLOWED_EXTENSIONS = {
@@ -52,13 +185,290 @@ def allowed_file(filename, file_type):
 
 # Função para registrar logs e enviar ao frontend
 def log_and_emit(message, level="info"):
-    if level == "info":
+    if level == "debug":
+        logging.debug(message)
+    elif level == "info":
         logging.info(message)
     elif level == "warning":
         logging.warning(message)
     elif level == "error":
         logging.error(message)
 
+# ========= MÉTRICAS DE TEMPO =========
+# Limites dos buckets dos histogramas (em segundos)
+BUCKETS_METRICAS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Histogramas acumulados desde o início do servidor, expostos em /metrics
+class Metricas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histogramas = {}  # (tipo, etapa) -> {buckets, soma, contagem}
+        self._contadores = {}  # (nome, rótulo) -> valor
+
+    def registrar(self, tipo, etapa, segundos):
+        with self._lock:
+            hist = self._histogramas.get((tipo, etapa))
+            if hist is None:
+                hist = {"buckets": [0] * len(BUCKETS_METRICAS), "soma": 0.0, "contagem": 0}
+                self._histogramas[(tipo, etapa)] = hist
+            for i, limite in enumerate(BUCKETS_METRICAS):
+                if segundos <= limite:
+                    hist["buckets"][i] += 1
+            hist["soma"] += segundos
+            hist["contagem"] += 1
+
+    def contar(self, nome, rotulo, quantidade=1):
+        with self._lock:
+            self._contadores[(nome, rotulo)] = self._contadores.get((nome, rotulo), 0) + quantidade
+
+    def prometheus(self):
+        def escapar(valor):
+            return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        linhas = [
+            "# HELP robo_etapa_segundos Duração das etapas do robô (interações com o navegador, esperas e registros)",
+            "# TYPE robo_etapa_segundos histogram"
+        ]
+        with self._lock:
+            for (tipo, etapa), hist in sorted(self._histogramas.items()):
+                rotulos = f'tipo="{escapar(tipo)}",etapa="{escapar(etapa)}"'
+                for limite, quantidade in zip(BUCKETS_METRICAS, hist["buckets"]):
+                    linhas.append(f'robo_etapa_segundos_bucket{{{rotulos},le="{limite}"}} {quantidade}')
+                linhas.append(f'robo_etapa_segundos_bucket{{{rotulos},le="+Inf"}} {hist["contagem"]}')
+                linhas.append(f"robo_etapa_segundos_sum{{{rotulos}}} {hist['soma']:.6f}")
+                linhas.append(f"robo_etapa_segundos_count{{{rotulos}}} {hist['contagem']}")
+
+            nomes = sorted({nome for nome, _ in self._contadores})
+            for nome in nomes:
+                linhas.append(f"# TYPE robo_{nome}_total counter")
+                for (n, rotulo), valor in sorted(self._contadores.items()):
+                    if n == nome:
+                        linhas.append(f'robo_{nome}_total{{status="{escapar(rotulo)}"}} {valor}')
+        return "\n".join(linhas) + "\n"
+
+metricas = Metricas()
+
+# Tempos brutos de uma execução, para o resumo gravado ao lado do log
+class ColetorTempos:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tempos = {}  # (tipo, etapa) -> [segundos]
+        self._limites = {}  # etapa de espera -> vezes em que o limite foi atingido
+
+    def registrar(self, tipo, etapa, segundos):
+        with self._lock:
+            self._tempos.setdefault((tipo, etapa), []).append(segundos)
+
+    def contar_limite(self, etapa):
+        with self._lock:
+            self._limites[etapa] = self._limites.get(etapa, 0) + 1
+
+    # Esperas desta execução (média por etapa)
+    def esperas(self):
+        with self._lock:
+            itens = [(etapa, list(valores)) for (tipo, etapa), valores in sorted(self._tempos.items()) if tipo == "espera"]
+            limites = dict(self._limites)
+        return {
+            etapa: {
+                "media": round(sum(valores) / len(valores), 3),
+                "maximo": round(max(valores), 3),
+                "contagem": len(valores),
+                "limite_atingido": limites.get(etapa, 0)
+            }
+            for etapa, valores in itens
+        }
+
+    def resumo(self):
+        with self._lock:
+            itens = sorted(self._tempos.items())
+        resumo = []
+        for (tipo, etapa), valores in itens:
+            ordenados = sorted(valores)
+            resumo.append({
+                "tipo": tipo,
+                "etapa": etapa,
+                "contagem": len(ordenados),
+                "total": round(sum(ordenados), 3),
+                "media": round(sum(ordenados) / len(ordenados), 3),
+                "p50": round(ordenados[int(0.50 * (len(ordenados) - 1))], 3),
+                "p95": round(ordenados[int(0.95 * (len(ordenados) - 1))], 3),
+                "maximo": round(ordenados[-1], 3)
+            })
+        return resumo
+
+# Coletor da execução em andamento no thread atual (definido por cada worker)
+_contexto_execucao = threading.local()
+
+# Função para registrar a duração de uma etapa nas métricas globais e no coletor da execução
+def registrar_tempo(tipo, etapa, segundos):
+    metricas.registrar(tipo, etapa, segundos)
+    coletor = getattr(_contexto_execucao, "coletor", None)
+    if coletor is not None:
+        coletor.registrar(tipo, etapa, segundos)
+
+# Mede a duração do bloco: `with medir("upload", "envio do arquivo"): ...`
+@contextmanager
+def medir(tipo, etapa):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registrar_tempo(tipo, etapa, time.perf_counter() - inicio)
+
+# Decorador para medir uma função; o rótulo é fixo ou o argumento na posição indicada
+def medido(tipo, rotulo=None, posicao_rotulo=None):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            etapa = rotulo if rotulo is not None else args[posicao_rotulo]
+            with medir(tipo, etapa):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+# ========= CANAL DE PROGRESSO =========
+# Intervalo entre envios do evento "progresso" (em segundos) e tamanho do histórico para reconexões
+INTERVALO_PROGRESSO = 0.5
+TAMANHO_BUFFER_PROGRESSO = 500
+# Mensagens acumuladas entre dois envios; o excedente é contado em "omitidas"
+MAX_MENSAGENS_LOTE = 50
+
+# Agrega o progresso da execução e envia um único evento "progresso" por intervalo,
+# independentemente de quantos workers estejam gravando; cada envio fica num buffer
+# circular para que clientes conectados depois (ou reconectados) recuperem o histórico
+class CanalProgresso:
+    def __init__(self, intervalo=INTERVALO_PROGRESSO, tamanho_buffer=TAMANHO_BUFFER_PROGRESSO, espaco=ESPACO_PADRAO):
+        self.intervalo = intervalo
+        self.espaco = espaco
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=tamanho_buffer)
+        self._seq = 0
+        self._estado = {}
+        self._mensagens = []
+        self._omitidas = 0
+        self._pendente = False
+        self._thread = None
+
+    def iniciar(self, job_id, total):
+        with self._lock:
+            self._estado = {
+                "job_id": job_id,
+                "status": "executando",
+                "total": total,
+                "processados": 0,
+                "por_status": {},
+                "atual": None,
+                "ultimo_erro": None,
+                "inicio": time.time()
+            }
+            self._pendente = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._enviar_periodicamente, daemon=True)
+                self._thread.start()
+
+    def linha_iniciada(self, worker, nome):
+        with self._lock:
+            self._estado["atual"] = {"worker": worker, "nome": str(nome)}
+            self._pendente = True
+
+    def linha_concluida(self, worker, nome, status, erro=None):
+        with self._lock:
+            self._estado["processados"] = self._estado.get("processados", 0) + 1
+            por_status = self._estado.setdefault("por_status", {})
+            por_status[status] = por_status.get(status, 0) + 1
+            if erro:
+                self._estado["ultimo_erro"] = {"worker": worker, "nome": str(nome), "erro": erro}
+            self._pendente = True
+
+    def mensagem(self, texto, nivel="info", imediata=False):
+        with self._lock:
+            if len(self._mensagens) < MAX_MENSAGENS_LOTE:
+                self._mensagens.append({"nivel": nivel, "texto": texto})
+            else:
+                self._omitidas += 1
+            if nivel == "error" and self._estado:
+                self._estado["ultimo_erro"] = {"worker": None, "nome": None, "erro": texto}
+            self._pendente = True
+        if imediata:
+            self.enviar()  # Mensagens das rotas (fora de uma execução) não esperam o próximo intervalo
+
+    def finalizar(self, resumo):
+        with self._lock:
+            self._estado["status"] = "finalizado"
+            self._estado["por_status"] = dict(resumo)
+            self._estado["atual"] = None
+            self._pendente = True
+        self.enviar()  # O resumo final sai imediatamente, sem esperar o próximo intervalo
+
+    def desde(self, seq):
+        with self._lock:
+            return [evento for evento in self._buffer if evento["seq"] > seq]
+
+    def _montar_evento(self):
+        estado = self._estado
+        decorrido = time.time() - estado["inicio"] if estado else 0
+        processados = estado.get("processados", 0)
+        taxa = processados / decorrido * 60 if decorrido > 0 else 0
+        restantes = estado.get("total", 0) - processados
+        self._seq += 1
+        evento = {
+            "seq": self._seq,
+            "espaco": self.espaco,
+            "job_id": estado.get("job_id"),
+            "status": estado.get("status"),
+            "processados": processados,
+            "total": estado.get("total", 0),
+            "por_status": dict(estado.get("por_status", {})),
+            "atual": estado.get("atual"),
+            "taxa": round(taxa, 2),  # linhas por minuto
+            "eta": round(restantes / taxa * 60) if taxa > 0 and restantes > 0 else None,  # segundos
+            "ultimo_erro": estado.get("ultimo_erro"),
+            "mensagens": self._mensagens,
+            "omitidas": self._omitidas
+        }
+        self._mensagens, self._omitidas = [], 0
+        self._pendente = False
+        self._buffer.append(evento)
+        return evento
+
+    def enviar(self):
+        with self._lock:
+            if not self._pendente:
+                return
+            evento = self._montar_evento()
+        socketio.emit("progresso", evento)
+
+    def _enviar_periodicamente(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.enviar()
+            except Exception as e:
+                logging.error(f"Erro ao enviar progresso: {e}")
+
+# Canal do espaço de trabalho padrão
+canal_progresso = CanalProgresso()
+
+# Função para obter o canal da execução do thread atual (cada espaço de trabalho tem o seu)
+def canal_atual():
+    return getattr(_contexto_execucao, "canal", None) or canal_progresso
+
+# Reenvia ao cliente (recém-conectado ou reconectado) os eventos de progresso que ele perdeu
+@socketio.on("sincronizar_progresso")
+def sincronizar_progresso(dados):
+    espaco = espacos_trabalho.obter((dados or {}).get("espaco") or ESPACO_PADRAO)
+    return espaco.canal.desde(int((dados or {}).get("desde", 0))) if espaco else []
+
+# Caminhos do Chrome consultados quando o registro do Windows não tem a versão
+CAMINHOS_CHROME = [
+    r'C:\Program Files\Google\Chrome\Application\chrome.exe',
+    r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe'
+]
+
+# Validade (em segundos) das versões do Chrome/ChromeDriver guardadas em memória.
+# A versão também é consultada de novo quando o executável muda (data de modificação)
+VALIDADE_VERSOES = 10 * 60
+
 # Função para obter a versão do Chrome instalado
 def obter_versao_chrome():
     try:
@@ -75,12 +485,7 @@ def obter_versao_chrome():
                 return match.group(1)
         
         # Alternativa: tentar via linha de comando
-        chrome_paths = [
-            r'C:\Program Files\Google\Chrome\Application\chrome.exe',
-            r'C:\Program Files (x86)\Google\Chrome\Application\chrome.exe'
-        ]
-        
-        for path in chrome_paths:
+        for path in CAMINHOS_CHROME:
             if os.path.exists(path):
                 result = subprocess.run([path, '--version'], capture_output=True, text=True)
                 if result.returncode == 0:
@@ -97,7 +502,7 @@ def obter_versao_chrome():
 def obter_versao_chromedriver():
     try:
         # Verifica se existe chromedriver.exe
-        chromedriver_path = "chromedriver.exe"
+        chromedriver_path = CAMINHO_CHROMEDRIVER
         if not os.path.exists(chromedriver_path):
             return None
         
@@ -113,10 +518,44 @@ def obter_versao_chromedriver():
         log_and_emit(f"Erro ao obter versão do ChromeDriver: {e}", level="error")
         return None
 
+# Guarda as versões consultadas: evita abrir `reg query` e `--version` a cada chamada
+class CacheVersoes:
+    def __init__(self, validade=VALIDADE_VERSOES):
+        self.validade = validade
+        self._valores = {}  # nome -> (versao, expira_em, assinatura dos executáveis)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _assinatura(caminhos):
+        assinatura = []
+        for caminho in caminhos:
+            try:
+                assinatura.append((caminho, os.path.getmtime(caminho)))
+            except OSError:
+                assinatura.append((caminho, None))
+        return tuple(assinatura)
+
+    def obter(self, nome, consultar, caminhos, forcar=False):
+        assinatura = self._assinatura(caminhos)
+        with self._lock:
+            guardado = self._valores.get(nome)
+            if not forcar and guardado and guardado[1] > time.time() and guardado[2] == assinatura:
+                return guardado[0]
+        versao = consultar()
+        with self._lock:
+            self._valores[nome] = (versao, time.time() + self.validade, assinatura)
+        return versao
+
+    def limpar(self):
+        with self._lock:
+            self._valores.clear()
+
+cache_versoes = CacheVersoes()
+
 # Função para verificar compatibilidade entre versões
-def verificar_compatibilidade_chrome():
-    chrome_version = obter_versao_chrome()
-    chromedriver_version = obter_versao_chromedriver()
+def verificar_compatibilidade_chrome(forcar=False):
+    chrome_version = cache_versoes.obter("chrome", obter_versao_chrome, CAMINHOS_CHROME, forcar)
+    chromedriver_version = cache_versoes.obter("chromedriver", obter_versao_chromedriver, [CAMINHO_CHROMEDRIVER], forcar)
     
     if not chrome_version:
         return {
@@ -157,7 +596,8 @@ def verificar_compatibilidade_chrome():
 @app.route('/verificar_chromedriver')
 def verificar_chromedriver():
     try:
-        resultado = verificar_compatibilidade_chrome()
+        # `?atualizar=1` ignora as versões guardadas (por exemplo, logo após trocar o ChromeDriver)
+        resultado = verificar_compatibilidade_chrome(forcar=request.args.get("atualizar") == "1")
         return jsonify(resultado)
     except Exception as e:
         return jsonify({
@@ -179,9 +619,57 @@ def index():
 def serve_logo():
     return send_from_directory("templates", "logo_horizontal_color.png")
 
+# Perfis do Chrome em uso: o mesmo diretório de perfil não pode ser aberto por dois navegadores
+_perfis_em_uso = set()
+_lock_perfis = threading.Lock()
+
+# Função para reservar um diretório de perfil livre (perfil_1, perfil_2, ...) para um novo navegador
+def reservar_perfil():
+    with _lock_perfis:
+        numero = 1
+        while numero in _perfis_em_uso:
+            numero += 1
+        _perfis_em_uso.add(numero)
+    caminho = os.path.abspath(os.path.join(PASTA_PERFIS, f"perfil_{numero}"))
+    os.makedirs(caminho, exist_ok=True)
+    return numero, caminho
+
+# Função para liberar o perfil de um navegador encerrado
+def liberar_perfil(numero):
+    with _lock_perfis:
+        _perfis_em_uso.discard(numero)
+
+# Função para aplicar as opções do modo enxuto ao Chrome
+def configurar_modo_enxuto(options, caminho_perfil):
+    options.page_load_strategy = "eager"  # Não espera imagens, fontes e iframes do onload
+    options.add_argument(f"--user-data-dir={caminho_perfil}")
+    options.add_argument(f"--disk-cache-dir={os.path.join(caminho_perfil, 'cache')}")
+    for argumento in (
+        "--disable-extensions",
+        "--disable-background-networking",
+        "--disable-component-update",
+        "--disable-default-apps",
+        "--disable-sync",
+        "--disable-translate",
+        "--no-first-run",
+        "--no-default-browser-check",
+        "--mute-audio",
+        "--blink-settings=imagesEnabled=false"
+    ):
+        options.add_argument(argumento)
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.notifications": 2,
+        "credentials_enable_service": False,
+        "profile.password_manager_enabled": False
+    })
+
 # Função para iniciar o Selenium (com opção de headless ou não)
-def iniciar_selenium(headless_mode=True):
-    service = Service("chromedriver.exe")
+@medido("sessao", rotulo="iniciar navegador")
+def iniciar_selenium(headless_mode=True, modo_enxuto=None):
+    if modo_enxuto is None:
+        modo_enxuto = MODO_ENXUTO
+    service = Service(CAMINHO_CHROMEDRIVER)
     options = webdriver.ChromeOptions()
 
     if headless_mode:
@@ -195,22 +683,124 @@ def iniciar_selenium(headless_mode=True):
     options.add_argument("--no-sandbox")
     options.add_argument("--disable-dev-shm-usage")
 
-    driver = webdriver.Chrome(service=service, options=options)
+    perfil = None
+    if modo_enxuto:
+        perfil, caminho_perfil = reservar_perfil()
+        configurar_modo_enxuto(options, caminho_perfil)
+
+    try:
+        driver = webdriver.Chrome(service=service, options=options)
+    except Exception:
+        if perfil is not None:
+            liberar_perfil(perfil)
+        raise
+    driver._perfil = perfil
+
+    if modo_enxuto:
+        # Bloqueio por padrão de URL: cobre também fontes e scripts de terceiros carregados pelo Angular
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": URLS_BLOQUEADAS})
+        except Exception as e:
+            log_and_emit(f"Não foi possível bloquear recursos no navegador: {e}", level="warning")
+        log_and_emit(f"Navegador em modo enxuto (perfil {perfil}).")
     return driver
 
 
+# ========= ESPERAS POR PRONTIDÃO =========
+# Angular estável (sem requisições/timers pendentes) e documento carregado
+JS_ANGULAR_ESTAVEL = """
+if (document.readyState !== 'complete') return false;
+if (window.getAllAngularTestabilities) {
+    return window.getAllAngularTestabilities().every(function (t) { return t.isStable(); });
+}
+return true;
+"""
+
+# Nenhum spinner visível dentro do modal de desembolso
+JS_SEM_SPINNER = """
+var spinners = document.querySelectorAll(
+    'ngb-modal-window .spinner-border, ngb-modal-window .spinner-grow, ngb-modal-window .loading, ngb-modal-window ngx-spinner'
+);
+for (var i = 0; i < spinners.length; i++) {
+    if (spinners[i].offsetParent !== null) return false;
+}
+return true;
+"""
+
+# Nome do credor preenchido automaticamente após a consulta do CPF
+JS_NOME_CREDOR_PREENCHIDO = """
+var campo = document.getElementById('nomeCredor');
+return !!campo && campo.value.trim() !== '';
+"""
+
+# Arquivo anexado ao input e sem barra de progresso incompleta no modal
+JS_UPLOAD_CONCLUIDO = """
+var input = document.evaluate(arguments[0], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+if (!input || !input.files || input.files.length === 0) return false;
+var barras = document.querySelectorAll('ngb-modal-window .progress-bar');
+for (var i = 0; i < barras.length; i++) {
+    var valor = parseFloat(barras[i].getAttribute('aria-valuenow') || '100');
+    if (valor < 100) return false;
+}
+return true;
+"""
+
+# Função para registrar o tempo real de uma espera (métricas globais e coletor da execução)
+def registrar_espera(etapa, segundos, atingiu_limite):
+    registrar_tempo("espera", etapa, segundos)
+    coletor = getattr(_contexto_execucao, "coletor", None)
+    if atingiu_limite and coletor is not None:
+        coletor.contar_limite(etapa)
+
+# Função para aguardar que todos os scripts JS retornem verdadeiro, até o limite
+def aguardar_sinais(driver, etapa, scripts, limite=LIMITE_ESPERA, args=()):
+    """
+    Aguarda sinais reais de prontidão da página. Se o sinal não aparecer dentro
+    do limite o robô segue em frente, como acontecia com o sleep fixo.
+    """
+    def pronto(d):
+        try:
+            return all(d.execute_script(script, *args) for script in scripts)
+        except Exception:
+            return False
+
+    inicio = time.time()
+    try:
+        WebDriverWait(driver, limite, poll_frequency=INTERVALO_ESPERA).until(pronto)
+        atingiu_limite = False
+    except Exception:
+        atingiu_limite = True
+    decorrido = time.time() - inicio
+    registrar_espera(etapa, decorrido, atingiu_limite)
+    if atingiu_limite:
+        log_and_emit(f"Espera '{etapa}' atingiu o limite de {limite}s sem sinal de prontidão.", level="warning")
+    return not atingiu_limite
+
+# Função para aguardar o Angular ficar estável e o spinner do modal sumir
+def aguardar_pagina_estavel(driver, etapa, limite=LIMITE_ESPERA):
+    return aguardar_sinais(driver, etapa, [JS_ANGULAR_ESTAVEL, JS_SEM_SPINNER], limite)
+
+# Função para aguardar a consulta do CPF preencher o nome do credor
+def aguardar_consulta_cpf(driver, limite=LIMITE_ESPERA):
+    return aguardar_sinais(driver, "consulta_cpf", [JS_NOME_CREDOR_PREENCHIDO, JS_SEM_SPINNER, JS_ANGULAR_ESTAVEL], limite)
+
+# Função para aguardar o upload do arquivo no modal
+def aguardar_upload(driver, xpath_input, limite=LIMITE_ESPERA):
+    return aguardar_sinais(driver, "upload", [JS_UPLOAD_CONCLUIDO, JS_SEM_SPINNER, JS_ANGULAR_ESTAVEL], limite, args=(xpath_input,))
+
 # Função genérica para aguardar e clicar em um elemento
+@medido("clique", posicao_rotulo=3)
 def clicar_elemento(driver, by, identifier, action):
     try:
         # Primeiro, aguarda o elemento estar presente
-        elemento = WebDriverWait(driver, TIMEOUT).until(EC.presence_of_element_located((by, identifier)))
+        elemento = WebDriverWait(driver, TIMEOUT, poll_frequency=INTERVALO_ESPERA).until(EC.presence_of_element_located((by, identifier)))
         
-        # Faz scroll para o elemento ficar visível
-        driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", elemento)
-        time.sleep(1)  # Aguarda o scroll completar
+        # Faz scroll imediato para o elemento ficar visível (sem animação, não precisa aguardar)
+        driver.execute_script("arguments[0].scrollIntoView({behavior: 'instant', block: 'center'});", elemento)
         
         # Tenta aguardar que o elemento seja clicável
-        elemento = WebDriverWait(driver, 5).until(EC.element_to_be_clickable((by, identifier)))
+        elemento = WebDriverWait(driver, 5, poll_frequency=INTERVALO_ESPERA).until(EC.element_to_be_clickable((by, identifier)))
         elemento.click()
         log_and_emit(action)
         
@@ -223,127 +813,281 @@ def clicar_elemento(driver, by, identifier, action):
             log_and_emit(f"{action} (via JavaScript)")
         except Exception as e2:
             log_and_emit(f"Erro ao {action}: {e2}", level="error")
-            socketio.emit("mensagem_personalizada", {"message": f"Erro ao {action}: {e2}", "level": "error"})
+            canal_atual().mensagem(f"Erro ao {action}: {e2}", "error")
 
 # Função genérica para aguardar e inserir texto
+@medido("texto", posicao_rotulo=4)
 def inserir_texto(driver, by, identifier, texto, action):
     try:
-        campo_elemento = WebDriverWait(driver, TIMEOUT).until(EC.presence_of_element_located((by, identifier)))
+        campo_elemento = WebDriverWait(driver, TIMEOUT, poll_frequency=INTERVALO_ESPERA).until(EC.presence_of_element_located((by, identifier)))
         campo_elemento.clear()
         campo_elemento.send_keys(texto)
         log_and_emit(f"{action} {texto}.")
     except Exception as e:
         log_and_emit(f"Erro {action}: {e}", level="error")
-        socketio.emit("mensagem_personalizada", {"message": f"Erro ao {action}: {e}", "level": "error"})
-
-# Função para encontrar o arquivo correspondente ao nome do funcionário
-def encontrar_arquivo(nome, diretorio):
-    from difflib import SequenceMatcher
-    
+        canal_atual().mensagem(f"Erro ao {action}: {e}", "error")
+
+# Preenche selects e inputs de uma vez, disparando os eventos que o Angular escuta,
+# e devolve o valor lido de cada campo logo após o preenchimento
+JS_PREENCHER_EM_LOTE = """
+var campos = arguments[0];
+var setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+var resultado = [];
+function localizar(xpath) {
+    return document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+campos.forEach(function (campo) {
+    var el = localizar(campo.xpath);
+    if (!el) {
+        resultado.push(null);
+        return;
+    }
+    if (el.tagName === 'SELECT') {
+        el.selectedIndex = campo.opcao - 1;
+        el.dispatchEvent(new Event('change', { bubbles: true }));
+        resultado.push(el.selectedIndex === campo.opcao - 1 ? String(campo.opcao) : null);
+    } else {
+        el.focus();
+        setter.call(el, campo.valor);
+        el.dispatchEvent(new Event('input', { bubbles: true }));
+        el.dispatchEvent(new Event('change', { bubbles: true }));
+        el.dispatchEvent(new Event('blur', { bubbles: true }));
+        resultado.push(el.value);
+    }
+});
+return resultado;
+"""
+
+# Função para comparar o valor lido com o esperado, tolerando máscaras (1500,00 -> 1.500,00)
+def valor_confere(esperado, lido):
+    if lido is None:
+        return False
+    if lido == esperado:
+        return True
+    digitos_esperado = limpar_cpf(esperado)
+    return digitos_esperado != "" and digitos_esperado == limpar_cpf(lido)
+
+# Função para preencher vários campos em um único round-trip ao navegador
+@medido("lote", rotulo="preenchimento em lote")
+def preencher_em_lote(driver, campos):
     """
-    Função melhorada para encontrar arquivos PDF correspondentes aos nomes da planilha
-    com múltiplas estratégias de busca e maior tolerância a variações
+    Cada campo é um dict com xpath, rotulo e `valor` (inputs) ou `opcao` (selects,
+    índice do option a partir de 1). Campos que não conferirem após o preenchimento
+    são refeitos pelo caminho tradicional (clicar_elemento/inserir_texto).
     """
-    nomes = nome.strip().upper().split()  # Divide o nome completo da planilha
-    primeiro_nome, ultimo_nome = nomes[0], nomes[-1]  # Pega apenas primeiro e último nome
-    
-    log_and_emit(f"Procurando arquivo para {primeiro_nome} {ultimo_nome} (nome completo: {nome}).")
-    
-    arquivos_disponiveis = os.listdir(diretorio)
-    candidatos = []  # Lista de candidatos com pontuação
-    
-    for arquivo in arquivos_disponiveis:
-        if not arquivo.upper().endswith('.PDF'):
-            continue
-            
-        nome_arquivo = arquivo.upper().replace(".PDF", "").strip()
-        
-        # Remover prefixo numérico e sufixo " - CMDCA"
-        partes = nome_arquivo.split(" - ")
-        if len(partes) < 2:
-            continue
-            
-        # Extrair a parte do nome (segunda parte)
-        nome_parte = partes[1].strip()
-        nomes_arquivo = nome_parte.split()
-        
-        if len(nomes_arquivo) == 0:
+    try:
+        lidos = driver.execute_script(JS_PREENCHER_EM_LOTE, campos) or [None] * len(campos)
+    except Exception as e:
+        log_and_emit(f"Preenchimento em lote falhou, usando campo a campo: {e}", level="warning")
+        lidos = [None] * len(campos)
+
+    for campo, lido in zip(campos, lidos):
+        esperado = str(campo["opcao"]) if "opcao" in campo else campo["valor"]
+        if valor_confere(esperado, lido):
+            log_and_emit(f"{campo['rotulo']} {esperado}. (em lote)")
             continue
-            
-        primeiro_nome_arquivo = nomes_arquivo[0]
-        ultimo_nome_arquivo = nomes_arquivo[-1] if len(nomes_arquivo) > 1 else nomes_arquivo[0]
-        
-        log_and_emit(f"  Analisando: {nome_parte}")
-        
-        # Calcular pontuação de compatibilidade
-        pontuacao = calcular_compatibilidade_avancada(
-            nomes,  # Todos os nomes da planilha
-            nomes_arquivo,  # Todos os nomes do arquivo
-            nome_parte  # Nome completo do arquivo
-        )
-        
-        if pontuacao > 0:
-            candidatos.append((arquivo, pontuacao, primeiro_nome_arquivo, ultimo_nome_arquivo))
-            log_and_emit(f"    Candidato encontrado com pontuação: {pontuacao:.2f}")
-    
-    if candidatos:
-        # Ordenar por pontuação (maior primeiro)
-        candidatos.sort(key=lambda x: x[1], reverse=True)
-        melhor_arquivo, melhor_pontuacao, primeiro_arq, ultimo_arq = candidatos[0]
-        
-        # Aceitar se a pontuação for suficientemente alta
-        if melhor_pontuacao >= 0.6:  # 60% de compatibilidade mínima
-            log_and_emit(f"✅ Arquivo encontrado: {melhor_arquivo}")
-            log_and_emit(f"   Planilha: {' '.join(nomes)}")
-            log_and_emit(f"   Arquivo: {primeiro_arq} {ultimo_arq}")
-            log_and_emit(f"   Pontuação: {melhor_pontuacao:.2f}")
-            return os.path.join(diretorio, melhor_arquivo)
+
+        log_and_emit(f"{campo['rotulo']}: valor não conferiu no preenchimento em lote, refazendo campo a campo", level="warning")
+        if "opcao" in campo:
+            clicar_elemento(driver, By.XPATH, f"{campo['xpath']}/option[{campo['opcao']}]", campo["rotulo"])
         else:
-            log_and_emit(f"❌ Melhor candidato tem pontuação baixa: {melhor_pontuacao:.2f}", level="warning")
-    
-    log_and_emit(f"Arquivo **NÃO** encontrado para {primeiro_nome} {ultimo_nome}. Processo abortado!", level="error")
-    socketio.emit("mensagem_personalizada", {"message": f"Arquivo não encontrado para {primeiro_nome} {ultimo_nome}. Processo abortado!", "level": "error"})
-    return None
+            inserir_texto(driver, By.XPATH, campo["xpath"], campo["valor"], campo["rotulo"])
+
+# Função para normalizar nomes: maiúsculas e sem acentos (JOÃO -> JOAO)
+def normalizar_nome(texto):
+    texto = unicodedata.normalize("NFKD", str(texto).strip().upper())
+    return "".join(c for c in texto if not unicodedata.combining(c))
 
-def calcular_compatibilidade_avancada(nomes_planilha, nomes_arquivo, nome_completo_arquivo):
+# Índice dos nomes dos PDFs de um diretório
+class IndiceArquivos:
     """
-    Versão avançada que compara todos os nomes, não apenas primeiro e último
+    Mantém os nomes dos PDFs já quebrados em tokens normalizados e um índice
+    invertido pelo primeiro nome, para que cada busca pontue apenas os arquivos
+    cujo primeiro nome é compatível com o da planilha.
+    Pontuação de um PDF para os nomes da planilha (zero se o primeiro nome não confere,
+    compatibilidade_nome < 0.5):
+      - 0.5 x compatibilidade do primeiro nome, mais 0.15 se ela for de pelo menos 0.9;
+      - 0.2 por nome da planilha (além do primeiro) com algum nome do PDF acima de 0.7;
+      - 0.1 por nome da planilha com mais de 3 letras que é prefixo de um nome do PDF (ou o contrário);
+      - limitada a 1.0.
+    Ela é contada pelo índice (primeiro nome, outro nome) -> arquivos: para cada nome da
+    planilha, os nomes de arquivo que somam pontos com ele são procurados uma única vez no
+    vocabulário, e só os arquivos que os contêm são visitados.
+    O índice é reconstruído quando o mtime da pasta muda ou quando invalidado
+    explicitamente (upload/exclusão de PDFs).
     """
-    pontuacao = 0.0
-    
-    # Estratégia 1: Compatibilidade do primeiro nome (obrigatório)
-    primeiro_planilha = nomes_planilha[0]
-    primeiro_arquivo = nomes_arquivo[0]
-    
-    compat_primeiro = compatibilidade_nome(primeiro_planilha, primeiro_arquivo)
-    if compat_primeiro < 0.5:  # Se o primeiro nome não bate nem um pouco, descartar
-        return 0.0
-    
-    pontuacao += compat_primeiro * 0.5  # 50% do peso para o primeiro nome
-    
-    # Estratégia 2: Buscar qualquer nome da planilha no arquivo
-    nomes_encontrados = 0
-    for nome_planilha in nomes_planilha[1:]:  # Pular o primeiro nome
-        for nome_arquivo in nomes_arquivo:
-            if compatibilidade_nome(nome_planilha, nome_arquivo) > 0.7:
-                nomes_encontrados += 1
-                pontuacao += 0.2  # 20% por cada nome adicional encontrado
-                break  # Não contar o mesmo nome duas vezes
-    
-    # Estratégia 3: Buscar substrings (para nomes truncados)
-    for nome_planilha in nomes_planilha:
-        if len(nome_planilha) > 3:  # Apenas para nomes com mais de 3 letras
-            for nome_arquivo in nomes_arquivo:
-                if nome_planilha.startswith(nome_arquivo) or nome_arquivo.startswith(nome_planilha):
-                    pontuacao += 0.1  # 10% de bônus por substring
-                    break
-    
-    # Estratégia 4: Bônus por primeiro nome perfeito
-    if compat_primeiro >= 0.9:
-        pontuacao += 0.15  # 15% de bônus extra
-    
-    return min(pontuacao, 1.0)
 
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._arquivos = {}  # arquivo -> (nome_parte, tokens)
+        self._pdfs = []  # todos os PDFs da pasta, inclusive os fora do padrão "N - NOME"
+        self._por_primeiro_nome = {}  # primeiro nome do arquivo -> [arquivos]
+        self._por_primeiro_e_nome = {}  # (primeiro nome, qualquer nome do arquivo) -> [arquivos]
+        self._vocabulario = []  # nomes distintos dos arquivos, em ordem (busca de prefixos)
+        self._contidos = {}  # texto -> nomes do vocabulário que o contêm com 1 ou 2 letras a mais
+        self._blocos = {}  # primeiro nome da planilha -> primeiros nomes compatíveis
+        self._relacoes = {}  # nome da planilha -> (nomes compatíveis acima de 0.7, nomes com prefixo em comum)
+
+    def invalidar(self):
+        with self._lock:
+            self._mtime = None
+
+    def _atualizar(self):
+        mtime = os.stat(self.diretorio).st_mtime_ns
+        if mtime == self._mtime:
+            return
+
+        arquivos = {}
+        por_primeiro_nome = {}
+        por_primeiro_e_nome = {}
+        pdfs = []
+        for entrada in os.scandir(self.diretorio):
+            # Subpastas (como sem_nome/, da divisão de PDFs) não entram no índice
+            if not entrada.is_file():
+                continue
+            arquivo = entrada.name
+            nome_arquivo = normalizar_nome(arquivo)
+            if not nome_arquivo.endswith(".PDF"):
+                continue
+            pdfs.append(arquivo)
+
+            # Remover prefixo numérico e sufixo " - CMDCA"
+            partes = nome_arquivo[:-4].strip().split(" - ")
+            if len(partes) < 2:
+                continue
+
+            nome_parte = partes[1].strip()
+            tokens = tuple(nome_parte.split())
+            if not tokens:
+                continue
+
+            arquivos[arquivo] = (nome_parte, tokens)
+            por_primeiro_nome.setdefault(tokens[0], []).append(arquivo)
+            for token in set(tokens):
+                por_primeiro_e_nome.setdefault((tokens[0], token), []).append(arquivo)
+
+        vocabulario = sorted({token for _, token in por_primeiro_e_nome})
+        contidos = {}
+        for token in vocabulario:
+            for diferenca in (1, 2):
+                for inicio in range(diferenca + 1):
+                    if len(token) - diferenca > 0:
+                        contidos.setdefault(token[inicio:inicio + len(token) - diferenca], set()).add(token)
+
+        self._arquivos = arquivos
+        self._pdfs = pdfs
+        self._por_primeiro_nome = por_primeiro_nome
+        self._por_primeiro_e_nome = por_primeiro_e_nome
+        self._vocabulario = vocabulario
+        self._contidos = contidos
+        self._blocos = {}
+        self._relacoes = {}
+        self._mtime = mtime
+        log_and_emit(f"Índice de PDFs atualizado: {len(arquivos)} arquivo(s) em {self.diretorio}.")
+
+    def arquivos(self):
+        with self._lock:
+            self._atualizar()
+            return dict(self._arquivos)
+
+    def pdfs(self):
+        with self._lock:
+            self._atualizar()
+            return list(self._pdfs)
+
+    def _relacionados(self, nome):
+        """Nomes do vocabulário que somam pontos com `nome` (compatíveis acima de 0.7 e com prefixo em comum)"""
+        relacoes = self._relacoes.get(nome)
+        if relacoes is None:
+            vocabulario = self._vocabulario
+            presentes = set(vocabulario)
+            # compatibilidade_nome > 0.7: igual, ou um contido no outro com até 2 letras de diferença
+            compativeis = set(self._contidos.get(nome, ()))
+            for diferenca in (0, 1, 2):
+                for inicio in range(diferenca + 1):
+                    trecho = nome[inicio:inicio + len(nome) - diferenca]
+                    if trecho and trecho in presentes:
+                        compativeis.add(trecho)
+            # Substring (nomes truncados): um começa com o outro, só para nomes com mais de 3 letras
+            prefixos = set()
+            if len(nome) > 3:
+                prefixos = {nome[:fim] for fim in range(1, len(nome) + 1) if nome[:fim] in presentes}
+                posicao = bisect.bisect_left(vocabulario, nome)
+                while posicao < len(vocabulario) and vocabulario[posicao].startswith(nome):
+                    prefixos.add(vocabulario[posicao])
+                    posicao += 1
+            relacoes = (compativeis, prefixos)
+            self._relacoes[nome] = relacoes
+        return relacoes
+
+    def _arquivos_com(self, bloco, tokens):
+        return {arquivo for primeiro in bloco for token in tokens for arquivo in self._por_primeiro_e_nome.get((primeiro, token), ())}
+
+    def candidatos(self, nomes, somente_fortes=False):
+        """
+        Retorna [(arquivo, nome_parte, tokens, pontuação)] dos arquivos do mesmo bloco de primeiro nome.
+        Com `somente_fortes`, só os que passam de PONTUACAO_SO_PRIMEIRO_NOME, ou seja, que conferem em
+        algum nome além do primeiro (os demais arquivos do bloco nem são visitados).
+        """
+        nomes = tuple(nomes)
+        with self._lock:
+            self._atualizar()
+
+            # compatibilidade_nome aceita substrings (nomes truncados), então o bloco
+            # é calculado uma vez por primeiro nome contra os primeiros nomes distintos
+            bloco = self._blocos.get(nomes[0])
+            if bloco is None:
+                bloco = [p for p in self._por_primeiro_nome if compatibilidade_nome(nomes[0], p) >= 0.5]
+                self._blocos[nomes[0]] = bloco
+
+            # Pontos por arquivo: +0.2 por nome (além do primeiro) compatível e +0.1 por nome com prefixo em comum
+            compativeis, prefixos = Counter(), Counter()
+            for indice, nome in enumerate(nomes):
+                relacionados_compativeis, relacionados_prefixos = self._relacionados(nome)
+                if indice:
+                    compativeis.update(self._arquivos_com(bloco, relacionados_compativeis))
+                prefixos.update(self._arquivos_com(bloco, relacionados_prefixos))
+
+            if somente_fortes:
+                # Só o primeiro nome chega no máximo a 0.5 + 0.15 + 0.1: passar do limite exige
+                # outro nome compatível ou dois nomes com prefixo em comum
+                visitados = set(compativeis)
+                visitados.update(arquivo for arquivo, quantidade in prefixos.items() if quantidade > 1)
+            else:
+                visitados = [arquivo for primeiro in bloco for arquivo in self._por_primeiro_nome[primeiro]]
+
+            resultado = []
+            for arquivo in visitados:
+                nome_parte, tokens = self._arquivos[arquivo]
+                # Somas na ordem da regra (primeiro nome, outros nomes, prefixos, bônus): resultado idêntico ao nome a nome
+                compat_primeiro = compatibilidade_nome(nomes[0], tokens[0])
+                pontuacao = compat_primeiro * 0.5
+                for _ in range(compativeis[arquivo]):
+                    pontuacao += 0.2
+                for _ in range(prefixos[arquivo]):
+                    pontuacao += 0.1
+                if compat_primeiro >= 0.9:
+                    pontuacao += 0.15
+                pontuacao = min(pontuacao, 1.0)
+                if somente_fortes and pontuacao <= PONTUACAO_SO_PRIMEIRO_NOME:
+                    continue
+                resultado.append((arquivo, nome_parte, tokens, pontuacao))
+            return resultado
+
+_indices_arquivos = {}
+_indices_lock = threading.Lock()
+
+# Função para obter (ou criar) o índice de um diretório
+def obter_indice(diretorio):
+    chave = os.path.abspath(diretorio)
+    with _indices_lock:
+        if chave not in _indices_arquivos:
+            _indices_arquivos[chave] = IndiceArquivos(diretorio)
+        return _indices_arquivos[chave]
+
+@functools.lru_cache(maxsize=200000)
 def compatibilidade_nome(nome1, nome2):
     """Verifica compatibilidade exata ou com truncamento"""
     if nome1 == nome2:
@@ -358,24 +1102,463 @@ def compatibilidade_nome(nome1, nome2):
     
     return 0.0
 
+# Distância de Levenshtein limitada: para de calcular (e retorna limite + 1) assim que
+# a distância passa de `limite`, sem preencher a matriz inteira
+def distancia_limitada(texto1, texto2, limite):
+    if abs(len(texto1) - len(texto2)) > limite:
+        return limite + 1
+    anterior = list(range(len(texto2) + 1))
+    for i, c1 in enumerate(texto1, start=1):
+        atual = [i] + [0] * len(texto2)
+        for j, c2 in enumerate(texto2, start=1):
+            atual[j] = min(anterior[j - 1] + (c1 != c2), anterior[j] + 1, atual[j - 1] + 1)
+        if min(atual) > limite:
+            return limite + 1
+        anterior = atual
+    return anterior[-1]
+
+# Atribuição um-para-um que maximiza a soma dos pesos (algoritmo húngaro, O(n²·m))
+# `pesos` é uma matriz n x m; retorna [(i, j)] apenas dos pares com peso > 0
+def atribuicao_otima(pesos):
+    n = len(pesos)
+    m = len(pesos[0]) if n else 0
+    if not n or not m:
+        return []
+    transposta = n > m
+    if transposta:
+        pesos = [list(coluna) for coluna in zip(*pesos)]
+        n, m = m, n
+
+    maior = max(max(linha) for linha in pesos)
+    infinito = float("inf")
+    u, v = [0.0] * (n + 1), [0.0] * (m + 1)
+    dono, caminho = [0] * (m + 1), [0] * (m + 1)  # dono[j]: linha atribuída à coluna j
+    for i in range(1, n + 1):
+        dono[0] = i
+        j0 = 0
+        minimos = [infinito] * (m + 1)
+        usados = [False] * (m + 1)
+        while True:
+            usados[j0] = True
+            i0, delta, j1 = dono[j0], infinito, 0
+            for j in range(1, m + 1):
+                if not usados[j]:
+                    custo = (maior - pesos[i0 - 1][j - 1]) - u[i0] - v[j]
+                    if custo < minimos[j]:
+                        minimos[j], caminho[j] = custo, j0
+                    if minimos[j] < delta:
+                        delta, j1 = minimos[j], j
+            for j in range(m + 1):
+                if usados[j]:
+                    u[dono[j]] += delta
+                    v[j] -= delta
+                else:
+                    minimos[j] -= delta
+            j0 = j1
+            if dono[j0] == 0:
+                break
+        while j0:
+            j1 = caminho[j0]
+            dono[j0] = dono[j1]
+            j0 = j1
+
+    pares = []
+    for j in range(1, m + 1):
+        if dono[j] and pesos[dono[j] - 1][j - 1] > 0:
+            pares.append((j - 1, dono[j] - 1) if transposta else (dono[j] - 1, j - 1))
+    return sorted(pares)
+
+# Atribuição ótima aplicada a cada componente conexo do grafo de candidatos
+# `arestas` é {(i, j): peso}; componentes pequenos mantêm o húngaro barato mesmo com milhares de nomes
+def atribuicao_por_componentes(arestas):
+    pais = {}
+
+    def raiz(no):
+        while pais.setdefault(no, no) != no:
+            pais[no] = pais[pais[no]]
+            no = pais[no]
+        return no
+
+    for i, j in arestas:
+        pais[raiz(("l", i))] = raiz(("c", j))
+
+    componentes = {}
+    for i, j in arestas:
+        componentes.setdefault(raiz(("l", i)), []).append((i, j))
+
+    pares = []
+    for lista in componentes.values():
+        linhas = sorted({i for i, _ in lista})
+        colunas = sorted({j for _, j in lista})
+        pos_linha = {i: k for k, i in enumerate(linhas)}
+        pos_coluna = {j: k for k, j in enumerate(colunas)}
+        pesos = [[0.0] * len(colunas) for _ in linhas]
+        for i, j in lista:
+            pesos[pos_linha[i]][pos_coluna[j]] = arestas[(i, j)]
+        pares.extend((linhas[a], colunas[b]) for a, b in atribuicao_otima(pesos))
+    return sorted(pares)
+
+# ========= CASAMENTO EM LOTE DAS LINHAS COM OS PDFs =========
+# Pontuação mínima para aceitar um PDF e diferença máxima entre os dois melhores candidatos
+# para o casamento ser considerado ambíguo
+PONTUACAO_MINIMA_ARQUIVO = 0.6
+MARGEM_AMBIGUIDADE = 0.05
+# A pontuação satura em 1.0, então o desempate é a proporção de nomes em comum (Jaccard);
+# dois candidatos empatados só são ambíguos se o desempate também não os separar
+MARGEM_DESEMPATE = 0.1
+# Até esta pontuação o PDF só confere no primeiro nome (0.5 + 0.15 de bônus + 0.1 do próprio
+# primeiro nome como substring); esses candidatos fracos só são usados para as linhas que
+# ficaram sem PDF na atribuição dos candidatos fortes
+PONTUACAO_SO_PRIMEIRO_NOME = 0.75
+
+# Resultado do casamento: {nome normalizado: (arquivo, pontuação)} e os relatórios de
+# conflitos (mesmo PDF preferido por mais de um nome) e de casamentos ambíguos
+AtribuicaoArquivos = namedtuple("AtribuicaoArquivos", ["arquivos", "conflitos", "ambiguos"])
+
+# Função para casar todos os nomes da planilha com os PDFs de uma vez: pontua apenas os
+# candidatos do mesmo bloco de primeiro nome e resolve a atribuição um-para-um de maior
+# pontuação total, para que dois funcionários nunca fiquem com o mesmo PDF
+def atribuir_arquivos(nomes, diretorio):
+    indice = obter_indice(diretorio)
+    distintos = [nome for nome in dict.fromkeys(str(n) for n in nomes) if nome]  # Linhas repetidas compartilham o PDF
+
+    # Candidatos de cada nome: [(pontuação, nomes em comum, arquivo)] do melhor para o pior
+    def listar_candidatos(nome, somente_fortes):
+        conjunto = set(nome.split())
+        candidatos = []
+        for arquivo, _, tokens_arquivo, pontuacao in indice.candidatos(nome.split(), somente_fortes=somente_fortes):
+            if pontuacao >= PONTUACAO_MINIMA_ARQUIVO:
+                comuns = len(conjunto & set(tokens_arquivo)) / len(conjunto | set(tokens_arquivo))
+                candidatos.append((pontuacao, comuns, arquivo))
+        candidatos.sort(reverse=True)
+        return candidatos
+
+    posicoes_arquivos = {}
+    fortes, fracos = {}, {}
+    candidatos_por_nome = {}
+    for i, nome in enumerate(distintos):
+        candidatos = listar_candidatos(nome, somente_fortes=True)
+        candidatos_por_nome[nome] = candidatos
+        for pontuacao, comuns, arquivo in candidatos:
+            fortes[(i, posicoes_arquivos.setdefault(arquivo, len(posicoes_arquivos)))] = pontuacao + 0.01 * comuns
+
+    pares = atribuicao_por_componentes(fortes)
+    linhas_usadas = {i for i, _ in pares}
+    arquivos_usados = {j for _, j in pares}
+    for i, nome in enumerate(distintos):
+        candidatos = candidatos_por_nome[nome]
+        # Os candidatos fracos (só o primeiro nome confere) são pontuados apenas para as linhas que
+        # ficaram sem PDF, ou quando podem empatar com o único candidato forte (relatório de ambiguidade)
+        if i not in linhas_usadas or (len(candidatos) == 1 and candidatos[0][0] - PONTUACAO_SO_PRIMEIRO_NOME <= MARGEM_AMBIGUIDADE):
+            candidatos = listar_candidatos(nome, somente_fortes=False)
+            candidatos_por_nome[nome] = candidatos
+        if i in linhas_usadas:
+            continue
+        for pontuacao, _, arquivo in candidatos:
+            j = posicoes_arquivos.setdefault(arquivo, len(posicoes_arquivos))
+            if j not in arquivos_usados:
+                fracos[(i, j)] = pontuacao
+    pares += atribuicao_por_componentes(fracos)
+
+    lista_arquivos = list(posicoes_arquivos)
+    atribuidos = {}
+    for i, j in pares:
+        pontuacao = next(p for p, _, arquivo in candidatos_por_nome[distintos[i]] if arquivo == lista_arquivos[j])
+        atribuidos[distintos[i]] = (lista_arquivos[j], pontuacao)
+
+    preferidos = {}
+    for nome, candidatos in candidatos_por_nome.items():
+        if candidatos:
+            preferidos.setdefault(candidatos[0][2], []).append(nome)
+    conflitos = [
+        {
+            "arquivo": arquivo,
+            "nomes": disputantes,
+            "atribuido_a": next((n for n in disputantes if atribuidos.get(n, (None,))[0] == arquivo), None)
+        }
+        for arquivo, disputantes in preferidos.items() if len(disputantes) > 1
+    ]
+    ambiguos = [
+        {"nome": nome, "candidatos": [{"arquivo": arquivo, "pontuacao": round(pontuacao, 2)} for pontuacao, _, arquivo in candidatos[:2]]}
+        for nome, candidatos in candidatos_por_nome.items()
+        if len(candidatos) > 1
+        and candidatos[0][0] - candidatos[1][0] <= MARGEM_AMBIGUIDADE
+        and candidatos[0][1] - candidatos[1][1] < MARGEM_DESEMPATE
+    ]
+
+    # Detalhe por candidato só com o nível DEBUG ativo (não monta as mensagens de cada PDF à toa)
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        for nome, candidatos in candidatos_por_nome.items():
+            log_and_emit(f"  Analisando: {nome}", level="debug")
+            for pontuacao, _, arquivo in candidatos:
+                log_and_emit(f"    Candidato {arquivo} com pontuação: {pontuacao:.2f}", level="debug")
+
+    for conflito in conflitos:
+        log_and_emit(f"⚠️ {conflito['arquivo']} é o melhor PDF para {', '.join(conflito['nomes'])}; atribuído a {conflito['atribuido_a'] or 'nenhum'}", level="warning")
+    for ambiguo in ambiguos:
+        log_and_emit(f"⚠️ Casamento ambíguo para {ambiguo['nome']}: {', '.join(c['arquivo'] for c in ambiguo['candidatos'])}", level="warning")
+    return AtribuicaoArquivos(atribuidos, conflitos, ambiguos)
+
+# Item imutável do plano de execução: uma linha da planilha já resolvida
+# `arquivo_envio` é o PDF recomprimido pela pré-verificação, quando houver (senão envia `arquivo`)
+ItemPlano = namedtuple("ItemPlano", ["linha", "nome", "cpf", "valor", "arquivo", "data_emissao", "data_pagamento", "arquivo_envio"], defaults=(None,))
+
+# Plano de execução completo, produzido uma única vez pela validação
+# `invalidos` são as linhas recusadas por CPF ou valor inválido ("NOME (linha N): erro; erro")
+PlanoExecucao = namedtuple("PlanoExecucao", ["itens", "faltando", "criado_em", "conflitos", "ambiguos", "invalidos"], defaults=((), (), ()))
+
+# Função para listar os erros de CPF e valor de uma linha normalizada (mesmas mensagens da simulação offline)
+def erros_de_dados(registro):
+    cpf = str(registro.cpf)
+    erros = []
+    if len(cpf) != 11:
+        erros.append(f"CPF com {len(cpf)} dígito(s)")
+    elif not registro.cpf_valido:
+        erros.append("CPF com dígito verificador inválido")
+    if not registro.valor_formatado:
+        erros.append("Valor ausente ou inválido")
+    return erros
+
+# Função para encontrar coluna independente de maiúscula/minúscula
+def encontrar_coluna(df, nome_coluna):
+    for col in df.columns:
+        if col.lower() == nome_coluna.lower():
+            return col
+    raise KeyError(f"Coluna '{nome_coluna}' não encontrada. Colunas disponíveis: {list(df.columns)}")
+
+# Função para montar o plano de execução: resolve PDF, CPF, valor e datas de cada linha uma única vez
+def montar_plano_execucao(df, data_emissao, data_pagamento, diretorio_pdfs=diretorio):
+    registros = normalizar_planilha(df)
+
+    # Converter datas do payload uma única vez
+    data_emissao_formatada = formatar_data(data_emissao)
+    data_pagamento_formatada = formatar_data(data_pagamento)
+
+    # Casamento de todas as linhas com os PDFs em uma única atribuição
+    atribuicao = atribuir_arquivos(registros.nome_normalizado, diretorio_pdfs)
+
+    itens = []
+    faltando = []
+    invalidos = []
+    for registro in registros:
+        nome = str(registro.nome)
+        if not registro.nome_normalizado:
+            faltando.append(f"(linha {registro.linha} sem nome)")
+            continue
+        arquivo, pontuacao = atribuicao.arquivos.get(str(registro.nome_normalizado), (None, 0.0))
+        if not arquivo:  # Se não encontrar o arquivo correspondente, adiciona na lista
+            log_and_emit(f"Arquivo **NÃO** encontrado para {nome}.", level="error")
+            faltando.append(nome)
+        else:
+            log_and_emit(f"✅ Arquivo encontrado para {nome}: {arquivo} (pontuação {pontuacao:.2f})")
+
+        # CPF ou valor inválido não chega ao SGP: a linha fica fora do plano e a execução não começa
+        erros = erros_de_dados(registro)
+        if erros:
+            log_and_emit(f"Linha {registro.linha} ({nome}) recusada: {'; '.join(erros)}", level="error")
+            invalidos.append(f"{nome} (linha {registro.linha}): {'; '.join(erros)}")
+        if not arquivo or erros:
+            continue
+        arquivo = os.path.join(diretorio_pdfs, arquivo)
+
+        itens.append(ItemPlano(
+            linha=int(registro.linha),
+            nome=nome,
+            cpf=str(registro.cpf),
+            valor=str(registro.valor_formatado),
+            arquivo=arquivo,
+            data_emissao=data_emissao_formatada,
+            data_pagamento=data_pagamento_formatada
+        ))
+
+    return PlanoExecucao(
+        itens=tuple(itens),
+        faltando=tuple(faltando),
+        criado_em=datetime.now().isoformat(timespec="seconds"),
+        conflitos=tuple(atribuicao.conflitos),
+        ambiguos=tuple(atribuicao.ambiguos),
+        invalidos=tuple(invalidos)
+    )
+
+# Função para converter o plano em JSON para o frontend
+def plano_para_json(plano):
+    return {
+        "criado_em": plano.criado_em,
+        "total": len(plano.itens),
+        "faltando": list(plano.faltando),
+        "conflitos": list(plano.conflitos),
+        "ambiguos": list(plano.ambiguos),
+        "invalidos": list(plano.invalidos),
+        "itens": [dict(item._asdict(), arquivo=os.path.basename(item.arquivo)) for item in plano.itens]
+    }
+
 # função para verificar se todos os PDFs existem antes da execução
-def verificar_arquivos(df):
-    socketio.emit("mensagem_personalizada", {"message": "Verificando se existem arquivos para todos os registros da planilha", "level": "info"})
+# Retorna o plano de execução, ou None se faltar algum arquivo ou houver linha com CPF/valor inválido
+def verificar_arquivos(df, data_emissao="", data_pagamento="", diretorio_pdfs=diretorio, canal=None):
+    canal = canal or canal_atual()
+    canal.mensagem("Verificando se existem arquivos para todos os registros da planilha")
     log_and_emit("Verificando se existem arquivos para todos os registros da planilha")
 
-    arquivos_faltando = []
-    for _, row in df.iterrows():
-        nome = row["Nome"]
-        if not encontrar_arquivo(nome, diretorio):  # Se não encontrar o arquivo correspondente, adiciona na lista
-            arquivos_faltando.append(nome)
+    plano = montar_plano_execucao(df, data_emissao, data_pagamento, diretorio_pdfs)
 
-    if arquivos_faltando:
-        mensagem_erro = "Processo abortado! Faltam os seguintes arquivos PDF:\n" + "\n".join(arquivos_faltando)
+    if plano.faltando:
+        mensagem_erro = "Processo abortado! Faltam os seguintes arquivos PDF:\n" + "\n".join(str(nome) for nome in plano.faltando)
+        log_and_emit(mensagem_erro, level="error")
+        canal.mensagem(mensagem_erro, "error", imediata=True)
+        return None  # Retorna None para interromper o processo
+    if plano.invalidos:
+        mensagem_erro = "Processo abortado! Linhas com CPF ou valor inválido:\n" + "\n".join(plano.invalidos)
         log_and_emit(mensagem_erro, level="error")
-        socketio.emit("mensagem_personalizada", {"message": mensagem_erro, "level": "error"})
-        return False  # Retorna False para interromper o processo
+        canal.mensagem(mensagem_erro, "error", imediata=True)
+        return None
     
-    return True  # Retorna True se todos os arquivos forem encontrados
+    return plano  # Retorna o plano se todos os arquivos forem encontrados
+
+# ========= PRÉ-VERIFICAÇÃO DOS PDFs =========
+# Antes de abrir o navegador, cada PDF é aberto em um pool de processos (processamento_pdf.inspecionar_pdfs):
+# arquivos corrompidos são recusados e os maiores que o limite (em MB) são recomprimidos
+PREVERIFICAR_PDFS = True
+LIMITE_TAMANHO_PDF_MB = 2
+# Cache dos resultados (por hash do conteúdo) e PDFs recomprimidos
+PASTA_PREVERIFICACAO = os.path.join(log_dir, "preverificacao")
+
+# Resultados da pré-verificação por conteúdo: o mesmo PDF (em outro espaço ou com outro nome) não é reaberto
+class PreVerificacaoPDFs:
+    """
+    cache.json guarda, por "hash:limite", {valido, erro, aviso, paginas, tamanho,
+    otimizado, tamanho_otimizado, usado_em}; entradas sem uso há mais de
+    LOG_DIAS_RETENCAO dias são descartadas junto com o PDF recomprimido.
+    O PDF recomprimido fica em uma pasta por "hash_limite" com o nome do PDF original,
+    porque o SGP guarda o anexo com o nome do arquivo enviado.
+    """
+
+    def __init__(self, pasta=PASTA_PREVERIFICACAO):
+        self.pasta = pasta
+        self.caminho_cache = os.path.join(pasta, "cache.json")
+        self._lock = threading.Lock()
+        self._hashes = {}  # (caminho, tamanho, mtime) -> hash, para não reler arquivos inalterados
+        self._cache = {}
+
+    def preparar(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        self._cache = self._carregar()
+
+    def _carregar(self):
+        try:
+            with open(self.caminho_cache, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _gravar(self):
+        limite = (datetime.now() - timedelta(days=LOG_DIAS_RETENCAO)).isoformat(timespec="seconds")
+        for chave, registro in list(self._cache.items()):
+            if registro.get("usado_em", "") < limite:
+                if registro.get("otimizado"):
+                    shutil.rmtree(self._pasta_da_chave(chave), ignore_errors=True)
+                del self._cache[chave]
+        temporario = self.caminho_cache + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(self._cache, f, ensure_ascii=False)
+        os.replace(temporario, self.caminho_cache)
+
+    def _pasta_da_chave(self, chave):
+        return os.path.join(self.pasta, chave.replace(":", "_"))
+
+    @staticmethod
+    def _com_nome_original(otimizado, caminho):
+        """Caminho do recomprimido com o nome de `caminho` (o mesmo conteúdo com outro nome ganha um hardlink ao lado)"""
+        destino = os.path.join(os.path.dirname(otimizado), os.path.basename(caminho))
+        if not os.path.exists(destino):
+            try:
+                os.link(otimizado, destino)
+            except FileExistsError:
+                pass
+            except OSError:
+                shutil.copyfile(otimizado, destino)
+        return destino
+
+    def _hash(self, caminho):
+        info = os.stat(caminho)
+        assinatura = (os.path.abspath(caminho), info.st_size, info.st_mtime_ns)
+        hash_pdf = self._hashes.get(assinatura)
+        if hash_pdf is None:
+            hash_pdf = DiarioExecucao.hash_arquivo(caminho)
+            self._hashes[assinatura] = hash_pdf
+        return hash_pdf
+
+    def verificar(self, caminhos, limite_mb=LIMITE_TAMANHO_PDF_MB, processos=None):
+        """Retorna {caminho: resultado}; `enviar` é o arquivo a anexar no SGP (o recomprimido, quando houver)"""
+        inicio = time.time()
+        limite_bytes = int(float(limite_mb) * 1024 * 1024) if limite_mb else 0
+        agora = datetime.now().isoformat(timespec="seconds")
+        chaves, pendentes, resultados = {}, {}, {}
+
+        # Hash fora do lock: é leitura de disco e o memo tolera cálculo repetido
+        for caminho in dict.fromkeys(caminhos):
+            try:
+                chaves[caminho] = f"{self._hash(caminho)}:{limite_bytes}"
+            except OSError:
+                resultados[caminho] = {"arquivo": os.path.basename(caminho), "valido": False, "erro": "Arquivo não encontrado", "enviar": None}
+
+        with self._lock:
+            for caminho, chave in chaves.items():
+                registro = self._cache.get(chave)
+                otimizado = registro and registro["otimizado"]
+                # Recomprimido apagado, ou gravado no formato antigo (logs/preverificacao/<hash>_<limite>.pdf)
+                if registro is None or (otimizado and (not os.path.exists(otimizado) or os.path.dirname(otimizado) != self._pasta_da_chave(chave))):
+                    pendentes.setdefault(chave, caminho)
+                    if otimizado and os.path.isfile(otimizado) and os.path.dirname(otimizado) != self._pasta_da_chave(chave):
+                        os.remove(otimizado)
+
+        # Só os conteúdos ainda não vistos vão para o pool, sem segurar o lock: outra verificação
+        # (outro espaço de trabalho) não espera este lote terminar. Se as duas abrirem o mesmo
+        # conteúdo, o resultado é o mesmo e o PDF recomprimido é gravado com os.replace
+        novos = {}
+        if pendentes:
+            tarefas = [(caminho, limite_bytes, os.path.join(self._pasta_da_chave(chave), os.path.basename(caminho))) for chave, caminho in pendentes.items()]
+            for chave, resultado in zip(pendentes, processamento_pdf.inspecionar_pdfs(tarefas, processos)):
+                resultado.pop("arquivo")
+                novos[chave] = resultado
+
+        with self._lock:
+            self._cache.update(novos)
+            for caminho, chave in chaves.items():
+                self._cache[chave]["usado_em"] = agora
+                registro = dict(self._cache[chave], arquivo=os.path.basename(caminho))
+                registro["enviar"] = self._com_nome_original(registro["otimizado"], caminho) if registro["otimizado"] else caminho
+                resultados[caminho] = registro
+            self._gravar()
+
+        invalidos = sum(1 for r in resultados.values() if not r["valido"])
+        otimizados = [r for r in resultados.values() if r.get("otimizado")]
+        economia = sum(r["tamanho"] - r["tamanho_otimizado"] for r in otimizados)
+        log_and_emit(
+            f"Pré-verificação: {len(resultados)} PDF(s) ({len(pendentes)} aberto(s) agora), {invalidos} inválido(s), "
+            f"{len(otimizados)} recomprimido(s) ({economia // 1024} KB a menos) em {time.time() - inicio:.2f}s."
+        )
+        return resultados
+
+pre_verificacao_pdfs = PreVerificacaoPDFs()
+
+# Função para pré-verificar os PDFs do plano: retira as linhas com PDF inválido e aponta as demais para o arquivo a enviar
+# Retorna (plano, [(item, erro), ...])
+def preverificar_plano(plano, parametros):
+    resultados = pre_verificacao_pdfs.verificar(
+        [item.arquivo for item in plano.itens],
+        parametros.get("limite_pdf_mb", LIMITE_TAMANHO_PDF_MB)
+    )
+    itens, recusados = [], []
+    for item in plano.itens:
+        resultado = resultados[item.arquivo]
+        if not resultado["valido"]:
+            log_and_emit(f"PDF inválido para {item.nome} ({resultado['arquivo']}): {resultado['erro']}", level="error")
+            recusados.append((item, f"PDF inválido: {resultado['erro']}"))
+            continue
+        if resultado.get("aviso"):
+            log_and_emit(f"{resultado['arquivo']}: {resultado['aviso']}", level="warning")
+        itens.append(item._replace(arquivo_envio=resultado["enviar"]) if resultado["otimizado"] else item)
+    return plano._replace(itens=tuple(itens)), recusados
 
 
 # Converter a data de "YYYY-MM-DD" para "DD/MM/YYYY"
@@ -392,6 +1575,163 @@ def limpar_cpf(cpf):
     cpf_limpo = ''.join(filter(str.isdigit, str(cpf)))
     return cpf_limpo
 
+# Função vetorizada para limpar uma coluna de CPFs (mesma regra de limpar_cpf)
+def limpar_cpfs(serie):
+    if pd.api.types.is_numeric_dtype(serie):
+        # CPF lido como número pelo Excel: perde os zeros à esquerda e pode virar float
+        numeros = serie.astype("Int64")
+        return numeros.astype("string").str.zfill(11).where(numeros.notna(), "").astype(str)
+    # Coluna mista: os CPFs digitados como número também perderam os zeros (e o float ganhou ".0")
+    texto = serie.map(lambda cpf: str(int(cpf)) if isinstance(cpf, numbers.Real) and not isinstance(cpf, bool) and cpf == cpf else cpf)
+    digitos = texto.fillna("").astype(str).str.replace(r"\D", "", regex=True)
+    return digitos.where(digitos.eq(""), digitos.str.zfill(11))
+
+# Função vetorizada para validar CPFs já limpos (11 dígitos e dígitos verificadores)
+def validar_cpfs(cpfs):
+    tamanho_ok = cpfs.str.len().eq(11).to_numpy()
+    if not tamanho_ok.any():
+        return pd.Series(tamanho_ok, index=cpfs.index)
+
+    digitos = np.frombuffer("".join(cpfs[tamanho_ok]).encode("ascii"), dtype=np.uint8).reshape(-1, 11).astype(np.int64) - 48
+    dv1 = (digitos[:, :9] @ np.arange(10, 1, -1)) * 10 % 11 % 10
+    dv2 = (digitos[:, :10] @ np.arange(11, 1, -1)) * 10 % 11 % 10
+    repetidos = (digitos == digitos[:, :1]).all(axis=1)  # 111.111.111-11 passa no cálculo mas é inválido
+
+    validos = tamanho_ok.copy()
+    validos[tamanho_ok] = (dv1 == digitos[:, 9]) & (dv2 == digitos[:, 10]) & ~repetidos
+    return pd.Series(validos, index=cpfs.index)
+
+# Separador de milhar com ponto ("1.500", "2.000.000"): ponto seguido de exatamente 3 dígitos
+PONTO_MILHAR = re.compile(r"\.(?=\d{3}(?!\d))")
+
+# Função para converter um valor da planilha ou do SGP em float ("R$ 1.500,50", "1.500", "1500.5", 1500.5)
+# Com vírgula, ela é o separador decimal e os pontos são de milhar; sem vírgula, só o ponto seguido
+# de 1 ou 2 dígitos é decimal. Retorna None se não for um número
+def texto_para_valor(valor):
+    if isinstance(valor, numbers.Real) and not isinstance(valor, bool):
+        return float(valor) if valor == valor else None  # NaN
+    texto = re.sub(r"[^\d,.-]", "", str(valor))
+    if "," in texto:
+        texto = texto.replace(".", "").replace(",", ".")
+    else:
+        texto = PONTO_MILHAR.sub("", texto)
+    try:
+        return float(texto)
+    except ValueError:
+        return None
+
+# Função para converter uma coluna de valores (números ou textos, ver texto_para_valor)
+def converter_valores(serie):
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+    return pd.to_numeric(serie.map(texto_para_valor), errors="coerce")
+
+# Função vetorizada para formatar valores no padrão do SGP (1500.5 -> "1500,50"); inválidos viram ""
+def formatar_valores(valores):
+    numeros = valores.to_numpy(dtype=float)
+    validos = ~np.isnan(numeros) & (numeros > 0)
+    formatados = np.char.replace(np.char.mod("%.2f", np.round(np.where(validos, numeros, 0), 2)), ".", ",")
+    return np.where(validos, formatados, "")
+
+# Função vetorizada para normalizar nomes (mesma regra de normalizar_nome)
+def normalizar_nomes(serie):
+    return (
+        serie.fillna("").astype(str)
+        .str.normalize("NFKD").str.replace(r"[\u0300-\u036f]", "", regex=True)
+        .str.upper().str.strip().str.replace(r"\s+", " ", regex=True)
+    )
+
+# Função para normalizar a planilha inteira com operações por coluna
+def normalizar_planilha(df):
+    """
+    Retorna um record array (numpy) com uma entrada por linha da planilha:
+    linha (no Excel), nome, nome_normalizado, cpf (só dígitos, zeros à esquerda até 11), cpf_valido,
+    valor (float, NaN se inválido) e valor_formatado ("1500,50" ou "" se inválido).
+    """
+    col_nome = encontrar_coluna(df, "nome")
+    col_cpf = encontrar_coluna(df, "cpf")
+    col_valor = encontrar_coluna(df, "valor")
+
+    nomes = df[col_nome].fillna("").astype(str).str.strip()
+    cpfs = limpar_cpfs(df[col_cpf])
+    valores = converter_valores(df[col_valor])
+
+    return np.rec.fromarrays(
+        [
+            np.arange(2, len(df) + 2, dtype=np.int32),  # Linha no Excel (cabeçalho na linha 1)
+            nomes.to_numpy(dtype=str),
+            normalizar_nomes(nomes).to_numpy(dtype=str),
+            cpfs.to_numpy(dtype=str),  # Sem largura fixa: um CPF com dígitos a mais não pode ser truncado em 11
+            validar_cpfs(cpfs).to_numpy(dtype=bool),
+            valores.to_numpy(dtype=np.float64),
+            formatar_valores(valores)
+        ],
+        names=["linha", "nome", "nome_normalizado", "cpf", "cpf_valido", "valor", "valor_formatado"]
+    )
+
+# Função para simular a execução sem navegador: valida todas as linhas e o casamento com os PDFs
+def simular_offline(df, data_emissao, data_pagamento, diretorio_pdfs=diretorio):
+    inicio = time.perf_counter()
+    erros_gerais = []
+
+    registros = normalizar_planilha(df)
+
+    # Datas do payload: validadas uma única vez
+    datas = {}
+    for rotulo, data in (("data_emissao", data_emissao), ("data_pagamento", data_pagamento)):
+        try:
+            datas[rotulo] = formatar_data(data)
+            if not datas[rotulo]:
+                erros_gerais.append(f"{rotulo} não informada")
+        except ValueError:
+            datas[rotulo] = ""
+            erros_gerais.append(f"{rotulo} inválida: {data}")
+
+    # Casamento com os PDFs: mesma atribuição um-para-um usada pelo plano de execução
+    atribuicao = atribuir_arquivos(registros.nome_normalizado, diretorio_pdfs)
+    casamentos = atribuicao.arquivos
+    arquivos = pd.Series([casamentos.get(n, (None, 0.0))[0] for n in registros.nome_normalizado], dtype=object)
+    pontuacoes = np.array([casamentos.get(n, (None, 0.0))[1] for n in registros.nome_normalizado], dtype=float)
+    arquivo_ok = arquivos.notna().to_numpy() & (pontuacoes >= PONTUACAO_MINIMA_ARQUIVO)
+    arquivo_repetido = arquivos.where(arquivo_ok).duplicated(keep=False).to_numpy() & arquivo_ok
+
+    linhas = []
+    for registro, arquivo, pontuacao, a_ok, repetido in zip(registros, arquivos, pontuacoes, arquivo_ok, arquivo_repetido):
+        cpf = str(registro.cpf)
+        erros = []
+        if not registro.nome:
+            erros.append("Nome vazio")
+        erros += erros_de_dados(registro)
+        if not a_ok:
+            erros.append("PDF não encontrado" if arquivo is None else f"PDF com pontuação baixa ({pontuacao:.2f})")
+        elif repetido:
+            erros.append("PDF associado a mais de uma linha")
+
+        linhas.append({
+            "linha": int(registro.linha),
+            "nome": str(registro.nome),
+            "cpf": cpf,
+            "valor": str(registro.valor_formatado),
+            "arquivo": arquivo,
+            "pontuacao": round(float(pontuacao), 2),
+            "status": "erro" if erros else "ok",
+            "erros": erros
+        })
+
+    com_erro = sum(1 for l in linhas if l["erros"])
+    return {
+        "total": len(linhas),
+        "ok": len(linhas) - com_erro,
+        "com_erro": com_erro,
+        "erros_gerais": erros_gerais,
+        "conflitos": atribuicao.conflitos,
+        "ambiguos": atribuicao.ambiguos,
+        "data_emissao": datas["data_emissao"],
+        "data_pagamento": datas["data_pagamento"],
+        "tempo": round(time.perf_counter() - inicio, 4),
+        "linhas": linhas
+    }
+
 # Dicionário com as opções de parceria para cada órgão
 OPCOES_PARCERIAS = {
     "1": [
@@ -446,145 +1786,1552 @@ def get_parcerias():
     return jsonify({"parcerias": parcerias})
 
 
-# Função principal que inicia o robô
+# Função para verificar se a página atual pede login (formulário do Keycloak)
+def precisa_login(driver, timeout=TIMEOUT):
+    def estado(d):
+        if d.find_elements(By.ID, "username"):
+            return "login"
+        if d.find_elements(By.TAG_NAME, "app-exibe-parceria-usuario"):
+            return "logado"
+        return False
+
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=INTERVALO_ESPERA).until(estado) == "login"
+    except Exception:
+        return True
+
+# Função para fazer login no SGP (só preenche o formulário se a sessão tiver expirado)
+@medido("sessao", rotulo="login")
+def fazer_login(driver, url, usuario, senha):
+    driver.get(url)
+    if not precisa_login(driver):
+        log_and_emit("Sessão ainda autenticada, login reaproveitado.")
+        canal_atual().mensagem("Sessão reaproveitada, login dispensado")
+        return
+
+    canal_atual().mensagem("Iniciando Login...")
+    inserir_texto(driver, By.ID, "username", usuario, "Usuário inserido:")
+    inserir_texto(driver, By.ID, "password", senha, "Senha inserida:")
+    clicar_elemento(driver, By.XPATH, '//*[@id="kc-login"]', "Clicado em Entrar")
+    canal_atual().mensagem("Login realizado!")
+
+# ========= SESSÕES DE NAVEGADOR REAPROVEITÁVEIS =========
+# Função para testar se um driver ainda responde (sonda barata, sem navegação)
+def driver_vivo(driver):
+    try:
+        return driver.execute_script("return document.readyState") is not None
+    except Exception:
+        return False
+
+# Função para encerrar um driver ignorando erros (processo já morto, por exemplo)
+def encerrar_driver(driver):
+    try:
+        driver.quit()
+    except Exception as e:
+        log_and_emit(f"Erro ao encerrar o navegador: {e}", level="error")
+    perfil = getattr(driver, "_perfil", None)
+    if perfil is not None:
+        liberar_perfil(perfil)
+
+# Mantém navegadores logados ociosos entre execuções
+class GerenciadorSessoes:
+    def __init__(self):
+        self._ociosas = []  # [{driver, chave, ultimo_uso}]
+        self._reservas = []  # navegadores reservados pelos lotes em andamento
+        self._lock = threading.Lock()
+
+    def _capacidade(self):
+        return max(MAX_SESSOES_OCIOSAS, sum(self._reservas))
+
+    @contextmanager
+    def reservar(self, quantidade):
+        """Enquanto o bloco roda, o pool guarda ao menos `quantidade` navegadores ociosos (os workers de um lote entre as etapas)"""
+        with self._lock:
+            self._reservas.append(quantidade)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._reservas.remove(quantidade)
+                excedentes = self._ociosas[self._capacidade():]
+                self._ociosas = self._ociosas[:self._capacidade()]
+            for sessao in excedentes:
+                encerrar_driver(sessao["driver"])
+
+    def _descartar_expiradas(self):
+        agora = time.time()
+        expiradas = [s for s in self._ociosas if agora - s["ultimo_uso"] > SESSAO_OCIOSA_MAX]
+        self._ociosas = [s for s in self._ociosas if s not in expiradas]
+        return expiradas
+
+    def obter(self, parametros):
+        """Entrega um driver logado e na tela de seleção de parceria, reaproveitando um ocioso se houver"""
+        modo_enxuto = parametros.get("modo_enxuto", MODO_ENXUTO)
+        chave = (parametros["url"], parametros["usuario"], bool(parametros["headless_mode"]), bool(modo_enxuto))
+        with self._lock:
+            expiradas = self._descartar_expiradas()
+            sessao = next((s for s in self._ociosas if s["chave"] == chave), None)
+            if sessao:
+                self._ociosas.remove(sessao)
+        for expirada in expiradas:
+            encerrar_driver(expirada["driver"])
+
+        driver = None
+        if sessao:
+            if driver_vivo(sessao["driver"]):
+                driver = sessao["driver"]
+                log_and_emit("Reaproveitando navegador já aberto.")
+            else:
+                encerrar_driver(sessao["driver"])
+
+        if driver is None:
+            driver = iniciar_selenium(parametros["headless_mode"], modo_enxuto)
+
+        try:
+            fazer_login(driver, parametros["url"], parametros["usuario"], parametros["senha"])
+        except Exception:
+            encerrar_driver(driver)
+            raise
+        driver._chave_sessao = chave
+        return driver
+
+    def devolver(self, driver, saudavel=True):
+        """Devolve o driver ao pool; se houver falha ou o pool estiver cheio, encerra o navegador"""
+        chave = getattr(driver, "_chave_sessao", None)
+        if MANTER_SESSOES and saudavel and chave and driver_vivo(driver):
+            with self._lock:
+                if len(self._ociosas) < self._capacidade():
+                    self._ociosas.append({"driver": driver, "chave": chave, "ultimo_uso": time.time()})
+                    return
+        encerrar_driver(driver)
+
+    def encerrar_todas(self):
+        with self._lock:
+            ociosas, self._ociosas = self._ociosas, []
+        for sessao in ociosas:
+            encerrar_driver(sessao["driver"])
+        return len(ociosas)
+
+    def status(self):
+        agora = time.time()
+        with self._lock:
+            return [
+                {"url": s["chave"][0], "usuario": s["chave"][1], "headless": s["chave"][2], "enxuto": s["chave"][3], "ociosa_ha": round(agora - s["ultimo_uso"])}
+                for s in self._ociosas
+            ]
+
+gerenciador_sessoes = GerenciadorSessoes()
+atexit.register(gerenciador_sessoes.encerrar_todas)
+
+# Função para selecionar órgão e parceria e abrir a tela de desembolsos
+@medido("navegacao", rotulo="seleção de órgão e parceria")
+def selecionar_parceria(driver, orgao_publico, parceria):
+    # Selecionar Órgão da Administração Pública
+    seletor_orgao = f"/html/body/app-root/app-exibe-parceria-usuario/div/div[1]/div/div/select/option[{orgao_publico}]"
+    clicar_elemento(driver, By.XPATH, seletor_orgao, f"Selecionado Órgão ID {orgao_publico}")
+
+    # Selecionar Parceria
+    seletor_parceria = f"/html/body/app-root/app-exibe-parceria-usuario/div/div[1]/div[2]/div/select/option[{parceria}]"
+    clicar_elemento(driver, By.XPATH, seletor_parceria, f"Selecionado Parceria ID {parceria}")
+
+    # Clicar no botão de inclusão
+    clicar_elemento(driver, By.XPATH, '//*[@id="desembolsos-header"]/button', "Clicado em Incluir Desembolsos")
+
+# Função para inserir um item do plano no modal de desembolso
+@medido("linha", rotulo="registro completo")
+def processar_item(driver, item, ano_mes, modo_simulacao):
+    clicar_elemento(driver, By.XPATH, '//*[@id="button-insert"]', "Clicado em Adicionar Novo Registro")
+
+    if PREENCHIMENTO_EM_LOTE:
+        # O CPF continua digitado: a consulta do credor depende dos eventos de teclado
+        inserir_texto(driver, By.XPATH, '//*[@id="cpfCnpj"]', item.cpf, "CPF inserido")
+        clicar_elemento(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/div[1]', "Clicado no modal")
+        aguardar_consulta_cpf(driver)
+
+        preencher_em_lote(driver, [
+            {"xpath": "/html/body/ngb-modal-window/div/div/form/div/div[1]/div[1]/div/select", "opcao": 2, "rotulo": "Selecionado Natureza da Despesa: Pagamento de Pessoal"},
+            {"xpath": "/html/body/ngb-modal-window/div/div/form/div/div[1]/div[2]/div/select", "opcao": 15, "rotulo": "Selecionado Tipo de Documento: Outros"},
+            {"xpath": '//*[@id="nroDoc"]', "valor": ano_mes, "rotulo": "Número do Documento inserido"},
+            {"xpath": "/html/body/ngb-modal-window/div/div/form/div/div[4]/div[1]/input", "valor": item.data_emissao, "rotulo": "Data de Emissão inserida"},
+            {"xpath": "/html/body/ngb-modal-window/div/div/form/div/div[4]/div[2]/input", "valor": item.valor, "rotulo": "Valor inserido"},
+            {"xpath": "/html/body/ngb-modal-window/div/div/form/div/div[4]/div[3]/input", "valor": item.data_pagamento, "rotulo": "Data de Pagamento inserida"},
+            {"xpath": "/html/body/ngb-modal-window/div/div/form/div/div[4]/div[4]/input", "valor": item.valor, "rotulo": "Valor Total do Documento inserido"}
+        ])
+    else:
+        clicar_elemento(driver, By.XPATH, "/html/body/ngb-modal-window/div/div/form/div/div[1]/div[1]/div/select/option[2]", "Selecionado Natureza da Despesa: Pagamento de Pessoal")   
+        clicar_elemento(driver, By.XPATH, "/html/body/ngb-modal-window/div/div/form/div/div[1]/div[2]/div/select/option[15]", "Selecionado Tipo de Documento: Outros")
+
+        inserir_texto(driver, By.XPATH, '//*[@id="nroDoc"]', ano_mes, "Número do Documento inserido")
+        inserir_texto(driver, By.XPATH, '//*[@id="cpfCnpj"]', item.cpf, "CPF inserido")
+        clicar_elemento(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/div[1]', "Clicado no modal")
+        aguardar_consulta_cpf(driver)
+        # inserir_texto(driver, By.XPATH, '//*[@id="nomeCredor"]', nome, "Nome inserido")
+        inserir_texto(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[4]/div[1]/input', item.data_emissao, "Data de Emissão inserida")
+        inserir_texto(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[4]/div[2]/input', item.valor, "Valor inserido")
+        inserir_texto(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[4]/div[3]/input', item.data_pagamento, "Data de Pagamento inserida")
+        inserir_texto(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[4]/div[4]/input', item.valor, "Valor Total do Documento inserido")
+    aguardar_pagina_estavel(driver, "preenchimento")
+
+    # Upload de arquivo
+    xpath_upload = '/html/body/ngb-modal-window/div/div/form/div/div[7]/div[2]/div/div/div/input'
+    with medir("upload", "envio do arquivo"):
+        driver.find_element(By.XPATH, xpath_upload).send_keys(os.path.abspath(item.arquivo_envio or item.arquivo))
+    aguardar_upload(driver, xpath_upload)
+    log_and_emit(f"Arquivo {item.arquivo} enviado.")
+
+    if modo_simulacao:
+        # Só no log: o status "simulado" de cada linha já chega ao navegador pelo canal de progresso
+        log_and_emit("MODO SIMULAÇÃO: Clicando em Cancelar ao invés de Salvar")
+
+        clicar_elemento(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[8]/button[1]', "Clicado no botão CANCELAR")
+        return "simulado"
+
+    # Código original para salvar
+    clicar_elemento(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[8]/button[2]', "Clicado no botão SALVAR")
+    return "salvo"
+
+# ========= CONCILIAÇÃO COM OS DESEMBOLSOS JÁ LANÇADOS =========
+# Confere, antes de inserir, quais linhas já estão na tabela de desembolsos da parceria
+CONCILIAR_DESEMBOLSOS = True
+MAX_PAGINAS_DESEMBOLSOS = 200
+
+# Lê de uma vez a página atual da tabela de desembolsos: [[cpf, nº documento, valor], ...]
+# As colunas são localizadas pelo texto do cabeçalho; sem coluna de documento, o documento vem null
+JS_LER_DESEMBOLSOS = """
+var tabelas = document.querySelectorAll('app-exibe-parceria-usuario table');
+for (var t = 0; t < tabelas.length; t++) {
+    var cabecalhos = Array.prototype.map.call(tabelas[t].querySelectorAll('thead th'), function (th) {
+        return th.textContent.trim().toUpperCase();
+    });
+    var cpf = cabecalhos.findIndex(function (h) { return h.indexOf('CPF') >= 0; });
+    var documento = cabecalhos.findIndex(function (h) { return h.indexOf('DOC') >= 0; });
+    var valor = cabecalhos.findIndex(function (h) { return h.indexOf('VALOR') >= 0; });
+    if (cpf < 0 || valor < 0) continue;
+    return Array.prototype.map.call(tabelas[t].querySelectorAll('tbody tr'), function (tr) {
+        var td = tr.querySelectorAll('td');
+        return [
+            td[cpf] ? td[cpf].textContent.trim() : '',
+            documento >= 0 && td[documento] ? td[documento].textContent.trim() : null,
+            td[valor] ? td[valor].textContent.trim() : ''
+        ];
+    });
+}
+return null;
+"""
+
+# Avança a paginação da tabela (ngb-pagination); retorna false na última página
+JS_PROXIMA_PAGINA_DESEMBOLSOS = """
+var proxima = document.querySelector('app-exibe-parceria-usuario .pagination a[aria-label="Next"]');
+if (!proxima || proxima.closest('li').classList.contains('disabled')) return false;
+proxima.click();
+return true;
+"""
+
+# Função para converter um valor exibido ("R$ 1.500,50", "1.500", "1500,5") em centavos
+# Mesma leitura dos valores da planilha (texto_para_valor), para que as chaves dos dois lados confiram
+def valor_em_centavos(valor):
+    numero = texto_para_valor(valor)
+    return None if numero is None else round(numero * 100)
+
+# Função para montar a chave de conciliação: CPF + nº do documento (ano_mes) + valor em centavos
+def chave_desembolso(cpf, documento, valor):
+    return (
+        re.sub(r"\D", "", str(cpf)),
+        re.sub(r"\D", "", str(documento)) if documento is not None else None,
+        valor_em_centavos(valor)
+    )
+
+# Função para ler todos os desembolsos já lançados na parceria (todas as páginas da tabela)
+@medido("navegacao", rotulo="leitura dos desembolsos lançados")
+def ler_desembolsos(driver):
+    linhas = []
+    anterior = None
+    for _ in range(MAX_PAGINAS_DESEMBOLSOS):
+        pagina = driver.execute_script(JS_LER_DESEMBOLSOS)
+        if pagina is None:
+            raise Exception("Tabela de desembolsos não encontrada")
+        if pagina and pagina == anterior:  # A paginação não avançou
+            break
+        linhas.extend(pagina)
+        anterior = pagina
+        if not driver.execute_script(JS_PROXIMA_PAGINA_DESEMBOLSOS):
+            break
+        aguardar_pagina_estavel(driver, "paginação dos desembolsos")
+    return linhas
+
+# Função para retirar do plano as linhas que já estão lançadas no SGP
+# Retorna (plano sem as linhas já lançadas, itens já lançados)
+def conciliar_plano(plano, lancados, ano_mes):
+    existentes = {}
+    for cpf, documento, valor in lancados:
+        chave = chave_desembolso(cpf, documento, valor)
+        existentes[chave] = existentes.get(chave, 0) + 1
+
+    pendentes, ja_lancados = [], []
+    for item in plano.itens:
+        # Sem a coluna de documento na tabela, a conferência é só por CPF + valor
+        for chave in (chave_desembolso(item.cpf, ano_mes, item.valor), chave_desembolso(item.cpf, None, item.valor)):
+            if existentes.get(chave, 0) > 0:
+                existentes[chave] -= 1  # Linhas repetidas: cada lançamento cobre uma única linha
+                ja_lancados.append(item)
+                break
+        else:
+            pendentes.append(item)
+    return plano._replace(itens=tuple(pendentes)), ja_lancados
+
+# Função para ler os desembolsos da parceria com um navegador do pool e conciliar o plano
+# Em caso de falha a execução segue com o plano completo
+def conciliar_com_sgp(plano, parametros):
+    driver = None
+    saudavel = False
+    try:
+        driver = gerenciador_sessoes.obter(parametros)
+        selecionar_parceria(driver, parametros["orgao_publico"], parametros["parceria"])
+        lancados = ler_desembolsos(driver)
+        saudavel = True
+    except Exception as e:
+        log_and_emit(f"Não foi possível ler os desembolsos já lançados, seguindo sem conciliação: {str(e)}", level="warning")
+        return plano, []
+    finally:
+        if driver:
+            gerenciador_sessoes.devolver(driver, saudavel)
+
+    plano, ja_lancados = conciliar_plano(plano, lancados, parametros["ano_mes"])
+    log_and_emit(f"Conciliação: {len(lancados)} desembolso(s) no SGP, {len(ja_lancados)} linha(s) já lançada(s) retirada(s) do plano.")
+    return plano, ja_lancados
+
+# Função executada por cada worker: abre seu próprio Chrome, faz login e consome a fila de itens
+def executar_worker(numero, fila, parametros, resultados, progresso, lock):
+    driver = None
+    processados = 0
+    saudavel = False
+    cancelar = parametros.get("cancelar")
+    canal = parametros.get("canal") or canal_progresso
+    _contexto_execucao.coletor = parametros.get("coletor")
+    _contexto_execucao.canal = canal
+    try:
+        driver = gerenciador_sessoes.obter(parametros)
+        selecionar_parceria(driver, parametros["orgao_publico"], parametros["parceria"])
+
+        while True:
+            if cancelar is not None and cancelar.is_set():
+                log_and_emit(f"[Worker {numero}] Execução cancelada, encerrando.", level="warning")
+                break
+            try:
+                item = fila.get_nowait()
+            except queue.Empty:
+                break
+
+            canal.linha_iniciada(numero, item.nome)
+            inicio = time.time()
+            try:
+                status = processar_item(driver, item, parametros["ano_mes"], parametros["modo_simulacao"])
+                erro = None
+            except Exception as e:
+                status, erro = "erro", str(e)
+                log_and_emit(f"[Worker {numero}] Erro ao processar {item.nome}: {erro}", level="error")
+                canal.mensagem(f"[Worker {numero}] Erro ao processar {item.nome}: {erro}", "error")
+                # Tenta fechar o modal para não contaminar o próximo registro
+                try:
+                    driver.find_element(By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[8]/button[1]').click()
+                except Exception:
+                    pass
+
+            if parametros.get("diario"):
+                parametros["diario"].registrar(item, status, erro)
+            metricas.contar("linhas", status)
+
+            processados += 1
+            with lock:
+                resultados.append({
+                    "linha": item.linha,
+                    "nome": item.nome,
+                    "arquivo": os.path.basename(item.arquivo),
+                    "status": status,
+                    "erro": erro,
+                    "worker": numero,
+                    "duracao": round(time.time() - inicio, 2)
+                })
+                progresso["processados"] += 1
+
+            canal.linha_concluida(numero, item.nome, status, erro)
+        saudavel = not (cancelar is not None and cancelar.is_set())
+    except Exception as e:
+        log_and_emit(f"[Worker {numero}] Erro: {str(e)}", level="error")
+        canal.mensagem(f"[Worker {numero}] Erro: {str(e)}", "error")
+    finally:
+        # Devolve o navegador ao pool de sessões; em erro ou cancelamento ele é encerrado
+        if driver:
+            gerenciador_sessoes.devolver(driver, saudavel)
+        _contexto_execucao.coletor = None
+        _contexto_execucao.canal = None
+        log_and_emit(f"[Worker {numero}] Finalizado com {processados} registro(s) processado(s).")
+
+# Função para distribuir os itens do plano entre N workers e consolidar o relatório
+# `resultados` e `progresso` podem ser passados para acompanhar a execução enquanto ela roda.
+# Com `parametros["em_lote"]` o progresso (total, contagem e ETA) é do lote inteiro: quem
+# inicia e finaliza o canal é o processar_lote, e as linhas retiradas do plano contam como processadas
+def processar_plano(plano, parametros, num_workers=1, resultados=None, progresso=None):
+    coletor = ColetorTempos()
+    canal = parametros.get("canal") or canal_progresso
+    parametros = dict(parametros, coletor=coletor, canal=canal)
+    resultados = [] if resultados is None else resultados
+    progresso = {} if progresso is None else progresso
+    em_lote = parametros.get("em_lote", False)
+    # Protege `resultados` e `progresso`, lidos pelo /execucoes enquanto a execução roda
+    lock = parametros.get("lock_progresso") or threading.Lock()
+
+    # Linhas retiradas do plano antes dos workers (PDF inválido ou já lançada no SGP)
+    def retirar(item, status, erro=None):
+        if parametros.get("diario"):
+            parametros["diario"].registrar(item, status, erro)
+        metricas.contar("linhas", status)
+        with lock:
+            resultados.append({
+                "linha": item.linha,
+                "nome": item.nome,
+                "arquivo": os.path.basename(item.arquivo),
+                "status": status,
+                "erro": erro,
+                "worker": None,
+                "duracao": 0
+            })
+            if em_lote:
+                progresso["processados"] = progresso.get("processados", 0) + 1
+        if em_lote:
+            canal.linha_concluida(None, item.nome, status, erro)
+
+    # PDFs corrompidos são recusados (e os grandes recomprimidos) antes de qualquer login
+    if parametros.get("preverificar", PREVERIFICAR_PDFS) and plano.itens:
+        plano, recusados = preverificar_plano(plano, parametros)
+        for item, erro in recusados:
+            retirar(item, "pdf_invalido", erro)
+
+    # Linhas que já estão no SGP não passam pelo modal
+    if parametros.get("conciliar", CONCILIAR_DESEMBOLSOS) and plano.itens:
+        _contexto_execucao.coletor = coletor
+        _contexto_execucao.canal = canal
+        plano, ja_lancados = conciliar_com_sgp(plano, parametros)
+        _contexto_execucao.coletor = None
+        _contexto_execucao.canal = None
+        for item in ja_lancados:
+            retirar(item, "ja_lancado")
+
+    fila = queue.Queue()
+    for item in plano.itens:
+        fila.put(item)
+    num_workers = max(1, min(int(num_workers), len(plano.itens))) if plano.itens else 0
+    if not em_lote:
+        with lock:
+            progresso.update({"processados": 0, "total": len(plano.itens)})
+        canal.iniciar(parametros.get("job_id"), len(plano.itens))
+
+    log_and_emit(f"Processando {len(plano.itens)} registro(s) com {num_workers} worker(s).")
+    workers = [
+        threading.Thread(target=executar_worker, args=(numero, fila, parametros, resultados, progresso, lock), daemon=True)
+        for numero in range(1, num_workers + 1)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    # Itens que sobraram na fila (cancelamento, ou todos os workers falharam no login)
+    cancelado = parametros.get("cancelar") is not None and parametros["cancelar"].is_set()
+    with lock:
+        while not fila.empty():
+            item = fila.get_nowait()
+            resultados.append({
+                "linha": item.linha,
+                "nome": item.nome,
+                "arquivo": os.path.basename(item.arquivo),
+                "status": "cancelado" if cancelado else "nao_processado",
+                "erro": None if cancelado else "Nenhum worker disponível",
+                "worker": None,
+                "duracao": 0
+            })
+        resultados.sort(key=lambda r: r["linha"])
+    resumo = {}
+    for resultado in resultados:
+        resumo[resultado["status"]] = resumo.get(resultado["status"], 0) + 1
+
+    if not em_lote:
+        canal.finalizar(resumo)
+
+    esperas = coletor.esperas()
+    log_and_emit(f"Tempo médio de espera por etapa: {esperas}")
+
+    tempos = coletor.resumo()
+    arquivo_tempos = gravar_resumo_tempos(tempos, resumo)
+
+    return {
+        "total": len(resultados),
+        "workers": num_workers,
+        "resumo": resumo,
+        "esperas": esperas,
+        "tempos": tempos,
+        "arquivo_tempos": arquivo_tempos,
+        "resultados": resultados
+    }
+
+# Função para gravar o resumo de tempos da execução ao lado do arquivo de log
+def gravar_resumo_tempos(tempos, resumo):
+    caminho = os.path.join(log_dir, f"{os.path.splitext(log_filename)[0]}_tempos_{datetime.now().strftime('%H%M%S')}.json")
+    try:
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump({"gerado_em": datetime.now().isoformat(timespec="seconds"), "resumo": resumo, "etapas": tempos}, f, ensure_ascii=False, indent=2)
+        log_and_emit(f"Resumo de tempos gravado em {caminho}")
+        return caminho
+    except Exception as e:
+        log_and_emit(f"Erro ao gravar resumo de tempos: {e}", level="error")
+        return None
+
+# ========= DIÁRIO DE EXECUÇÃO (RETOMADA) =========
+# Estados de linha que contam como concluídos ao retomar uma execução
+ESTADOS_CONCLUIDOS = {
+    False: {"salvo", "ja_lancado"},  # execução real: só pula o que já foi salvo (ou já estava no SGP)
+    True: {"salvo", "ja_lancado", "simulado"}  # simulação: pula também o que já foi simulado
+}
+
+# Diário append-only (JSONL em logs/) com o estado de cada linha de uma planilha
+class DiarioExecucao:
+    """
+    Cada linha do arquivo é um registro {chave, linha, nome, estado, erro, em}.
+    A chave é a identidade do diário (planilha, espaço de trabalho, órgão/parceria e aba)
+    + CPF + valor (+ ocorrência, para linhas repetidas), e o último registro de cada
+    chave é o estado vigente.
+    """
+
+    def __init__(self, identidade, diretorio_logs=log_dir):
+        self.identidade = identidade
+        self.caminho = os.path.join(diretorio_logs, f"diario_{identidade}.jsonl")
+        self._lock = threading.Lock()
+        self._chaves = {}  # linha -> chave
+        self.estados = self._carregar()
+
+    @staticmethod
+    def hash_arquivo(caminho_planilha):
+        sha = hashlib.sha256()
+        with open(caminho_planilha, "rb") as f:
+            for bloco in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(bloco)
+        return sha.hexdigest()
+
+    @classmethod
+    def para_execucao(cls, hash_planilha, espaco, orgao_publico, parceria, aba=None, diretorio_logs=log_dir):
+        """Diário da planilha (ou de uma aba do lote) lançada por um espaço de trabalho para um órgão/parceria:
+        a mesma planilha em outro espaço ou para outra parceria não herda as linhas concluídas"""
+        identidade = ":".join(str(parte) for parte in (hash_planilha, espaco, orgao_publico, parceria, aba or ""))
+        return cls(hashlib.sha256(identidade.encode("utf-8")).hexdigest()[:16], diretorio_logs)
+
+    def _carregar(self):
+        estados = {}
+        if not os.path.exists(self.caminho):
+            return estados
+        with open(self.caminho, "rb") as f:
+            conteudo = f.read()
+        completo = conteudo[:conteudo.rfind(b"\n") + 1]
+        for linha in completo.splitlines():
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                continue  # Linha corrompida: as demais continuam valendo
+            estados[registro["chave"]] = registro["estado"]
+        if len(completo) < len(conteudo):
+            # Última linha truncada por queda do processo: é descartada, senão o próximo registro
+            # seria acrescentado na mesma linha e também se perderia
+            with open(self.caminho, "r+b") as f:
+                f.truncate(len(completo))
+        return estados
+
+    def preparar(self, plano):
+        ocorrencias = {}
+        for item in plano.itens:
+            base = f"{self.identidade}:{item.cpf}:{item.valor}"
+            ocorrencias[base] = ocorrencias.get(base, 0) + 1
+            self._chaves[item.linha] = f"{base}#{ocorrencias[base]}"
+
+    def chave(self, item):
+        return self._chaves[item.linha]
+
+    def filtrar_pendentes(self, plano, modo_simulacao):
+        concluidos = ESTADOS_CONCLUIDOS[bool(modo_simulacao)]
+        itens = tuple(item for item in plano.itens if self.estados.get(self.chave(item)) not in concluidos)
+        return plano._replace(itens=itens), len(plano.itens) - len(itens)
+
+    def _gravar(self, registros):
+        with self._lock:
+            with open(self.caminho, "a", encoding="utf-8") as f:
+                for registro in registros:
+                    f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                    self.estados[registro["chave"]] = registro["estado"]
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _registro(self, item, estado, erro=None):
+        return {
+            "chave": self.chave(item),
+            "linha": item.linha,
+            "nome": str(item.nome),
+            "estado": estado,
+            "erro": erro,
+            "em": datetime.now().isoformat(timespec="seconds")
+        }
+
+    def registrar_pendentes(self, itens):
+        self._gravar([self._registro(item, "pendente") for item in itens])
+
+    def registrar(self, item, estado, erro=None):
+        self._gravar([self._registro(item, estado, erro)])
+
+# ========= EXECUÇÕES EM SEGUNDO PLANO =========
+# Quantidade de execuções finalizadas mantidas em memória para consulta
+MAX_EXECUCOES_HISTORICO = 50
+
+# Uma execução do robô (job) enfileirada pelo /start_robot
+class Execucao:
+    def __init__(self, plano, parametros, num_workers, espaco=ESPACO_PADRAO, etapas=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.espaco = espaco
+        self.etapas = etapas  # Execução em lote: uma etapa por aba/parceria (ver processar_lote)
+        self.plano = plano
+        # O lock de progresso é o mesmo dos workers: para_json lê `progresso` e `resultados` com ele
+        self.parametros = dict(parametros, cancelar=threading.Event(), job_id=self.id, lock_progresso=threading.Lock())
+        self.num_workers = num_workers
+        self.status = "na_fila"  # na_fila, executando, concluida, erro, cancelada
+        self.mensagem = None
+        self.criado_em = datetime.now().isoformat(timespec="seconds")
+        self.iniciado_em = None
+        self.finalizado_em = None
+        self.resultados = []
+        self.progresso = {"processados": 0, "total": len(plano.itens)}
+        self.relatorio = None
+
+    def cancelar(self):
+        self.parametros["cancelar"].set()
+
+    def para_json(self, incluir_resultados=False):
+        with self.parametros["lock_progresso"]:
+            progresso = dict(self.progresso)
+            resultados = list(self.resultados) if incluir_resultados else None
+        dados = {
+            "job_id": self.id,
+            "espaco": self.espaco,
+            "status": self.status,
+            "mensagem": self.mensagem,
+            "criado_em": self.criado_em,
+            "iniciado_em": self.iniciado_em,
+            "finalizado_em": self.finalizado_em,
+            "progresso": progresso,
+            "cancelamento_solicitado": self.parametros["cancelar"].is_set(),
+            "resumo": self.relatorio["resumo"] if self.relatorio else None
+        }
+        if self.etapas:
+            dados["etapas"] = [
+                {"aba": e.aba, "orgao_publico": e.orgao_publico, "parceria": e.parceria, "total": len(e.plano.itens)}
+                for e in self.etapas
+            ]
+        if incluir_resultados:
+            dados["resultados"] = resultados
+        return dados
+
+# Fila de execuções: em cada espaço de trabalho um thread executa os jobs um após o outro;
+# espaços diferentes executam em paralelo
+class FilaExecucoes:
+    def __init__(self):
+        self._filas = {}  # espaço -> fila de execuções
+        self._threads = {}  # espaço -> thread que consome a fila
+        self._execucoes = {}
+        self._lock = threading.Lock()
+
+    def enfileirar(self, execucao):
+        with self._lock:
+            self._execucoes[execucao.id] = execucao
+            self._descartar_antigas()
+            fila = self._filas.setdefault(execucao.espaco, queue.Queue())
+            thread = self._threads.get(execucao.espaco)
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=self._executar, args=(fila,), name=f"execucoes-{execucao.espaco}", daemon=True)
+                self._threads[execucao.espaco] = thread
+                thread.start()
+        fila.put(execucao)
+        return fila.qsize()
+
+    def obter(self, job_id):
+        with self._lock:
+            return self._execucoes.get(job_id)
+
+    def listar(self, espaco=None):
+        with self._lock:
+            return [e for e in self._execucoes.values() if espaco is None or e.espaco == espaco]
+
+    def em_andamento(self, espaco):
+        return any(e.status in ("na_fila", "executando") for e in self.listar(espaco))
+
+    def _descartar_antigas(self):
+        finalizadas = [e for e in self._execucoes.values() if e.status in ("concluida", "erro", "cancelada")]
+        for execucao in finalizadas[:max(0, len(finalizadas) - MAX_EXECUCOES_HISTORICO)]:
+            del self._execucoes[execucao.id]
+
+    def _executar(self, fila):
+        while True:
+            execucao = fila.get()
+            if execucao.parametros["cancelar"].is_set():
+                execucao.status = "cancelada"
+                execucao.finalizado_em = datetime.now().isoformat(timespec="seconds")
+                continue
+
+            execucao.status = "executando"
+            execucao.iniciado_em = datetime.now().isoformat(timespec="seconds")
+            socketio.emit("execucao_status", execucao.para_json())
+            try:
+                executar = processar_lote if execucao.etapas else processar_plano
+                execucao.relatorio = executar(
+                    execucao.etapas or execucao.plano, execucao.parametros, execucao.num_workers,
+                    resultados=execucao.resultados, progresso=execucao.progresso
+                )
+                execucao.status = "cancelada" if execucao.parametros["cancelar"].is_set() else "concluida"
+                log_and_emit(f"Processo finalizado. Resumo: {execucao.relatorio['resumo']}")
+            except Exception as e:
+                execucao.status = "erro"
+                execucao.mensagem = str(e)
+                log_and_emit(f"Erro na execução {execucao.id}: {str(e)}", level="error")
+            finally:
+                execucao.finalizado_em = datetime.now().isoformat(timespec="seconds")
+                socketio.emit("execucao_status", execucao.para_json())
+
+fila_execucoes = FilaExecucoes()
+
+# ========= ESPAÇOS DE TRABALHO =========
+# Um espaço de trabalho por operador/parceria: planilha, PDFs, índice de nomes, plano e execuções próprios
+class EspacoTrabalho:
+    def __init__(self, id, pasta=""):
+        self.id = id
+        self.pasta = pasta
+        self.planilha = os.path.join(pasta, "planilha.xlsx")
+        self.diretorio = os.path.join(pasta, diretorio)
+        self.canal = canal_progresso if id == ESPACO_PADRAO else CanalProgresso(espaco=id)
+        self.ultimo_plano = None  # Último plano montado (exposto em /plano_execucao)
+        os.makedirs(self.diretorio, exist_ok=True)
+
+    def para_json(self):
+        pdfs = obter_indice(self.diretorio).pdfs() if os.path.isdir(self.diretorio) else []
+        return {
+            "id": self.id,
+            "planilha": os.path.exists(self.planilha),
+            "pdfs": len(pdfs),
+            "execucoes": [e.id for e in fila_execucoes.listar(self.id)],
+            "em_andamento": fila_execucoes.em_andamento(self.id)
+        }
+
+# Registro dos espaços de trabalho; os espaços criados ficam em espacos/<id>/ e são recarregados na subida
+class EspacosTrabalho:
+    NOME_VALIDO = re.compile(r"^[a-z0-9][a-z0-9_-]{0,39}$")
+
+    def __init__(self, pasta=PASTA_ESPACOS):
+        self.pasta = pasta
+        self._lock = threading.Lock()
+        self._espacos = {}
+
+    def carregar(self):
+        espacos = {ESPACO_PADRAO: EspacoTrabalho(ESPACO_PADRAO)}
+        if os.path.isdir(self.pasta):
+            for nome in sorted(os.listdir(self.pasta)):
+                if self.NOME_VALIDO.match(nome) and nome != ESPACO_PADRAO:
+                    espacos[nome] = EspacoTrabalho(nome, os.path.join(self.pasta, nome))
+        with self._lock:
+            self._espacos = espacos
+
+    def criar(self, nome=None):
+        nome = (nome or uuid.uuid4().hex[:8]).strip().lower()
+        if not self.NOME_VALIDO.match(nome):
+            raise ValueError("Nome do espaço de trabalho inválido: use letras minúsculas, números, - e _ (até 40 caracteres)")
+        with self._lock:
+            if nome in self._espacos:
+                raise ValueError(f"Espaço de trabalho '{nome}' já existe")
+            espaco = EspacoTrabalho(nome, os.path.join(self.pasta, nome))
+            self._espacos[nome] = espaco
+        log_and_emit(f"Espaço de trabalho criado: {nome}")
+        return espaco
+
+    def obter(self, nome):
+        with self._lock:
+            return self._espacos.get(nome)
+
+    def listar(self):
+        with self._lock:
+            return list(self._espacos.values())
+
+    def remover(self, nome):
+        if nome == ESPACO_PADRAO:
+            raise ValueError("O espaço de trabalho padrão não pode ser excluído")
+        if fila_execucoes.em_andamento(nome):
+            raise ValueError("O espaço de trabalho tem execuções na fila ou em andamento")
+        with self._lock:
+            espaco = self._espacos.pop(nome, None)
+        if espaco is None:
+            raise KeyError(nome)
+        shutil.rmtree(espaco.pasta, ignore_errors=True)
+        with _indices_lock:
+            _indices_arquivos.pop(os.path.abspath(espaco.diretorio), None)
+        log_and_emit(f"Espaço de trabalho excluído: {nome}")
+
+espacos_trabalho = EspacosTrabalho()
+
+# Função para obter o espaço de trabalho da requisição (`espaco` na URL, no formulário ou no JSON)
+def espaco_da_requisicao():
+    nome = request.args.get("espaco") or request.form.get("espaco")
+    if not nome and request.is_json:
+        nome = (request.get_json(silent=True) or {}).get("espaco")
+    return espacos_trabalho.obter(nome or ESPACO_PADRAO)
+
+# Resposta padrão para espaço de trabalho inexistente
+def espaco_nao_encontrado():
+    return jsonify({"status": "error", "message": "Espaço de trabalho não encontrado"}), 404
+
+# Rota para listar os espaços de trabalho
+@app.route("/espacos")
+def listar_espacos():
+    return jsonify({"status": "success", "espacos": [e.para_json() for e in espacos_trabalho.listar()]})
+
+# Rota para criar um espaço de trabalho (JSON opcional: {"nome": "parceria-12"})
+@app.route("/espacos", methods=["POST"])
+def criar_espaco():
+    try:
+        espaco = espacos_trabalho.criar((request.get_json(silent=True) or {}).get("nome"))
+        return jsonify({"status": "success", "espaco": espaco.para_json()})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)})
+
+# Rota para excluir um espaço de trabalho com sua planilha e seus PDFs
+@app.route("/espacos/<nome>/excluir", methods=["POST"])
+def excluir_espaco(nome):
+    try:
+        espacos_trabalho.remover(nome)
+        return jsonify({"status": "success", "message": f"Espaço de trabalho '{nome}' excluído"})
+    except KeyError:
+        return espaco_nao_encontrado()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)})
+
+# Função para montar os parâmetros comuns de uma execução a partir do payload e do config.json
+# Retorna (parametros, num_workers)
+def parametros_execucao(data, espaco):
+    # Ler configurações do JSON
+    with open("config.json", "r") as f:
+        config = json.load(f)
+
+    # Criar variável ano_mes
+    ano_mes = datetime.now().strftime("%Y%m")
+    log_and_emit(f"Ano e mês: {ano_mes}")
+
+    parametros = {
+        "url": config["url"],
+        "usuario": config["usuario"],
+        "senha": config["senha"],
+        "headless_mode": data.get("headless_mode", True),  # Por padrão é True
+        "modo_simulacao": data.get("modo_simulacao", False),  # Por padrão é False
+        "ano_mes": ano_mes,
+        "conciliar": data.get("conciliar", CONCILIAR_DESEMBOLSOS),  # Pula linhas que já estão lançadas no SGP
+        "modo_enxuto": data.get("modo_enxuto", config.get("modo_enxuto", MODO_ENXUTO)),  # Bloqueia recursos pesados e não espera o onload
+        "preverificar": data.get("preverificar", PREVERIFICAR_PDFS),  # Abre os PDFs e recomprime os grandes antes do login
+        "limite_pdf_mb": data.get("limite_pdf_mb") or config.get("limite_pdf_mb", LIMITE_TAMANHO_PDF_MB),
+        "canal": espaco.canal
+    }
+    # Número de navegadores em paralelo (payload > config.json > 1)
+    return parametros, data.get("num_workers") or config.get("num_workers", 1)
+
+# Função principal que inicia o robô: valida, monta o plano e enfileira a execução
 @app.route("/start_robot", methods=["POST"])
 def start_robot():
     try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
+
         # Ler dados do frontend
         data = request.json
         data_emissao = data.get("data_emissao")
         data_pagamento = data.get("data_pagamento")
         orgao_publico = data.get("orgao_publico")
         parceria = data.get("parceria")
-        headless_mode = data.get("headless_mode", True)  # Por padrão é True
         modo_simulacao = data.get("modo_simulacao", False)  # Por padrão é False
+        retomar = data.get("retomar", False)  # Pula linhas já concluídas em execuções anteriores
 
-        # Ler configurações do JSON
-        with open("config.json", "r") as f:
-            config = json.load(f)
-
-        url, usuario, senha = config["url"], config["usuario"], config["senha"]
-
-        # Criar variável ano_mes
-        ano_mes = datetime.now().strftime("%Y%m")
-        log_and_emit(f"Ano e mês: {ano_mes}")
+        parametros, num_workers = parametros_execucao(data, espaco)
 
         # Carregar a planilha
-        df = pd.read_excel("planilha.xlsx")
+        df = pd.read_excel(espaco.planilha)
 
         # 🚨 Verificar se TODOS os arquivos estão disponíveis ANTES de continuar
-        if not verificar_arquivos(df):
-            return jsonify({"status": "error", "message": "Faltam arquivos PDF. Processo abortado!"})
-
-        # Iniciar Selenium (Só será executado se todos os arquivos existirem)
-        driver = iniciar_selenium(headless_mode)
-        driver.get(url)
-
-        # Fazer login
-        socketio.emit("mensagem_personalizada", {"message": "Iniciando Login...", "level": "info"})
-        inserir_texto(driver, By.ID, "username", usuario, "Usuário inserido:")
-        inserir_texto(driver, By.ID, "password", senha, "Senha inserida:")
-        clicar_elemento(driver, By.XPATH, '//*[@id="kc-login"]', "Clicado em Entrar")
-        socketio.emit("mensagem_personalizada", {"message": "Login realizado!", "level": "info"})
-
-        # Selecionar Órgão da Administração Pública
-        seletor_orgao = f"/html/body/app-root/app-exibe-parceria-usuario/div/div[1]/div/div/select/option[{orgao_publico}]"
-                          
-        clicar_elemento(driver, By.XPATH, seletor_orgao, f"Selecionado Órgão ID {orgao_publico}")
-
-        # Selecionar Parceria
-        seletor_parceria = f"/html/body/app-root/app-exibe-parceria-usuario/div/div[1]/div[2]/div/select/option[{parceria}]"
-                             
-                             
-        clicar_elemento(driver, By.XPATH, seletor_parceria, f"Selecionado Parceria ID {parceria}")
-
-        # Função para encontrar coluna independente de maiúscula/minúscula
-        def encontrar_coluna(df, nome_coluna):
-            for col in df.columns:
-                if col.lower() == nome_coluna.lower():
-                    return col
-            raise KeyError(f"Coluna '{nome_coluna}' não encontrada. Colunas disponíveis: {list(df.columns)}")
-
-        # Encontrar as colunas corretas independente de case
-        col_nome = encontrar_coluna(df, "nome")
-        col_cpf = encontrar_coluna(df, "cpf")
-        col_valor = encontrar_coluna(df, "valor")
-
-        # Clicar no botão de inclusão
-        clicar_elemento(driver, By.XPATH, '//*[@id="desembolsos-header"]/button', "Clicado em Incluir Desembolsos")
-
-        # Processar planilha
-        for _, row in df.iterrows():
-            nome, cpf, valor = row[col_nome], row[col_cpf], row[col_valor]
-            
-            # Limpar CPF removendo caracteres especiais e espaços
-            cpf_limpo = limpar_cpf(cpf)
-            
-            arquivo_existe = encontrar_arquivo(nome, diretorio)
+        plano = verificar_arquivos(df, data_emissao, data_pagamento, espaco.diretorio, espaco.canal)
+        if not plano:
+            return jsonify({"status": "error", "message": "Faltam arquivos PDF ou há linhas com CPF/valor inválido. Processo abortado!"})
+
+        espaco.ultimo_plano = plano
+
+        # Diário da planilha: permite retomar após queda do Chrome ou da sessão
+        diario = DiarioExecucao.para_execucao(DiarioExecucao.hash_arquivo(espaco.planilha), espaco.id, orgao_publico, parceria)
+        diario.preparar(plano)
+        pulados = 0
+        if retomar:
+            plano, pulados = diario.filtrar_pendentes(plano, modo_simulacao)
+            log_and_emit(f"Retomando execução: {pulados} registro(s) já concluído(s) serão pulados.")
+            espaco.canal.mensagem(f"Retomando: {pulados} registro(s) já concluído(s), {len(plano.itens)} restante(s)", imediata=True)
+        if not plano.itens:
+            return jsonify({"status": "success", "job_id": None, "pulados": pulados, "message": "Todos os registros já foram concluídos"})
+        diario.registrar_pendentes(plano.itens)
+
+        # Enfileirar a execução (o Selenium só será iniciado se todos os arquivos existirem)
+        parametros.update({"orgao_publico": orgao_publico, "parceria": parceria, "diario": diario})
+        execucao = Execucao(plano, parametros, num_workers, espaco.id)
+        posicao = fila_execucoes.enfileirar(execucao)
+        log_and_emit(f"Execução {execucao.id} enfileirada no espaço {espaco.id} ({len(plano.itens)} registro(s)).")
+
+        return jsonify({"status": "success", "job_id": execucao.id, "espaco": espaco.id, "posicao_fila": posicao, "pulados": pulados})
 
-            socketio.emit("mensagem_personalizada", {"message": f"Inserindo dados de {nome}", "level": "info"})
+    except Exception as e:
+        log_and_emit(f"Erro: {str(e)}", level="error")
+        return jsonify({"status": "error", "message": str(e)})
 
-            if not arquivo_existe:
-                log_and_emit(f"Pulando {nome} pois o arquivo não existe.", level="warning")
-                continue
-            valor_formatado = f"{valor},00"
-            # Converter datas do payload antes de inseri-las
-            data_emissao_formatada = formatar_data(data_emissao)
-            data_pagamento_formatada = formatar_data(data_pagamento)
-
-            clicar_elemento(driver, By.XPATH, '//*[@id="button-insert"]', "Clicado em Adicionar Novo Registro")
-            clicar_elemento(driver, By.XPATH, "/html/body/ngb-modal-window/div/div/form/div/div[1]/div[1]/div/select/option[2]", "Selecionado Natureza da Despesa: Pagamento de Pessoal")   
-            clicar_elemento(driver, By.XPATH, "/html/body/ngb-modal-window/div/div/form/div/div[1]/div[2]/div/select/option[15]", "Selecionado Tipo de Documento: Outros")
-
-            inserir_texto(driver, By.XPATH, '//*[@id="nroDoc"]', ano_mes, "Número do Documento inserido")
-            inserir_texto(driver, By.XPATH, '//*[@id="cpfCnpj"]', cpf_limpo, "CPF inserido")
-            clicar_elemento(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/div[1]', "Clicado no modal")
-            time.sleep(3)
-            # inserir_texto(driver, By.XPATH, '//*[@id="nomeCredor"]', nome, "Nome inserido")
-            inserir_texto(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[4]/div[1]/input', data_emissao_formatada, "Data de Emissão inserida")
-            inserir_texto(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[4]/div[2]/input', str(valor_formatado), "Valor inserido")
-            inserir_texto(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[4]/div[3]/input', data_pagamento_formatada, "Data de Pagamento inserida")
-            inserir_texto(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[4]/div[4]/input', str(valor_formatado), "Valor Total do Documento inserido")
-            time.sleep(3)
-
-            # Upload de arquivo
-            if arquivo_existe:
-                driver.find_element(By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[7]/div[2]/div/div/div/input').send_keys(os.path.abspath(arquivo_existe))
-                log_and_emit(f"Arquivo {arquivo_existe} enviado.")
-                time.sleep(3)
-
-            if modo_simulacao:
-                log_and_emit("MODO SIMULAÇÃO: Clicando em Cancelar ao invés de Salvar")
-                socketio.emit("mensagem_personalizada", {"message": "MODO SIMULAÇÃO: Clicando em Cancelar ao invés de Salvar", "level": "warning"})
-                
-                clicar_elemento(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[8]/button[1]', "Clicado no botão CANCELAR")
+# ========= EXECUÇÃO EM LOTE (VÁRIAS PARCERIAS) =========
+# Aba da planilha com o mapeamento aba -> órgão/parceria (colunas Aba, Órgão e Parceria)
+ABA_MANIFESTO = "manifesto"
+
+# Sem manifesto, abas com nome "órgão-parceria" (por exemplo "4-11") entram no lote
+PADRAO_ABA_PARCERIA = re.compile(r"^\s*(\d+)\s*[-_]\s*(\d+)\s*$")
+
+# Uma etapa do lote: a aba da planilha e a parceria onde seus registros são lançados
+EtapaLote = namedtuple("EtapaLote", ["aba", "orgao_publico", "parceria", "plano", "diario"])
+
+# Função para converter o código de órgão/parceria vindo do Excel ou do JSON ("4", 4 ou 4.0) em texto
+def codigo_parceria(valor):
+    texto = str(valor).strip()
+    try:
+        return str(int(float(texto)))
+    except ValueError:
+        return texto
+
+# Função para encontrar a coluna do manifesto aceitando nomes alternativos
+def coluna_manifesto(df, *nomes):
+    for nome in nomes:
+        try:
+            return encontrar_coluna(df, nome)
+        except KeyError:
+            continue
+    raise KeyError(f"Coluna '{nomes[0]}' não encontrada no manifesto. Colunas disponíveis: {list(df.columns)}")
+
+# Função para ler o mapeamento aba -> (órgão, parceria) do lote, na ordem de prioridade:
+# campo `lote` do JSON, aba "manifesto" da planilha ou abas com nome "órgão-parceria"
+# Retorna [(aba, orgao_publico, parceria)] ordenado por órgão e parceria (menos trocas de tela no SGP)
+def ler_manifesto_lote(abas, lote=None):
+    mapeamento = []
+    manifesto = next((nome for nome in abas if str(nome).strip().lower() == ABA_MANIFESTO), None)
+    if lote:
+        mapeamento = [(str(e.get("aba", "")), codigo_parceria(e.get("orgao_publico")), codigo_parceria(e.get("parceria"))) for e in lote]
+    elif manifesto is not None:
+        df = abas[manifesto].dropna(how="all")
+        coluna_aba = coluna_manifesto(df, "aba", "planilha")
+        coluna_orgao = coluna_manifesto(df, "órgão", "orgao", "orgao_publico")
+        coluna_parceria = coluna_manifesto(df, "parceria")
+        mapeamento = [(str(linha[coluna_aba]).strip(), codigo_parceria(linha[coluna_orgao]), codigo_parceria(linha[coluna_parceria])) for _, linha in df.iterrows()]
+    else:
+        for nome in abas:
+            encontrado = PADRAO_ABA_PARCERIA.match(str(nome))
+            if encontrado:
+                mapeamento.append((str(nome), encontrado.group(1), encontrado.group(2)))
+
+    if not mapeamento:
+        raise ValueError("Nenhuma aba mapeada: inclua a aba 'manifesto' (Aba, Órgão, Parceria), nomeie as abas como 'órgão-parceria' ou envie o campo 'lote'")
+
+    nomes_abas = {str(nome): nome for nome in abas}
+    erros = []
+    for aba, orgao_publico, parceria in mapeamento:
+        if aba not in nomes_abas:
+            erros.append(f"Aba '{aba}' não existe na planilha")
+        elif not any(p["id"] == parceria for p in OPCOES_PARCERIAS.get(orgao_publico, [])):
+            erros.append(f"Aba '{aba}': parceria {parceria} não existe no órgão {orgao_publico}")
+    if erros:
+        raise ValueError("; ".join(erros))
+
+    return sorted(mapeamento, key=lambda m: (int(m[1]), int(m[2])))
+
+# Função para montar os planos de todas as abas do lote; retorna (etapas, faltando por aba)
+def montar_lote(abas, mapeamento, data_emissao, data_pagamento, diretorio_pdfs, hash_planilha, espaco=ESPACO_PADRAO):
+    nomes_abas = {str(nome): nome for nome in abas}
+    etapas, faltando = [], {}
+    for aba, orgao_publico, parceria in mapeamento:
+        plano = montar_plano_execucao(abas[nomes_abas[aba]], data_emissao, data_pagamento, diretorio_pdfs)
+        if plano.faltando:
+            faltando[aba] = list(plano.faltando)
+        diario = DiarioExecucao.para_execucao(hash_planilha, espaco, orgao_publico, parceria, aba)
+        diario.preparar(plano)
+        etapas.append(EtapaLote(aba, orgao_publico, parceria, plano, diario))
+    return etapas, faltando
+
+# Função para processar as etapas do lote em sequência, com um relatório consolidado.
+# Os navegadores voltam ao pool de sessões ao fim de cada etapa e a próxima os reaproveita já
+# logados: a troca de parceria é só a volta à tela de seleção, sem novo login
+def processar_lote(etapas, parametros, num_workers=1, resultados=None, progresso=None):
+    inicio = time.perf_counter()
+    resultados = [] if resultados is None else resultados
+    progresso = {} if progresso is None else progresso
+    cancelar = parametros.get("cancelar")
+    canal = parametros.get("canal") or canal_progresso
+    resumo, relatorio_etapas = {}, []
+
+    # Um único total para o lote: a contagem e o ETA não recomeçam a cada aba
+    total = sum(len(etapa.plano.itens) for etapa in etapas)
+    lock = parametros.get("lock_progresso") or threading.Lock()
+    parametros = dict(parametros, lock_progresso=lock)
+    with lock:
+        progresso.update({"processados": 0, "total": total})
+    canal.iniciar(parametros.get("job_id"), total)
+    # O pool de sessões guarda os navegadores de todos os workers entre uma etapa e outra
+    with gerenciador_sessoes.reservar(int(num_workers)):
+        for numero, etapa in enumerate(etapas, start=1):
+            identificacao = {"aba": etapa.aba, "orgao_publico": etapa.orgao_publico, "parceria": etapa.parceria}
+            if cancelar is not None and cancelar.is_set():
+                resultados_etapa = [
+                    {"linha": item.linha, "nome": item.nome, "arquivo": os.path.basename(item.arquivo), "status": "cancelado",
+                     "erro": None, "worker": None, "duracao": 0}
+                    for item in etapa.plano.itens
+                ]
+                relatorio = {"resumo": {"cancelado": len(resultados_etapa)} if resultados_etapa else {}, "workers": 0, "arquivo_tempos": None}
+                duracao = 0
             else:
-                # Código original para salvar
-                clicar_elemento(driver, By.XPATH, '/html/body/ngb-modal-window/div/div/form/div/div[8]/button[2]', "Clicado no botão SALVAR")
+                log_and_emit(f"Lote: etapa {numero}/{len(etapas)} - aba '{etapa.aba}' no órgão {etapa.orgao_publico}, parceria {etapa.parceria} ({len(etapa.plano.itens)} registro(s)).")
+                with lock:
+                    progresso["etapa"] = dict(identificacao, numero=numero, total_etapas=len(etapas))
+                parametros_etapa = dict(parametros, orgao_publico=etapa.orgao_publico, parceria=etapa.parceria, diario=etapa.diario, em_lote=True)
+                inicio_etapa = time.perf_counter()
+                resultados_etapa = []
+                relatorio = processar_plano(etapa.plano, parametros_etapa, num_workers, resultados=resultados_etapa, progresso=progresso)
+                duracao = time.perf_counter() - inicio_etapa
+
+            for resultado in resultados_etapa:
+                resultado.update(identificacao)
+            with lock:
+                resultados.extend(resultados_etapa)
+            for status, quantidade in relatorio["resumo"].items():
+                resumo[status] = resumo.get(status, 0) + quantidade
+            relatorio_etapas.append(dict(
+                identificacao,
+                total=len(resultados_etapa),
+                workers=relatorio["workers"],
+                resumo=relatorio["resumo"],
+                duracao=round(duracao, 2),
+                arquivo_tempos=relatorio["arquivo_tempos"]
+            ))
+    canal.finalizar(resumo)
+
+    relatorio = {
+        "total": len(resultados),
+        "workers": max((e["workers"] for e in relatorio_etapas), default=0),
+        "resumo": resumo,
+        "duracao": round(time.perf_counter() - inicio, 2),
+        "etapas": relatorio_etapas,
+        "resultados": resultados
+    }
+    relatorio["arquivo_relatorio"] = gravar_relatorio_lote(relatorio)
+    log_and_emit(f"Lote finalizado: {len(etapas)} etapa(s), resumo {resumo} em {relatorio['duracao']}s.")
+    return relatorio
+
+# Função para gravar o relatório consolidado do lote em logs/
+def gravar_relatorio_lote(relatorio):
+    caminho = os.path.join(log_dir, f"{os.path.splitext(log_filename)[0]}_lote_{datetime.now().strftime('%H%M%S')}.json")
+    try:
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(dict(relatorio, gerado_em=datetime.now().isoformat(timespec="seconds")), f, ensure_ascii=False, indent=2, default=str)
+        log_and_emit(f"Relatório do lote gravado em {caminho}")
+        return caminho
+    except Exception as e:
+        log_and_emit(f"Erro ao gravar relatório do lote: {e}", level="error")
+        return None
 
-            socketio.emit("mensagem_personalizada", {"message": f"Dados inseridos", "level": "info"})
+# Rota para executar todas as abas de uma planilha (uma parceria por aba) em uma única execução
+# JSON: os mesmos campos do /start_robot (sem órgão/parceria), `lote` opcional
+# ([{"aba": "Janeiro", "orgao_publico": "4", "parceria": "11"}, ...]) e `verificar` (só monta e valida)
+@app.route("/start_lote", methods=["POST"])
+def start_lote():
+    try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
+        if not os.path.exists(espaco.planilha):
+            return jsonify({"status": "error", "message": "Planilha não encontrada"})
 
-        log_and_emit("Processo finalizado.")
-        # driver.quit()
-        return jsonify({"status": "success"})
+        data = request.json or {}
+        modo_simulacao = data.get("modo_simulacao", False)
 
+        # Todas as abas em uma única leitura da planilha
+        abas = pd.read_excel(espaco.planilha, sheet_name=None)
+        try:
+            mapeamento = ler_manifesto_lote(abas, data.get("lote"))
+        except (KeyError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)})
+
+        hash_planilha = DiarioExecucao.hash_arquivo(espaco.planilha)
+        etapas, faltando = montar_lote(abas, mapeamento, data.get("data_emissao"), data.get("data_pagamento"), espaco.diretorio, hash_planilha, espaco.id)
+        resumo_etapas = [
+            {"aba": e.aba, "orgao_publico": e.orgao_publico, "parceria": e.parceria, "total": len(e.plano.itens), "faltando": faltando.get(e.aba, []),
+             "invalidos": list(e.plano.invalidos)}
+            for e in etapas
+        ]
+        if faltando:
+            mensagem_erro = "Processo abortado! Faltam arquivos PDF:\n" + "\n".join(
+                f"[{aba}] {', '.join(str(nome) for nome in nomes)}" for aba, nomes in faltando.items()
+            )
+            log_and_emit(mensagem_erro, level="error")
+            espaco.canal.mensagem(mensagem_erro, "error", imediata=True)
+            return jsonify({"status": "error", "message": "Faltam arquivos PDF. Processo abortado!", "etapas": resumo_etapas})
+        invalidos = {e.aba: e.plano.invalidos for e in etapas if e.plano.invalidos}
+        if invalidos:
+            mensagem_erro = "Processo abortado! Linhas com CPF ou valor inválido:\n" + "\n".join(
+                f"[{aba}] {linha}" for aba, linhas in invalidos.items() for linha in linhas
+            )
+            log_and_emit(mensagem_erro, level="error")
+            espaco.canal.mensagem(mensagem_erro, "error", imediata=True)
+            return jsonify({"status": "error", "message": "Há linhas com CPF ou valor inválido. Processo abortado!", "etapas": resumo_etapas})
+        if data.get("verificar"):
+            return jsonify({"status": "success", "etapas": resumo_etapas})
+
+        pulados = 0
+        if data.get("retomar", False):
+            pendentes = []
+            for etapa in etapas:
+                plano, pulados_etapa = etapa.diario.filtrar_pendentes(etapa.plano, modo_simulacao)
+                pendentes.append(etapa._replace(plano=plano))
+                pulados += pulados_etapa
+            etapas = pendentes
+            log_and_emit(f"Retomando lote: {pulados} registro(s) já concluído(s) serão pulados.")
+        etapas = [etapa for etapa in etapas if etapa.plano.itens]
+        if not etapas:
+            return jsonify({"status": "success", "job_id": None, "pulados": pulados, "message": "Todos os registros já foram concluídos"})
+        for etapa in etapas:
+            etapa.diario.registrar_pendentes(etapa.plano.itens)
+
+        parametros, num_workers = parametros_execucao(data, espaco)
+        plano_total = PlanoExecucao(
+            itens=tuple(item for etapa in etapas for item in etapa.plano.itens),
+            faltando=(),
+            criado_em=datetime.now().isoformat(timespec="seconds")
+        )
+        execucao = Execucao(plano_total, parametros, num_workers, espaco.id, etapas=etapas)
+        posicao = fila_execucoes.enfileirar(execucao)
+        log_and_emit(f"Lote {execucao.id} enfileirado no espaço {espaco.id}: {len(etapas)} etapa(s), {len(plano_total.itens)} registro(s).")
+
+        return jsonify({"status": "success", "job_id": execucao.id, "espaco": espaco.id, "posicao_fila": posicao, "pulados": pulados, "etapas": resumo_etapas})
     except Exception as e:
-        log_and_emit(f"Erro: {str(e)}", level="error")
+        log_and_emit(f"Erro ao iniciar lote: {str(e)}", level="error")
+        return jsonify({"status": "error", "message": str(e)})
+
+# Rota para listar as execuções (`?espaco=` filtra por espaço de trabalho)
+@app.route("/execucoes")
+def listar_execucoes():
+    execucoes = fila_execucoes.listar(request.args.get("espaco"))
+    return jsonify({"status": "success", "execucoes": [e.para_json() for e in execucoes]})
+
+# Rota para consultar o status de uma execução
+@app.route("/execucoes/<job_id>")
+def status_execucao(job_id):
+    execucao = fila_execucoes.obter(job_id)
+    if not execucao:
+        return jsonify({"status": "error", "message": "Execução não encontrada"}), 404
+    return jsonify({"status": "success", "execucao": execucao.para_json()})
+
+# Rota para consultar os resultados por linha de uma execução
+@app.route("/execucoes/<job_id>/resultados")
+def resultados_execucao(job_id):
+    execucao = fila_execucoes.obter(job_id)
+    if not execucao:
+        return jsonify({"status": "error", "message": "Execução não encontrada"}), 404
+    return jsonify({"status": "success", "execucao": execucao.para_json(incluir_resultados=True)})
+
+# Rota para cancelar uma execução (na fila ou em andamento)
+@app.route("/execucoes/<job_id>/cancelar", methods=["POST"])
+def cancelar_execucao(job_id):
+    execucao = fila_execucoes.obter(job_id)
+    if not execucao:
+        return jsonify({"status": "error", "message": "Execução não encontrada"}), 404
+    if execucao.status in ("concluida", "erro", "cancelada"):
+        return jsonify({"status": "error", "message": f"Execução já finalizada ({execucao.status})"})
+
+    execucao.cancelar()
+    log_and_emit(f"Cancelamento solicitado para a execução {job_id}.", level="warning")
+    execucao.parametros.get("canal", canal_progresso).mensagem("Cancelamento solicitado. O robô para após o registro atual.", "warning", imediata=True)
+    return jsonify({"status": "success", "message": "Cancelamento solicitado"})
+
+# Rota para a simulação rápida (offline, sem abrir o navegador)
+@app.route("/simular_offline", methods=["POST"])
+def simular_offline_rota():
+    try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
+        if not os.path.exists(espaco.planilha):
+            return jsonify({"status": "error", "message": "Planilha não encontrada"})
+
+        data = request.json or {}
+        df = pd.read_excel(espaco.planilha)
+        relatorio = simular_offline(df, data.get("data_emissao"), data.get("data_pagamento"), espaco.diretorio)
+        log_and_emit(f"Simulação offline: {relatorio['ok']} ok, {relatorio['com_erro']} com erro em {relatorio['tempo']}s.")
+        return jsonify({"status": "success", "relatorio": relatorio})
+    except Exception as e:
+        log_and_emit(f"Erro na simulação offline: {str(e)}", level="error")
+        return jsonify({"status": "error", "message": str(e)})
+
+# Rota com os eventos de progresso posteriores a `desde` (mesmo conteúdo do evento "progresso")
+@app.route("/progresso")
+def progresso():
+    espaco = espaco_da_requisicao()
+    if not espaco:
+        return espaco_nao_encontrado()
+    return jsonify({"status": "success", "eventos": espaco.canal.desde(request.args.get("desde", 0, type=int))})
+
+# Rota com as métricas de tempo no formato do Prometheus
+@app.route("/metrics")
+def metrics():
+    return app.response_class(metricas.prometheus(), mimetype="text/plain; version=0.0.4")
+
+# Rota para consultar o log do início atual, filtrando por nível mínimo e texto
+@app.route("/logs")
+def logs():
+    niveis = ["DEBUG", "INFO", "WARNING", "ERROR"]
+    nivel = request.args.get("nivel", "INFO").upper()
+    minimo = niveis.index(nivel) if nivel in niveis else 1
+    contendo = request.args.get("contendo", "")
+    limite = request.args.get("limite", 200, type=int)
+
+    registros = []
+    if os.path.exists(log_path):
+        with open(log_path, encoding="utf-8") as f:
+            for linha in f:
+                if contendo and contendo not in linha:
+                    continue
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue
+                if registro.get("nivel") in niveis and niveis.index(registro["nivel"]) >= minimo:
+                    registros.append(registro)
+    return jsonify({"status": "success", "arquivo": log_path, "registros": registros[-limite:]})
+
+# Rota para consultar os navegadores logados mantidos entre execuções
+@app.route("/sessoes")
+def listar_sessoes():
+    return jsonify({"status": "success", "sessoes": gerenciador_sessoes.status()})
+
+# Rota para encerrar os navegadores ociosos
+@app.route("/sessoes/encerrar", methods=["POST"])
+def encerrar_sessoes():
+    encerradas = gerenciador_sessoes.encerrar_todas()
+    return jsonify({"status": "success", "message": f"{encerradas} navegador(es) encerrado(s)"})
+
+# Rota para montar e exibir o plano de execução sem iniciar o navegador
+@app.route("/plano_execucao", methods=["GET", "POST"])
+def plano_execucao():
+    try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
+        if request.method == "GET":
+            if espaco.ultimo_plano is None:
+                return jsonify({"status": "error", "message": "Nenhum plano de execução montado"})
+            return jsonify({"status": "success", "plano": plano_para_json(espaco.ultimo_plano)})
+
+        if not os.path.exists(espaco.planilha):
+            return jsonify({"status": "error", "message": "Planilha não encontrada"})
+
+        data = request.json or {}
+        df = pd.read_excel(espaco.planilha)
+        espaco.ultimo_plano = montar_plano_execucao(df, data.get("data_emissao"), data.get("data_pagamento"), espaco.diretorio)
+        return jsonify({"status": "success", "plano": plano_para_json(espaco.ultimo_plano)})
+    except Exception as e:
+        log_and_emit(f"Erro ao montar plano de execução: {str(e)}", level="error")
+        return jsonify({"status": "error", "message": str(e)})
+
+# ========= ARMAZÉM DE OBJETOS (DEDUPLICAÇÃO POR CONTEÚDO) =========
+# Objetos gravados em logs/objetos/<2 primeiros>/<sha256>; PDFs e planilhas dos espaços são hardlinks para eles
+PASTA_OBJETOS = os.path.join(log_dir, "objetos")
+# Arquivos até este tamanho são hasheados em memória antes de qualquer gravação em disco
+LIMITE_MEMORIA_OBJETO = 16 * 1024 * 1024
+# Retenção dos backups de planilha: no máximo N por espaço e nenhum mais antigo que D dias
+BACKUPS_MAXIMO_POR_ESPACO = 20
+BACKUP_DIAS_RETENCAO = 90
+# Objetos sem referência só são apagados depois deste tempo (em segundos), para não apagar um envio em curso
+OBJETO_CARENCIA = 60 * 60
+
+# Armazém endereçado por conteúdo: o mesmo conteúdo é gravado uma única vez
+class ArmazemObjetos:
+    """
+    Um objeto é mantido enquanto houver um backup que o referencia ou um arquivo
+    materializado (hardlink) apontando para ele; os demais são coletados.
+    Se algum objeto já foi materializado como cópia (sistema sem hardlink), a contagem
+    de links não diz mais quem está em uso e a coleta fica desligada.
+    Os backups de planilha são registros {hash, espaco, motivo, tamanho, criado_em}
+    em backups.json, e não cópias do arquivo.
+    """
+
+    def __init__(self, pasta=PASTA_OBJETOS):
+        self.pasta = pasta
+        self.caminho_backups = os.path.join(pasta, "backups.json")
+        # Marca gravada na primeira cópia; fica em disco porque as cópias continuam nos espaços após reiniciar
+        self.caminho_marca_copias = os.path.join(pasta, "materializado_por_copia")
+        self._lock = threading.Lock()
+
+    def preparar(self):
+        os.makedirs(self.pasta, exist_ok=True)
+
+    def caminho(self, hash_objeto):
+        return os.path.join(self.pasta, hash_objeto[:2], hash_objeto)
+
+    def gravar_fluxo(self, fluxo):
+        """Grava o conteúdo de `fluxo` calculando o hash durante a leitura; retorna (hash, tamanho, novo)"""
+        sha = hashlib.sha256()
+        tamanho = 0
+        blocos = []
+        temporario = None
+        saida = None
+        try:
+            for bloco in iter(lambda: fluxo.read(1024 * 1024), b""):
+                sha.update(bloco)
+                tamanho += len(bloco)
+                if saida is None and tamanho > LIMITE_MEMORIA_OBJETO:
+                    # Arquivo grande: continua a leitura direto para um temporário dentro do armazém
+                    descritor, temporario = tempfile.mkstemp(dir=self.pasta, suffix=".tmp")
+                    saida = os.fdopen(descritor, "wb")
+                    saida.writelines(blocos)
+                    blocos = []
+                if saida is not None:
+                    saida.write(bloco)
+                else:
+                    blocos.append(bloco)
+            if saida is not None:
+                saida.close()
+                saida = None
+
+            hash_objeto = sha.hexdigest()
+            destino = self.caminho(hash_objeto)
+            if os.path.exists(destino):
+                # Conteúdo já presente: nada é gravado, apenas renova a carência do objeto
+                os.utime(destino)
+                return hash_objeto, tamanho, False
+
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            if temporario is None:
+                descritor, temporario = tempfile.mkstemp(dir=self.pasta, suffix=".tmp")
+                with os.fdopen(descritor, "wb") as f:
+                    f.writelines(blocos)
+            os.replace(temporario, destino)
+            temporario = None
+            return hash_objeto, tamanho, True
+        finally:
+            if saida is not None:
+                saida.close()
+            if temporario is not None and os.path.exists(temporario):
+                os.remove(temporario)
+
+    def gravar_arquivo(self, caminho):
+        with open(caminho, "rb") as f:
+            return self.gravar_fluxo(f)
+
+    def materializar(self, hash_objeto, destino):
+        """
+        Coloca o objeto em `destino` (hardlink, ou cópia se o sistema não suportar); retorna False se já era igual.
+        Como o arquivo materializado compartilha o conteúdo com o objeto, quem grava nas pastas dos
+        espaços grava em um temporário e troca com os.replace (ver mover_substituindo), nunca por cima.
+        """
+        origem = self.caminho(hash_objeto)
+        if os.path.exists(destino):
+            if os.path.samefile(origem, destino):
+                return False
+            if os.path.getsize(destino) == os.path.getsize(origem) and DiarioExecucao.hash_arquivo(destino) == hash_objeto:
+                return False
+        temporario = destino + ".parcial"
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        try:
+            os.link(origem, temporario)
+        except OSError:
+            if not os.path.exists(self.caminho_marca_copias):
+                open(self.caminho_marca_copias, "w").close()
+                log_and_emit("Armazém de objetos: hardlink não suportado, materializando por cópia; a coleta de objetos fica desligada.", level="warning")
+            shutil.copyfile(origem, temporario)
+        os.replace(temporario, destino)
+        return True
+
+    def _ler_backups(self):
+        try:
+            with open(self.caminho_backups, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def _gravar_backups(self, backups):
+        temporario = self.caminho_backups + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(backups, f, ensure_ascii=False, indent=1)
+        os.replace(temporario, self.caminho_backups)
+
+    @staticmethod
+    def _aplicar_retencao(backups):
+        limite = (datetime.now() - timedelta(days=BACKUP_DIAS_RETENCAO)).isoformat(timespec="seconds")
+        mantidos, por_espaco = [], {}
+        for backup in sorted(backups, key=lambda b: b["criado_em"], reverse=True):
+            if backup["criado_em"] < limite:
+                continue
+            por_espaco[backup["espaco"]] = por_espaco.get(backup["espaco"], 0) + 1
+            if por_espaco[backup["espaco"]] <= BACKUPS_MAXIMO_POR_ESPACO:
+                mantidos.append(backup)
+        return mantidos
+
+    def registrar_backup(self, caminho, espaco, motivo, criado_em=None):
+        """Guarda a planilha como referência ao objeto; backups iguais em sequência não são repetidos"""
+        hash_objeto, tamanho, novo = self.gravar_arquivo(caminho)
+        backup = {
+            "hash": hash_objeto,
+            "espaco": espaco,
+            "motivo": motivo,
+            "tamanho": tamanho,
+            "criado_em": criado_em or datetime.now().isoformat(timespec="seconds")
+        }
+        with self._lock:
+            backups = self._ler_backups()
+            ultimo = next((b for b in sorted(backups, key=lambda b: b["criado_em"], reverse=True) if b["espaco"] == espaco), None)
+            if ultimo and ultimo["hash"] == hash_objeto:
+                backup = ultimo
+            else:
+                backups.append(backup)
+            self._gravar_backups(self._aplicar_retencao(backups))
+        self.coletar()
+        return backup, novo
+
+    def listar_backups(self, espaco=None):
+        with self._lock:
+            backups = self._ler_backups()
+        return sorted((b for b in backups if espaco is None or b["espaco"] == espaco), key=lambda b: b["criado_em"], reverse=True)
+
+    def coletar(self):
+        """Apaga objetos sem backup e sem hardlink nos espaços (após a carência); retorna (objetos, bytes) liberados"""
+        if os.path.exists(self.caminho_marca_copias):
+            return 0, 0  # Cópias têm st_nlink 1: objetos em uso seriam apagados
+        with self._lock:
+            referenciados = {b["hash"] for b in self._ler_backups()}
+        limite = time.time() - OBJETO_CARENCIA
+        removidos, liberados = 0, 0
+        for prefixo in os.listdir(self.pasta):
+            subpasta = os.path.join(self.pasta, prefixo)
+            if not os.path.isdir(subpasta):
+                continue
+            for nome in os.listdir(subpasta):
+                caminho = os.path.join(subpasta, nome)
+                try:
+                    info = os.stat(caminho)
+                    if nome in referenciados or info.st_nlink > 1 or info.st_mtime > limite:
+                        continue
+                    os.remove(caminho)
+                    removidos += 1
+                    liberados += info.st_size
+                except OSError:
+                    pass
+        if removidos:
+            log_and_emit(f"Armazém de objetos: {removidos} objeto(s) sem referência removido(s) ({liberados // 1024} KB).")
+        return removidos, liberados
+
+    def importar_backups_antigos(self, espacos):
+        """Converte os planilha_backup_*.xlsx gravados como cópias em referências do armazém
+        (os mais antigos que a retenção ficam onde estão, para não serem apagados sem aviso)"""
+        padrao = re.compile(r"^(?:(?P<espaco>[a-z0-9][a-z0-9_-]*)_)?planilha_backup_(?P<data>\d{8}_\d{6})\.xlsx$")
+        pastas = {log_dir: None}
+        for espaco in espacos.listar():
+            pastas[espaco.pasta or "."] = espaco.id
+        limite = (datetime.now() - timedelta(days=BACKUP_DIAS_RETENCAO)).isoformat(timespec="seconds")
+        importados = 0
+        for pasta, espaco_pasta in pastas.items():
+            for nome in os.listdir(pasta):
+                encontrado = padrao.match(nome)
+                if not encontrado:
+                    continue
+                caminho = os.path.join(pasta, nome)
+                espaco = espaco_pasta or encontrado.group("espaco") or ESPACO_PADRAO
+                criado_em = datetime.strptime(encontrado.group("data"), "%Y%m%d_%H%M%S").isoformat(timespec="seconds")
+                if criado_em < limite:
+                    continue
+                self.registrar_backup(caminho, espaco, "importado", criado_em)
+                os.remove(caminho)
+                importados += 1
+        if importados:
+            log_and_emit(f"{importados} backup(s) de planilha antigo(s) movido(s) para o armazém de objetos.")
+        return importados
+
+armazem_objetos = ArmazemObjetos()
+
+# Rota para listar os backups de planilha do espaço de trabalho
+@app.route('/backups_planilha')
+def listar_backups_planilha():
+    espaco = espaco_da_requisicao()
+    if not espaco:
+        return espaco_nao_encontrado()
+    return jsonify({"status": "success", "backups": armazem_objetos.listar_backups(espaco.id)})
+
+# Rota para restaurar um backup de planilha (a planilha atual vira um novo backup)
+@app.route('/backups_planilha/<hash_objeto>/restaurar', methods=['POST'])
+def restaurar_backup_planilha(hash_objeto):
+    try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
+        if not any(b["hash"] == hash_objeto for b in armazem_objetos.listar_backups(espaco.id)):
+            return jsonify({"status": "error", "message": "Backup não encontrado"}), 404
+        if os.path.exists(espaco.planilha):
+            armazem_objetos.registrar_backup(espaco.planilha, espaco.id, "restauracao")
+        armazem_objetos.materializar(hash_objeto, espaco.planilha)
+        log_and_emit(f"Planilha restaurada a partir do backup {hash_objeto[:12]}.")
+        return jsonify({"status": "success", "message": "Planilha restaurada com sucesso"})
+    except Exception as e:
+        log_and_emit(f"Erro ao restaurar backup da planilha: {str(e)}", level="error")
+        return jsonify({"status": "error", "message": str(e)})
+
+# Rota para pré-verificar todos os PDFs do espaço de trabalho (JSON opcional: {"limite_pdf_mb": 2})
+@app.route('/preverificar_pdfs', methods=['POST'])
+def preverificar_pdfs():
+    try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
+        data = request.get_json(silent=True) or {}
+        caminhos = [os.path.join(espaco.diretorio, arquivo) for arquivo in obter_indice(espaco.diretorio).pdfs()]
+        resultados = pre_verificacao_pdfs.verificar(caminhos, data.get("limite_pdf_mb", LIMITE_TAMANHO_PDF_MB))
+        arquivos = [
+            {chave: r.get(chave) for chave in ("arquivo", "valido", "erro", "aviso", "paginas", "tamanho", "tamanho_otimizado")}
+            for r in resultados.values()
+        ]
+        return jsonify({
+            "status": "success",
+            "total": len(arquivos),
+            "invalidos": [a for a in arquivos if not a["valido"]],
+            "recomprimidos": sum(1 for a in arquivos if a["tamanho_otimizado"]),
+            "arquivos": arquivos
+        })
+    except Exception as e:
+        log_and_emit(f"Erro na pré-verificação dos PDFs: {str(e)}", level="error")
         return jsonify({"status": "error", "message": str(e)})
 
 # Rota para verificar status dos arquivos
 @app.route('/status_arquivos')
 def status_arquivos():
     try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
         planilha = None
-        if os.path.exists('planilha.xlsx'):
+        if os.path.exists(espaco.planilha):
             planilha = 'planilha.xlsx'
         
-        # Conta arquivos PDF independente da capitalização
-        pdfs = len([f for f in os.listdir(diretorio) if f.lower().endswith('.pdf')])
-        
-        # Lista todos os arquivos PDF para log
-        pdf_files = [f for f in os.listdir(diretorio) if f.lower().endswith('.pdf')]
+        # Lista dos PDFs (independente da capitalização) mantida pelo índice, refeita só quando a pasta muda
+        pdf_files = obter_indice(espaco.diretorio).pdfs()
+        pdfs = len(pdf_files)
         log_and_emit(f"Arquivos PDF encontrados: {len(pdf_files)}")
         for pdf in pdf_files[:5]:  # Lista os primeiros 5 arquivos como exemplo
             log_and_emit(f"PDF encontrado: {pdf}")
@@ -593,6 +3340,7 @@ def status_arquivos():
         
         return jsonify({
             'status': 'success',
+            'espaco': espaco.id,
             'planilha': planilha,
             'pdfs': pdfs,
             'pdf_list': pdf_files  # Enviando a lista completa para o frontend
@@ -608,6 +3356,9 @@ def status_arquivos():
 @app.route('/upload_planilha', methods=['POST'])
 def upload_planilha():
     try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
         if 'planilha' not in request.files:
             return jsonify({
                 'status': 'error',
@@ -627,13 +3378,19 @@ def upload_planilha():
                 'message': 'Tipo de arquivo não permitido. Use apenas arquivos .xlsx'
             })
         
-        # Se já existir uma planilha, fazer backup
-        if os.path.exists('planilha.xlsx'):
-            backup_name = f'planilha_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-            os.rename('planilha.xlsx', backup_name)
+        # Hash calculado durante o envio; a mesma planilha reenviada não gera backup nem gravação
+        hash_planilha, _, _ = armazem_objetos.gravar_fluxo(file.stream)
+        if os.path.exists(espaco.planilha):
+            if DiarioExecucao.hash_arquivo(espaco.planilha) == hash_planilha:
+                return jsonify({
+                    'status': 'success',
+                    'message': 'Planilha idêntica à atual; nada foi alterado'
+                })
+            # Backup da planilha atual como referência no armazém de objetos
+            armazem_objetos.registrar_backup(espaco.planilha, espaco.id, "substituida")
         
         # Salvar nova planilha
-        file.save('planilha.xlsx')
+        armazem_objetos.materializar(hash_planilha, espaco.planilha)
         
         return jsonify({
             'status': 'success',
@@ -649,6 +3406,9 @@ def upload_planilha():
 @app.route('/upload_pdfs', methods=['POST'])
 def upload_pdfs():
     try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
         if 'pdfs' not in request.files:
             return jsonify({
                 'status': 'error',
@@ -663,16 +3423,27 @@ def upload_pdfs():
             })
         
         uploaded_count = 0
+        sem_alteracao = 0
         for file in files:
             if file and allowed_file(file.filename, 'pdf'):
                 # Usar o nome original do arquivo, apenas convertendo para maiúsculas
-                filename = file.filename.upper()
-                file.save(os.path.join(diretorio, filename))
+                filename = os.path.basename(file.filename.replace("\\", "/")).upper()
+                # Arquivos com conteúdo já presente na pasta não são regravados
+                hash_pdf, _, _ = armazem_objetos.gravar_fluxo(file.stream)
+                if not armazem_objetos.materializar(hash_pdf, os.path.join(espaco.diretorio, filename)):
+                    sem_alteracao += 1
                 uploaded_count += 1
+
+        if uploaded_count > sem_alteracao:
+            obter_indice(espaco.diretorio).invalidar()
         
+        mensagem = f'{uploaded_count} arquivo(s) enviado(s) com sucesso'
+        if sem_alteracao:
+            mensagem += f' ({sem_alteracao} sem alteração)'
         return jsonify({
             'status': 'success',
-            'message': f'{uploaded_count} arquivo(s) enviado(s) com sucesso'
+            'message': mensagem,
+            'sem_alteracao': sem_alteracao
         })
     except Exception as e:
         return jsonify({
@@ -680,15 +3451,547 @@ def upload_pdfs():
             'message': str(e)
         })
 
+# ========= UPLOAD DE ZIP EM BLOCOS (RETOMÁVEL) =========
+# Pasta dos envios parciais (um .part com os bytes recebidos e um .json com o estado de cada envio)
+PASTA_UPLOADS = "uploads_parciais"
+# Tamanho de bloco sugerido ao navegador e tamanho máximo aceito por requisição
+TAMANHO_BLOCO_UPLOAD = 5 * 1024 * 1024
+TAMANHO_MAXIMO_BLOCO = 4 * TAMANHO_BLOCO_UPLOAD
+# Envios parciais sem novos blocos há mais tempo que isso (em segundos) são descartados
+UPLOAD_VALIDADE = 24 * 60 * 60
+# Intervalo (em arquivos) entre os eventos de progresso da extração
+INTERVALO_PROGRESSO_EXTRACAO = 25
+# Bytes do início do arquivo cujo SHA-256 identifica o envio a retomar (junto com o tamanho)
+TAMANHO_IMPRESSAO_UPLOAD = 1024 * 1024
+# Limites do ZIP: tamanho total descompactado, quantidade de entradas e taxa de compressão por entrada
+LIMITE_ZIP_DESCOMPACTADO = 4 * 1024 * 1024 * 1024
+LIMITE_ZIP_ENTRADAS = 20000
+LIMITE_ZIP_TAXA_COMPRESSAO = 100
+
+# Envios de ZIP em blocos: o estado fica em disco para retomar também após reiniciar o servidor
+class UploadsParciais:
+    def __init__(self, pasta=PASTA_UPLOADS):
+        self.pasta = pasta
+        self._lock = threading.Lock()
+        self._locks = {}  # upload_id -> lock (um bloco por vez em cada envio)
+
+    def preparar(self):
+        os.makedirs(self.pasta, exist_ok=True)
+        # Extrações interrompidas pela queda do servidor não têm mais quem as conclua
+        for arquivo in os.listdir(self.pasta):
+            estado = self.obter(arquivo[:-5]) if arquivo.endswith(".json") else None
+            if estado and estado["status"] == "extraindo":
+                self.finalizar(estado, "erro", {"erro": "Extração interrompida pelo reinício do servidor; envie o ZIP novamente"})
+
+    def _caminhos(self, upload_id):
+        base = os.path.join(self.pasta, upload_id)
+        return base + ".part", base + ".json"
+
+    def _lock_upload(self, upload_id):
+        with self._lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _gravar_estado(self, estado):
+        _, caminho_estado = self._caminhos(estado["upload_id"])
+        temporario = caminho_estado + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(estado, f, ensure_ascii=False)
+        os.replace(temporario, caminho_estado)
+
+    def obter(self, upload_id):
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id or ""):
+            return None
+        _, caminho_estado = self._caminhos(upload_id)
+        try:
+            with open(caminho_estado, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _descartar_expirados(self):
+        limite = time.time() - UPLOAD_VALIDADE
+        for nome in os.listdir(self.pasta):
+            caminho = os.path.join(self.pasta, nome)
+            try:
+                if os.path.getmtime(caminho) < limite:
+                    os.remove(caminho)
+            except OSError:
+                pass
+
+    def iniciar(self, nome, tamanho, espaco, impressao=None):
+        """
+        Cria um envio ou devolve o envio incompleto do mesmo arquivo no mesmo espaço. O arquivo é
+        reconhecido pela impressão (SHA-256 dos primeiros TAMANHO_IMPRESSAO_UPLOAD bytes) e pelo
+        tamanho; sem impressão o envio sempre começa do zero.
+        """
+        self._descartar_expirados()
+        for arquivo in os.listdir(self.pasta) if impressao else ():
+            if not arquivo.endswith(".json"):
+                continue
+            estado = self.obter(arquivo[:-5])
+            if estado and estado["status"] == "enviando" and (estado.get("impressao"), estado["tamanho"], estado["espaco"]) == (impressao, tamanho, espaco):
+                return estado
+
+        estado = {
+            "upload_id": uuid.uuid4().hex,
+            "nome": nome,
+            "tamanho": tamanho,
+            "impressao": impressao,
+            "espaco": espaco,
+            "recebido": 0,
+            "status": "enviando",  # enviando, extraindo, concluido, erro
+            "criado_em": datetime.now().isoformat(timespec="seconds")
+        }
+        caminho_parte, _ = self._caminhos(estado["upload_id"])
+        open(caminho_parte, "wb").close()
+        self._gravar_estado(estado)
+        return estado
+
+    def receber_bloco(self, upload_id, deslocamento, fluxo):
+        """Acrescenta ao .part os bytes de `fluxo` lidos em blocos; o deslocamento precisa ser o total já recebido"""
+        with self._lock_upload(upload_id):
+            estado = self.obter(upload_id)
+            if estado is None:
+                raise KeyError(upload_id)
+            if estado["status"] != "enviando" or deslocamento != estado["recebido"]:
+                return estado, False
+
+            caminho_parte, _ = self._caminhos(upload_id)
+            restante = min(estado["tamanho"] - estado["recebido"], TAMANHO_MAXIMO_BLOCO)
+            with open(caminho_parte, "r+b") as f:
+                # Descarta bytes de um bloco anterior interrompido no meio da gravação
+                f.truncate(estado["recebido"])
+                f.seek(estado["recebido"])
+                while restante > 0:
+                    pedaco = fluxo.read(min(64 * 1024, restante))
+                    if not pedaco:
+                        break
+                    f.write(pedaco)
+                    restante -= len(pedaco)
+                anterior, estado["recebido"] = estado["recebido"], f.tell()
+            # Confere a impressão assim que o início do arquivo chega: outro arquivo não continua este envio
+            limite_impressao = min(TAMANHO_IMPRESSAO_UPLOAD, estado["tamanho"])
+            if estado.get("impressao") and anterior < limite_impressao <= estado["recebido"]:
+                with open(caminho_parte, "rb") as f:
+                    if hashlib.sha256(f.read(limite_impressao)).hexdigest() != estado["impressao"]:
+                        return self.finalizar(estado, "erro", {"erro": "O conteúdo recebido não confere com a impressão do arquivo"}), True
+            if estado["recebido"] >= estado["tamanho"]:
+                estado["status"] = "extraindo"
+            self._gravar_estado(estado)
+            return estado, True
+
+    def finalizar(self, estado, status, relatorio=None):
+        estado = dict(estado, status=status, relatorio=relatorio)
+        self._gravar_estado(estado)
+        caminho_parte, _ = self._caminhos(estado["upload_id"])
+        if os.path.exists(caminho_parte):
+            os.remove(caminho_parte)
+        with self._lock:
+            self._locks.pop(estado["upload_id"], None)
+        return estado
+
+    def caminho_zip(self, upload_id):
+        return self._caminhos(upload_id)[0]
+
+uploads_parciais = UploadsParciais()
+
+# Função para o nome de um PDF enviado: só o nome do arquivo (sem pastas) em maiúsculas, como no upload de PDFs
+def nome_pdf_enviado(nome):
+    nome = os.path.basename(nome.replace("\\", "/")).strip().upper()
+    if not nome.endswith(".PDF") or nome.startswith("."):
+        return None
+    return nome
+
+# Função para recusar ZIPs que descompactam para além dos limites (antes de extrair qualquer arquivo)
+# Os tamanhos do cabeçalho valem como teto: o zipfile não lê de uma entrada mais bytes que o declarado
+def verificar_limites_zip(entradas):
+    if len(entradas) > LIMITE_ZIP_ENTRADAS:
+        raise ValueError(f"O ZIP tem {len(entradas)} arquivos (limite de {LIMITE_ZIP_ENTRADAS})")
+    total = sum(info.file_size for info in entradas)
+    if total > LIMITE_ZIP_DESCOMPACTADO:
+        raise ValueError(f"O ZIP descompactado teria {total / 1024 ** 3:.1f} GB (limite de {LIMITE_ZIP_DESCOMPACTADO / 1024 ** 3:.0f} GB)")
+    for info in entradas:
+        if info.file_size > LIMITE_ZIP_TAXA_COMPRESSAO * max(info.compress_size, 1):
+            raise ValueError(f"{info.filename}: taxa de compressão acima de {LIMITE_ZIP_TAXA_COMPRESSAO}:1")
+
+# Função para extrair os PDFs do ZIP um a um (sem carregar o ZIP em memória) para a pasta de PDFs
+def extrair_zip_para_arquivos(caminho_zip, diretorio_destino, upload_id=None):
+    inicio = time.time()
+    extraidos, ignorados, sem_alteracao = [], [], 0
+    with zipfile.ZipFile(caminho_zip) as pacote:
+        entradas = [info for info in pacote.infolist() if not info.is_dir()]
+        verificar_limites_zip(entradas)
+        for numero, info in enumerate(entradas, start=1):
+            nome = nome_pdf_enviado(info.filename)
+            if not nome or info.filename.startswith("__MACOSX/"):
+                ignorados.append(info.filename)
+                continue
+            with pacote.open(info) as origem:
+                hash_pdf, _, _ = armazem_objetos.gravar_fluxo(origem)
+            if not armazem_objetos.materializar(hash_pdf, os.path.join(diretorio_destino, nome)):
+                sem_alteracao += 1
+            extraidos.append(nome)
+            if upload_id and (numero % INTERVALO_PROGRESSO_EXTRACAO == 0 or numero == len(entradas)):
+                socketio.emit("progresso_upload", {"upload_id": upload_id, "fase": "extracao", "atual": numero, "total": len(entradas)})
+
+    obter_indice(diretorio_destino).invalidar()
+    log_and_emit(f"ZIP extraído: {len(extraidos)} PDF(s) ({sem_alteracao} sem alteração), {len(ignorados)} entrada(s) ignorada(s).")
+    return {"extraidos": len(extraidos), "sem_alteracao": sem_alteracao, "arquivos": extraidos, "ignorados": ignorados, "tempo": round(time.time() - inicio, 2)}
+
+# Função para extrair o ZIP de um envio completo fora da requisição; o cliente acompanha pelo GET
+def extrair_upload_zip(estado):
+    upload_id = estado["upload_id"]
+    espaco = espacos_trabalho.obter(estado["espaco"])
+    try:
+        if not espaco:
+            raise ValueError(f"Espaço de trabalho '{estado['espaco']}' não existe mais")
+        relatorio = extrair_zip_para_arquivos(uploads_parciais.caminho_zip(upload_id), espaco.diretorio, upload_id)
+        estado = uploads_parciais.finalizar(estado, "concluido", relatorio)
+    except zipfile.BadZipFile:
+        estado = uploads_parciais.finalizar(estado, "erro", {"erro": "Arquivo ZIP inválido"})
+    except Exception as e:
+        log_and_emit(f"Erro ao extrair o ZIP: {str(e)}", level="error")
+        estado = uploads_parciais.finalizar(estado, "erro", {"erro": str(e)})
+    socketio.emit("progresso_upload", {"upload_id": upload_id, "fase": estado["status"]})
+
+# Rota para iniciar (ou retomar) o envio de um ZIP de PDFs em blocos
+# JSON: {"nome": "pdfs.zip", "tamanho": 209715200, "impressao": SHA-256 do primeiro 1 MB};
+# a resposta traz `recebido`, o ponto de onde continuar
+@app.route('/upload_zip', methods=['POST'])
+def iniciar_upload_zip():
+    try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
+        data = request.get_json(silent=True) or {}
+        nome = os.path.basename(str(data.get("nome", "")))
+        tamanho = data.get("tamanho")
+        if not nome.lower().endswith(".zip"):
+            return jsonify({"status": "error", "message": "Envie um arquivo .zip"})
+        if not isinstance(tamanho, int) or tamanho <= 0:
+            return jsonify({"status": "error", "message": "Tamanho do arquivo inválido"})
+        impressao = str(data.get("impressao") or "").lower()
+        if impressao and not re.fullmatch(r"[0-9a-f]{64}", impressao):
+            return jsonify({"status": "error", "message": "Impressão do arquivo inválida"})
+
+        estado = uploads_parciais.iniciar(nome, tamanho, espaco.id, impressao or None)
+        if estado["recebido"]:
+            log_and_emit(f"Retomando envio de {nome}: {estado['recebido']} de {tamanho} bytes já recebidos.")
+        return jsonify({"status": "success", "upload": estado, "tamanho_bloco": TAMANHO_BLOCO_UPLOAD, "tamanho_impressao": TAMANHO_IMPRESSAO_UPLOAD})
+    except Exception as e:
+        log_and_emit(f"Erro ao iniciar envio do ZIP: {str(e)}", level="error")
+        return jsonify({"status": "error", "message": str(e)})
+
+# Função para obter um envio do espaço de trabalho da requisição; envios de outro espaço
+# respondem como inexistentes
+def upload_da_requisicao(upload_id):
+    espaco = espaco_da_requisicao()
+    estado = uploads_parciais.obter(upload_id)
+    if not espaco or not estado or estado.get("espaco") != espaco.id:
+        return None
+    return estado
+
+# Rota para consultar o estado de um envio (ponto de retomada, extração e relatório)
+@app.route('/upload_zip/<upload_id>', methods=['GET'])
+def status_upload_zip(upload_id):
+    estado = upload_da_requisicao(upload_id)
+    if not estado:
+        return jsonify({"status": "error", "message": "Envio não encontrado"}), 404
+    return jsonify({"status": "success", "upload": estado})
+
+# Rota para receber um bloco do ZIP (corpo da requisição = bytes do bloco, cabeçalho X-Offset = posição inicial)
+# Ao receber o último bloco, os PDFs são extraídos em segundo plano para a pasta do espaço de trabalho
+# (status "extraindo" até o GET devolver "concluido" ou "erro")
+@app.route('/upload_zip/<upload_id>', methods=['PUT'])
+def receber_bloco_zip(upload_id):
+    if not upload_da_requisicao(upload_id):
+        return jsonify({"status": "error", "message": "Envio não encontrado"}), 404
+    try:
+        deslocamento = int(request.headers.get("X-Offset", "-1"))
+        estado, aceito = uploads_parciais.receber_bloco(upload_id, deslocamento, request.stream)
+    except KeyError:
+        return jsonify({"status": "error", "message": "Envio não encontrado"}), 404
+    except ValueError:
+        return jsonify({"status": "error", "message": "Cabeçalho X-Offset inválido"}), 400
+
+    if not aceito:
+        # Bloco fora de ordem (repetido após falha de rede, por exemplo): o cliente continua de `recebido`
+        return jsonify({"status": "error", "message": "Posição do bloco não confere", "upload": estado}), 409
+
+    if estado["status"] == "erro":
+        return jsonify({"status": "error", "message": estado["relatorio"]["erro"], "upload": estado})
+    socketio.emit("progresso_upload", {"upload_id": upload_id, "fase": "envio", "atual": estado["recebido"], "total": estado["tamanho"]})
+    if estado["status"] == "extraindo":
+        threading.Thread(target=extrair_upload_zip, args=(estado,), name=f"extrair-{upload_id}", daemon=True).start()
+    return jsonify({"status": "success", "upload": estado})
+
+# ========= DIVISÃO DE PDFs =========
+# Função para mover um arquivo gerado para a pasta de um espaço trocando o destino com os.replace
+# (o arquivo existente pode ser um hardlink do armazém de objetos e não pode ser sobrescrito)
+def mover_substituindo(origem, destino):
+    temporario = destino + ".parcial"
+    shutil.move(origem, temporario)
+    os.replace(temporario, destino)
+
+# Função para dividir um PDF de contracheques/recibos e gravar os pedaços em arquivos/
+# no padrão "NNN - NOME - CMDCA.PDF" (um arquivo por funcionário; duplicatas são descartadas)
+def dividir_pdf_para_arquivos(caminho_pdf, cortes, tipo="contracheque", diretorio_destino=diretorio):
+    inicio = time.time()
+    pontos = processamento_pdf.pontos_de_corte(cortes)
+
+    # Arquivos já existentes: o mesmo funcionário é sobrescrito e a numeração continua do maior NNN
+    existentes = {}
+    proximo_numero = 1
+    for arquivo in os.listdir(diretorio_destino):
+        partes = arquivo[:-4].split(" - ") if arquivo.upper().endswith(".PDF") else []
+        if len(partes) >= 2 and partes[0].strip().isdigit():
+            existentes[normalizar_nome(partes[1])] = arquivo
+            proximo_numero = max(proximo_numero, int(partes[0]) + 1)
+
+    gerados, duplicados, sem_nome = [], [], []
+    vistos = set()
+    with tempfile.TemporaryDirectory(prefix="divisao_") as temporario:
+        total_paginas, pedacos = processamento_pdf.dividir_pdf(caminho_pdf, pontos, tipo, temporario)
+
+        for pedaco in pedacos:
+            nome = pedaco["nome"]
+            if not nome:
+                corte = pontos[pedaco["corte"] - 1]
+                arquivo = f"{tipo}_{pedaco['posicao']}_p{pedaco['pagina']}_{corte['inicio_mm']:g}-{corte['fim_mm']:g}mm.pdf"
+                pasta_sem_nome = os.path.join(diretorio_destino, "sem_nome")
+                os.makedirs(pasta_sem_nome, exist_ok=True)
+                mover_substituindo(pedaco["caminho"], os.path.join(pasta_sem_nome, arquivo))
+                sem_nome.append(arquivo)
+                continue
+            if nome in vistos:
+                duplicados.append(nome)
+                continue
+            vistos.add(nome)
+
+            arquivo = existentes.get(nome)
+            if arquivo is None:
+                arquivo = f"{proximo_numero:03d} - {nome} - CMDCA.PDF"
+                proximo_numero += 1
+            mover_substituindo(pedaco["caminho"], os.path.join(diretorio_destino, arquivo))
+            gerados.append(arquivo)
+
+    obter_indice(diretorio_destino).invalidar()
+    log_and_emit(f"PDF dividido: {total_paginas} página(s), {len(gerados)} arquivo(s) gerado(s), {len(duplicados)} duplicata(s), {len(sem_nome)} sem nome.")
+    return {
+        "paginas": total_paginas,
+        "gerados": gerados,
+        "duplicados": duplicados,
+        "sem_nome": sem_nome,
+        "tempo": round(time.time() - inicio, 2)
+    }
+
+# Rota para dividir um PDF de contracheques/recibos direto na pasta de PDFs do robô
+# Campos: pdf (arquivo), cortes (JSON: [{"inicio_mm": 10, "fim_mm": 140}, ...]), tipo (contracheque ou recibo)
+@app.route('/dividir_pdf', methods=['POST'])
+def dividir_pdf():
+    try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
+        arquivo = request.files.get('pdf')
+        if not arquivo or not allowed_file(arquivo.filename, 'pdf'):
+            return jsonify({"status": "error", "message": "Envie um arquivo PDF"})
+
+        try:
+            cortes = json.loads(request.form.get('cortes') or "[]")
+        except ValueError:
+            return jsonify({"status": "error", "message": "Cortes inválidos"})
+        if not cortes:
+            return jsonify({"status": "error", "message": "Defina pelo menos um ponto de corte"})
+
+        tipo = request.form.get('tipo', 'contracheque')
+        if tipo not in processamento_pdf.PALAVRAS_EXCLUIDAS:
+            return jsonify({"status": "error", "message": f"Tipo inválido: {tipo}"})
+
+        with tempfile.TemporaryDirectory(prefix="upload_divisao_") as temporario:
+            caminho = os.path.join(temporario, "original.pdf")
+            arquivo.save(caminho)
+            relatorio = dividir_pdf_para_arquivos(caminho, cortes, tipo, espaco.diretorio)
+        return jsonify({"status": "success", "relatorio": relatorio})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)})
+    except Exception as e:
+        log_and_emit(f"Erro ao dividir PDF: {str(e)}", level="error")
+        return jsonify({"status": "error", "message": str(e)})
+
+# ========= JUNÇÃO DE RECIBOS E CONTRACHEQUES =========
+# Similaridade mínima entre os nomes de um recibo e de um contracheque
+SIMILARIDADE_MINIMA_JUNCAO = 0.7
+
+# Função para extrair o nome normalizado do nome do arquivo ("123_NOME_SOBRENOME.pdf" ou "NNN - NOME - CMDCA.PDF")
+def nome_do_documento(arquivo):
+    nome = os.path.splitext(os.path.basename(arquivo))[0]
+    if " - " in nome:
+        nome = nome.split(" - ")[1]
+    nome = re.sub(r"^\d+_", "", nome)
+    return " ".join(normalizar_nome(re.sub(r"[_-]", " ", nome)).split())
+
+# Similaridade do extrator de junção (substring ou Levenshtein normalizado), com a distância
+# limitada ao necessário para atingir `minimo`
+def similaridade_nomes(nome1, nome2, minimo=SIMILARIDADE_MINIMA_JUNCAO):
+    maior, menor = (nome1, nome2) if len(nome1) >= len(nome2) else (nome2, nome1)
+    if not maior:
+        return 1.0
+    if menor in maior:
+        return len(menor) / len(maior)
+    limite = int(len(maior) * (1 - minimo))
+    distancia = distancia_limitada(nome1, nome2, limite)
+    return (len(maior) - distancia) / len(maior) if distancia <= limite else 0.0
+
+# Função para parear recibos e contracheques pelo nome: compara apenas nomes que compartilham o
+# primeiro ou o último nome e escolhe a atribuição um-para-um de maior similaridade total
+def parear_documentos(recibos, contracheques, minimo=SIMILARIDADE_MINIMA_JUNCAO):
+    nomes_recibos = list(recibos)
+    nomes_contracheques = list(contracheques)
+
+    blocos = {}
+    for j, nome in enumerate(nomes_contracheques):
+        partes = nome.split() or [""]
+        blocos.setdefault(("primeiro", partes[0]), set()).add(j)
+        blocos.setdefault(("ultimo", partes[-1]), set()).add(j)
+
+    arestas = {}
+    for i, nome in enumerate(nomes_recibos):
+        partes = nome.split() or [""]
+        candidatos = blocos.get(("primeiro", partes[0]), set()) | blocos.get(("ultimo", partes[-1]), set())
+        for j in candidatos:
+            pontuacao = similaridade_nomes(nome, nomes_contracheques[j], minimo)
+            if pontuacao >= minimo:
+                arestas[(i, j)] = pontuacao
+
+    pares = [
+        (nomes_recibos[i], nomes_contracheques[j], round(arestas[(i, j)], 3))
+        for i, j in atribuicao_por_componentes(arestas)
+    ]
+    pareados_recibos = {p[0] for p in pares}
+    pareados_contracheques = {p[1] for p in pares}
+    return (
+        pares,
+        [n for n in nomes_recibos if n not in pareados_recibos],
+        [n for n in nomes_contracheques if n not in pareados_contracheques]
+    )
+
+# Função para gerar o nome do documento juntado: "AAAAMMDD - PRIMEIRO ULTIMO - CMDCA.pdf"
+def nome_documento_juntado(nome, data=None):
+    partes = re.sub(r"[^A-Za-zÀ-ÿ\s]", "", nome).split()
+    nome_curto = f"{partes[0]} {partes[-1]}" if len(partes) > 1 else (partes[0] if partes else "NOME_DESCONHECIDO")
+    return f"{(data or datetime.now()).strftime('%Y%m%d')} - {nome_curto} - CMDCA.pdf"
+
+# Função para extrair os PDFs de um ZIP para `destino`; retorna {nome normalizado: caminho}
+def extrair_pdfs_zip(arquivo_zip, destino):
+    documentos = {}
+    with zipfile.ZipFile(arquivo_zip) as pacote:
+        for indice, info in enumerate(pacote.infolist()):
+            if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                continue
+            nome = nome_do_documento(info.filename)
+            if not nome or nome in documentos:
+                continue
+            caminho = os.path.join(destino, f"{indice:05d}.pdf")
+            with pacote.open(info) as origem, open(caminho, "wb") as saida:
+                shutil.copyfileobj(origem, saida)
+            documentos[nome] = caminho
+    return documentos
+
+# Função para juntar recibos e contracheques: pareia os nomes e junta os PDFs em paralelo em `destino`
+def juntar_documentos(recibos, contracheques, destino, maiusculas=False):
+    pares, recibos_sem_par, contracheques_sem_par = parear_documentos(recibos, contracheques)
+
+    tarefas, relatorio_pares, usados = [], [], set()
+    for nome_recibo, nome_contracheque, pontuacao in pares:
+        arquivo = nome_documento_juntado(nome_recibo)
+        if arquivo.upper() in usados:  # Primeiro e último nome repetidos: usa o nome completo
+            arquivo = f"{arquivo.split(' - ')[0]} - {nome_recibo} - CMDCA.pdf"
+        if maiusculas:
+            arquivo = arquivo.upper()
+        usados.add(arquivo.upper())
+        tarefas.append((recibos[nome_recibo], contracheques[nome_contracheque], os.path.join(destino, arquivo)))
+        relatorio_pares.append({"nome": nome_recibo, "contracheque": nome_contracheque, "pontuacao": pontuacao, "arquivo": arquivo})
+
+    processamento_pdf.juntar_pdfs(tarefas)
+    log_and_emit(f"Junção: {len(pares)} par(es), {len(recibos_sem_par)} recibo(s) e {len(contracheques_sem_par)} contracheque(s) sem par.")
+    return {"pares": relatorio_pares, "recibos_sem_par": recibos_sem_par, "contracheques_sem_par": contracheques_sem_par}
+
+# Rota para juntar recibos e contracheques (dois ZIPs) no servidor
+# destino=arquivos grava direto na pasta do robô; destino=zip devolve um ZIP em streaming
+@app.route('/juntar_documentos', methods=['POST'])
+def juntar_documentos_rota():
+    espaco = espaco_da_requisicao()
+    if not espaco:
+        return espaco_nao_encontrado()
+    temporario = tempfile.mkdtemp(prefix="juncao_")
+    try:
+        inicio = time.time()
+        zip_recibos = request.files.get('recibos')
+        zip_contracheques = request.files.get('contracheques')
+        if not zip_recibos or not zip_contracheques:
+            shutil.rmtree(temporario, ignore_errors=True)
+            return jsonify({"status": "error", "message": "Envie o ZIP de recibos e o ZIP de contracheques"})
+        destino = request.form.get('destino', 'zip')
+
+        pasta_recibos = os.path.join(temporario, "recibos")
+        pasta_contracheques = os.path.join(temporario, "contracheques")
+        pasta_saida = os.path.join(temporario, "saida") if destino == "zip" else espaco.diretorio
+        for pasta in (pasta_recibos, pasta_contracheques, pasta_saida):
+            os.makedirs(pasta, exist_ok=True)
+
+        recibos = extrair_pdfs_zip(zip_recibos, pasta_recibos)
+        contracheques = extrair_pdfs_zip(zip_contracheques, pasta_contracheques)
+        relatorio = juntar_documentos(recibos, contracheques, pasta_saida, maiusculas=destino != "zip")
+        relatorio["tempo"] = round(time.time() - inicio, 2)
+
+        if destino != "zip":
+            shutil.rmtree(temporario, ignore_errors=True)
+            obter_indice(espaco.diretorio).invalidar()
+            return jsonify({"status": "success", "relatorio": relatorio})
+
+        # PDFs já são comprimidos: ZIP sem compressão, enviado em blocos e apagado ao final
+        caminho_zip = os.path.join(temporario, "documentos_combinados.zip")
+        with zipfile.ZipFile(caminho_zip, "w", zipfile.ZIP_STORED) as pacote:
+            for par in relatorio["pares"]:
+                pacote.write(os.path.join(pasta_saida, par["arquivo"]), f"documentos_combinados/{par['arquivo']}")
+            pacote.writestr("relatorio.json", json.dumps(relatorio, ensure_ascii=False, indent=2))
+
+        def enviar():
+            try:
+                with open(caminho_zip, "rb") as f:
+                    while True:
+                        bloco = f.read(1024 * 1024)
+                        if not bloco:
+                            break
+                        yield bloco
+            finally:
+                shutil.rmtree(temporario, ignore_errors=True)
+
+        return app.response_class(enviar(), mimetype="application/zip", headers={
+            "Content-Disposition": f"attachment; filename=documentos_combinados_{datetime.now().strftime('%Y-%m-%d')}.zip",
+            "Content-Length": str(os.path.getsize(caminho_zip))
+        })
+    except zipfile.BadZipFile:
+        shutil.rmtree(temporario, ignore_errors=True)
+        return jsonify({"status": "error", "message": "Arquivo ZIP inválido"})
+    except Exception as e:
+        shutil.rmtree(temporario, ignore_errors=True)
+        log_and_emit(f"Erro na junção de documentos: {str(e)}", level="error")
+        return jsonify({"status": "error", "message": str(e)})
+
 # Rota para excluir a planilha
 @app.route('/excluir_planilha', methods=['POST'])
 def excluir_planilha():
     try:
-        if os.path.exists('planilha.xlsx'):
-            # Criar backup antes de excluir
-            backup_name = f'planilha_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-            os.rename('planilha.xlsx', os.path.join('logs', backup_name))
-            log_and_emit(f"Backup da planilha criado: {backup_name}")
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
+        if os.path.exists(espaco.planilha):
+            # Criar backup (referência no armazém de objetos) antes de excluir
+            backup, _ = armazem_objetos.registrar_backup(espaco.planilha, espaco.id, "excluida")
+            os.remove(espaco.planilha)
+            log_and_emit(f"Backup da planilha criado: {backup['hash'][:12]} ({backup['criado_em']})")
             
             return jsonify({
                 'status': 'success',
@@ -710,17 +4013,25 @@ def excluir_planilha():
 @app.route('/excluir_pdfs', methods=['POST'])
 def excluir_pdfs():
     try:
+        espaco = espaco_da_requisicao()
+        if not espaco:
+            return espaco_nao_encontrado()
         deleted_count = 0
         # Lista todos os arquivos na pasta
-        for filename in os.listdir(diretorio):
-            file_path = os.path.join(diretorio, filename)
+        for filename in os.listdir(espaco.diretorio):
+            file_path = os.path.join(espaco.diretorio, filename)
             try:
-                # Remove o arquivo
-                os.remove(file_path)
+                # Remove o arquivo (ou a subpasta, como a sem_nome/ da divisão de PDFs)
+                if os.path.isdir(file_path):
+                    shutil.rmtree(file_path)
+                else:
+                    os.remove(file_path)
                 deleted_count += 1
                 log_and_emit(f"Arquivo excluído: {filename}")
             except Exception as e:
                 log_and_emit(f"Erro ao excluir {filename}: {str(e)}", level="error")
+        obter_indice(espaco.diretorio).invalidar()
+        armazem_objetos.coletar()
         if(deleted_count == 0):
             return jsonify({
                 'status': 'error',
@@ -737,6 +4048,44 @@ def excluir_pdfs():
             'message': str(e)
         })
 
+# Função para consultar as versões do Chrome/ChromeDriver em segundo plano na subida do servidor
+def preaquecer_versoes():
+    def consultar():
+        try:
+            verificar_compatibilidade_chrome()
+        except Exception as e:
+            logging.error(f"Erro ao consultar versões do Chrome: {e}")
+    threading.Thread(target=consultar, name="preaquecer-versoes", daemon=True).start()
+
+# Função para preparar o servidor: pastas, arquivo de log e registros gravados em disco
+# Nada disso fica no nível do módulo: com o método "spawn" (Windows), cada processo do pool de PDFs
+# reimporta o app.py como __mp_main__, e não deve abrir outro log nem criar pastas
+_inicializado = False
+_lock_inicializacao = threading.Lock()
+
+def inicializar():
+    global _inicializado
+    with _lock_inicializacao:
+        if _inicializado:
+            return
+        os.makedirs(log_dir, exist_ok=True)
+        configurar_log()
+        armazem_objetos.preparar()
+        uploads_parciais.preparar()
+        pre_verificacao_pdfs.preparar()
+        espacos_trabalho.carregar()
+        _inicializado = True
+
+# Servidor importado por outro processo (gunicorn, benchmark): prepara na primeira requisição
+@app.before_request
+def inicializar_antes_da_requisicao():
+    if not _inicializado:
+        inicializar()
+
 # Iniciar servidor Flask
 if __name__ == "__main__":
+    inicializar()
+    preaquecer_versoes()
+    armazem_objetos.importar_backups_antigos(espacos_trabalho)
+    armazem_objetos.coletar()
     socketio.run(app, debug=True)
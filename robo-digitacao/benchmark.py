@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# ========= BENCHMARK DO ROBÔ =========
+# Executa o robô (app.py) de ponta a ponta contra o SGP simulado (sgp_mock.py) com uma
+# planilha de N linhas gerada na hora e reporta linhas/minuto, p50/p95 por etapa (medidos
+# pelo próprio robô, ver /metrics) e a memória dos navegadores.
+#
+# Exemplo: python benchmark.py --linhas 50 --workers 2 --latencia-cpf 0.5
+# Comparar o navegador completo com o enxuto: python benchmark.py --linhas 20 --modo comparar
+# Orçamento de subida do servidor: python benchmark.py --importacao --orcamento-importacao 0.5
+
+DIRETORIO_ROBO = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos que o app.py só pode importar quando uma execução precisa deles
+MODULOS_PESADOS = ("pandas", "numpy", "selenium", "pypdf")
+
+# Mede, em um processo novo, o tempo de `import app` e os módulos pesados carregados
+CODIGO_IMPORTACAO = """
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+inicio = time.perf_counter()
+import app
+tempo = time.perf_counter() - inicio
+print(json.dumps({"tempo": tempo, "carregados": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+# Função para gerar um CPF válido (com dígitos verificadores)
+def gerar_cpf():
+    digitos = [random.randint(0, 9) for _ in range(9)]
+    for peso_inicial in (10, 11):
+        soma = sum(d * p for d, p in zip(digitos, range(peso_inicial, 1, -1)))
+        digitos.append(soma * 10 % 11 % 10)
+    return "".join(map(str, digitos))
+
+
+# Função para gerar um PDF mínimo de uma página
+def gerar_pdf(caminho, texto):
+    conteudo = f"BT /F1 12 Tf 72 720 Td ({texto}) Tj ET".encode("latin-1", "replace")
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(conteudo)).encode() + b" >>\nstream\n" + conteudo + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"
+    ]
+    saida = bytearray(b"%PDF-1.4\n")
+    posicoes = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posicoes.append(len(saida))
+        saida += f"{numero} 0 obj\n".encode() + objeto + b"\nendobj\n"
+    inicio_xref = len(saida)
+    saida += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode()
+    for posicao in posicoes:
+        saida += f"{posicao:010d} 00000 n \n".encode()
+    saida += f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n".encode()
+    with open(caminho, "wb") as f:
+        f.write(saida)
+
+
+# Função para montar a planilha e os PDFs do benchmark no diretório atual
+def preparar_dados(linhas, pd):
+    os.makedirs("arquivos", exist_ok=True)
+    registros = []
+    for i in range(1, linhas + 1):
+        nome = f"FUNCIONARIO{i:04d} TESTE SOBRENOME{i:04d}"
+        gerar_pdf(os.path.join("arquivos", f"{i:03d} - {nome} - CMDCA.PDF"), nome)
+        registros.append({"Nome": nome, "CPF": gerar_cpf(), "Valor": random.choice([1500, 1820.5, 2310])})
+    pd.DataFrame(registros).to_excel("planilha.xlsx", index=False)
+
+
+# Função para verificar o orçamento de tempo de importação do app.py (melhor de N tentativas)
+def verificar_importacao(orcamento, tentativas=3):
+    area = tempfile.mkdtemp(prefix="benchmark_importacao_")
+    medicoes = []
+    for _ in range(tentativas):
+        saida = subprocess.run(
+            [sys.executable, "-c", CODIGO_IMPORTACAO, DIRETORIO_ROBO, *MODULOS_PESADOS],
+            cwd=area, capture_output=True, text=True, check=True
+        )
+        medicoes.append(json.loads(saida.stdout.strip().splitlines()[-1]))
+
+    melhor = min(m["tempo"] for m in medicoes)
+    carregados = sorted({m for medicao in medicoes for m in medicao["carregados"]})
+    print(f"Importação do app.py: {melhor:.3f}s (orçamento {orcamento}s, melhor de {tentativas})")
+    if carregados:
+        print(f"Módulos pesados importados na subida: {', '.join(carregados)}")
+    return 0 if melhor <= orcamento and not carregados else 1
+
+
+# Amostra a memória (RSS) dos processos filhos (chromedriver + chrome) durante a execução
+def amostrar_memoria(parar, picos):
+    try:
+        import psutil
+    except ImportError:
+        picos["disponivel"] = False
+        return
+
+    processo = psutil.Process()
+    while not parar.is_set():
+        total = 0
+        for filho in processo.children(recursive=True):
+            try:
+                total += filho.memory_info().rss
+            except psutil.Error:
+                pass
+        picos["rss_max_mb"] = max(picos.get("rss_max_mb", 0), total / 1024 / 1024)
+        parar.wait(0.5)
+
+
+# Função para executar o plano uma vez (modo completo ou enxuto do navegador) e medir o resultado
+def executar_rodada(app, sgp_mock, plano, parametros, workers, modo):
+    sgp_mock.desembolsos.clear()
+    parametros = dict(parametros, modo_enxuto=(modo == "enxuto"))
+
+    parar, memoria = threading.Event(), {}
+    amostrador = threading.Thread(target=amostrar_memoria, args=(parar, memoria), daemon=True)
+    amostrador.start()
+
+    inicio = time.perf_counter()
+    relatorio = app.processar_plano(plano, parametros, workers)
+    duracao = time.perf_counter() - inicio
+
+    parar.set()
+    amostrador.join()
+    # Fecha os navegadores para que a próxima rodada meça também a abertura do Chrome
+    app.gerenciador_sessoes.encerrar_todas()
+
+    etapas = {
+        f"{t['tipo']}: {t['etapa']}": {"contagem": t["contagem"], "p50": t["p50"], "p95": t["p95"]}
+        for t in relatorio["tempos"]
+    }
+    concluidas = sum(qtd for status, qtd in relatorio["resumo"].items() if status in ("salvo", "simulado"))
+    return {
+        "modo": modo,
+        "concluidas": concluidas,
+        "resumo": relatorio["resumo"],
+        "duracao": round(duracao, 2),
+        "linhas_por_minuto": round(concluidas / duracao * 60, 2) if duracao else 0,
+        "inicio_navegador_p50": etapas.get("sessao: iniciar navegador", {}).get("p50"),
+        "linha_p50": etapas.get("linha: registro completo", {}).get("p50"),
+        "linha_p95": etapas.get("linha: registro completo", {}).get("p95"),
+        "memoria_navegadores_mb": round(memoria["rss_max_mb"], 1) if "rss_max_mb" in memoria else None,
+        "arquivo_tempos": relatorio["arquivo_tempos"],
+        "etapas": etapas
+    }
+
+
+# Função para mostrar o resultado de uma rodada
+def mostrar_rodada(resultado, linhas, workers):
+    print(f"\n=== Navegador {resultado['modo']} ===")
+    print(f"Linhas: {resultado['concluidas']}/{linhas} em {resultado['duracao']}s com {workers} worker(s)")
+    print(f"Vazão: {resultado['linhas_por_minuto']} linhas/minuto")
+    if resultado["memoria_navegadores_mb"] is not None:
+        print(f"Memória máxima dos navegadores: {resultado['memoria_navegadores_mb']} MB")
+    else:
+        print("Memória dos navegadores: n/d (instale psutil)")
+    print(f"\n{'Etapa':<70} {'n':>5} {'p50 (s)':>9} {'p95 (s)':>9}")
+    for etapa, t in resultado["etapas"].items():
+        print(f"{etapa[:70]:<70} {t['contagem']:>5} {t['p50']:>9} {t['p95']:>9}")
+
+
+# Função para mostrar lado a lado o navegador completo e o enxuto
+def mostrar_comparacao(rodadas):
+    completo, enxuto = rodadas["completo"], rodadas["enxuto"]
+    print(f"\n{'Métrica':<40} {'completo':>10} {'enxuto':>10}")
+    for chave, rotulo in (
+        ("inicio_navegador_p50", "Abertura do navegador p50 (s)"),
+        ("linha_p50", "Registro completo p50 (s)"),
+        ("linha_p95", "Registro completo p95 (s)"),
+        ("linhas_por_minuto", "Linhas/minuto"),
+        ("memoria_navegadores_mb", "Memória máxima dos navegadores (MB)")
+    ):
+        valores = [r[chave] if r[chave] is not None else "n/d" for r in (completo, enxuto)]
+        print(f"{rotulo:<40} {valores[0]:>10} {valores[1]:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do robô contra o SGP simulado")
+    parser.add_argument("--linhas", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--visivel", action="store_true", help="abre o navegador (padrão: headless)")
+    parser.add_argument("--salvar", action="store_true", help="clica em Salvar (padrão: modo simulação, Cancelar)")
+    parser.add_argument("--chromedriver", default=None, help="caminho do ChromeDriver")
+    parser.add_argument("--modo", choices=("enxuto", "completo", "comparar"), default="enxuto",
+                        help="navegador enxuto (recursos bloqueados, carregamento eager), completo ou os dois em sequência")
+    parser.add_argument("--latencia-pagina", type=float, default=0.0)
+    parser.add_argument("--latencia-cpf", type=float, default=0.5)
+    parser.add_argument("--latencia-upload", type=float, default=0.5)
+    parser.add_argument("--latencia-salvar", type=float, default=0.3)
+    parser.add_argument("--latencia-recursos", type=float, default=0.2, help="atraso de cada imagem/fonte/script de terceiros")
+    parser.add_argument("--saida", help="grava o resultado em JSON neste arquivo")
+    parser.add_argument("--importacao", action="store_true",
+                        help="só verifica o tempo de importação do app.py e se pandas/Selenium/pypdf ficaram fora da subida")
+    parser.add_argument("--orcamento-importacao", type=float, default=0.5, help="tempo máximo de `import app` (em segundos)")
+    args = parser.parse_args()
+
+    if args.importacao:
+        return verificar_importacao(args.orcamento_importacao)
+
+    chromedriver = os.path.abspath(args.chromedriver or os.path.join(DIRETORIO_ROBO, "chromedriver.exe"))
+    saida = os.path.abspath(args.saida) if args.saida else None
+
+    # O robô trabalha no diretório atual (planilha.xlsx, arquivos/, logs/)
+    area = tempfile.mkdtemp(prefix="benchmark_robo_")
+    os.chdir(area)
+    sys.path.insert(0, DIRETORIO_ROBO)
+    import pandas as pd
+    import app
+    import sgp_mock
+
+    app.inicializar()
+    app.CAMINHO_CHROMEDRIVER = chromedriver
+    preparar_dados(args.linhas, pd)
+
+    servidor, url = sgp_mock.iniciar_em_thread(latencias={
+        "pagina": args.latencia_pagina,
+        "consulta_cpf": args.latencia_cpf,
+        "upload": args.latencia_upload,
+        "salvar": args.latencia_salvar,
+        "recursos": args.latencia_recursos
+    })
+
+    plano = app.montar_plano_execucao(pd.read_excel("planilha.xlsx"), "2024-07-24", "2024-08-11")
+    parametros = {
+        "url": url,
+        "usuario": "benchmark",
+        "senha": "benchmark",
+        "orgao_publico": "1",
+        "parceria": "1",
+        "headless_mode": not args.visivel,
+        "modo_simulacao": not args.salvar,
+        "ano_mes": time.strftime("%Y%m")
+    }
+
+    modos = ("completo", "enxuto") if args.modo == "comparar" else (args.modo,)
+    rodadas = {}
+    for modo in modos:
+        rodadas[modo] = executar_rodada(app, sgp_mock, plano, parametros, args.workers, modo)
+        mostrar_rodada(rodadas[modo], args.linhas, args.workers)
+    servidor.shutdown()
+
+    if len(rodadas) > 1:
+        mostrar_comparacao(rodadas)
+
+    resultado = {"linhas": args.linhas, "workers": args.workers, "rodadas": rodadas}
+    if saida:
+        with open(saida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+    return 0 if all(r["concluidas"] == args.linhas for r in rodadas.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
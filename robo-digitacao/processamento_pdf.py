@@ -0,0 +1,362 @@
+import os
+import re
+import tempfile
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import RectangleObject
+
+# ========= PROCESSAMENTO DE PDFs =========
+# Divisão de PDFs de contracheques/recibos (versão servidor dos extratores em
+# extrator_docs/documentsv2 e documentsv3). As funções executadas nos processos do pool
+# ficam neste módulo, que não importa o app.py. Com o método "spawn" (Windows), porém, cada
+# processo filho reimporta o módulo principal (app.py) como __mp_main__: por isso o app.py
+# só define funções e objetos no nível do módulo e deixa log, pastas e registros em disco
+# para app.inicializar(), chamada apenas no processo do servidor.
+
+# Conversão: 1 mm = 2.834645669 pontos (72 DPI), altura do A4 em mm
+MM_PARA_PONTOS = 2.834645669
+ALTURA_A4_MM = 297
+# Páginas por tarefa enviada ao pool (divisão) e documentos por tarefa (junção)
+PAGINAS_POR_TAREFA = 25
+PARES_POR_TAREFA = 50
+# Tolerância (em pontos) para considerar dois textos na mesma linha
+TOLERANCIA_LINHA = 5
+# Pré-verificação: arquivos por tarefa, lado máximo (em pixels, A4 a 150 DPI) e qualidade JPEG
+# das imagens dos PDFs recomprimidos
+ARQUIVOS_POR_TAREFA = 20
+LADO_MAXIMO_IMAGEM = 1754
+QUALIDADE_JPEG = 70
+
+# Palavras do cabeçalho que não fazem parte do nome do funcionário
+PALAVRAS_EXCLUIDAS = {
+    "contracheque": {"CASA", "SAÚDE", "MENINO", "JESUS", "PRAGA", "CNPJ", "TÉCNICO", "ENFERMAGEM"},
+    "recibo": {"CASA", "BANCO", "CONTA", "SAÚDE", "MENINO", "JESUS", "BANRISUL", "RECIBO", "PAGAMENTO"}
+}
+
+PALAVRA_MAIUSCULA = r"[A-ZÁÀÂÃÉÊÍÓÔÕÚÇ]"
+
+
+# Função para determinar a posição do corte no documento (topo, meio ou base)
+def posicao_no_documento(inicio_topo_mm, fim_topo_mm):
+    percentual = (inicio_topo_mm + fim_topo_mm) / 2 / ALTURA_A4_MM * 100
+    if percentual <= 33:
+        return "topo"
+    if percentual <= 66:
+        return "meio"
+    return "base"
+
+
+# Função para converter os cortes (em mm a partir do topo) para coordenadas do PDF (a partir da base)
+def pontos_de_corte(cortes, altura_mm=ALTURA_A4_MM):
+    pontos = []
+    for numero, corte in enumerate(cortes, start=1):
+        inicio_topo_mm = float(corte.get("inicio_mm") or 0)
+        fim_topo_mm = float(corte.get("fim_mm") or 0)
+        if inicio_topo_mm >= fim_topo_mm:
+            raise ValueError(f"Erro no corte {numero}: ponto inicial deve ser menor que o final")
+        pontos.append({
+            "inicio": round((altura_mm - fim_topo_mm) * MM_PARA_PONTOS),
+            "fim": round((altura_mm - inicio_topo_mm) * MM_PARA_PONTOS),
+            "inicio_mm": inicio_topo_mm,
+            "fim_mm": fim_topo_mm,
+            "posicao": posicao_no_documento(inicio_topo_mm, fim_topo_mm)
+        })
+    return pontos
+
+
+# Função para extrair os textos da página com suas posições, limitados à faixa [inicio, fim]
+def extrair_textos(pagina, inicio=None, fim=None):
+    itens = []
+
+    def visitar(texto, cm, tm, fonte, tamanho):
+        texto = texto.strip()
+        if not texto:
+            return
+        x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+        y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+        if inicio is not None and not (inicio <= y <= fim):
+            return
+        # Cada palavra vira um item, como os textos do PDF.js
+        for indice, palavra in enumerate(texto.split()):
+            itens.append((palavra, x + indice * 0.01, y))
+
+    pagina.extract_text(visitor_text=visitar)
+
+    # Ordenar de cima para baixo e, na mesma linha, da esquerda para a direita
+    itens.sort(key=lambda item: (-item[2], item[1]))
+    linhas = []
+    for item in itens:
+        if linhas and abs(linhas[-1][0][2] - item[2]) < TOLERANCIA_LINHA:
+            linhas[-1].append(item)
+        else:
+            linhas.append([item])
+    textos = []
+    for linha in linhas:
+        linha.sort(key=lambda item: item[1])
+        textos.extend(item[0] for item in linha)
+    return textos, [" ".join(item[0] for item in linha) for linha in linhas]
+
+
+# Função para concatenar palavras maiúsculas a partir da posição `inicio`
+def concatenar_nome(textos, inicio, excluidas, limite=10):
+    nome = [textos[inicio]]
+    for texto in textos[inicio + 1:inicio + limite]:
+        if re.fullmatch(PALAVRA_MAIUSCULA + "{2,}", texto) and texto not in excluidas:
+            nome.append(texto)
+        else:
+            break
+    return " ".join(nome)
+
+
+# Função para extrair o nome do funcionário de um contracheque (estratégias do documentsv3)
+def nome_contracheque(textos, linhas):
+    excluidas = PALAVRAS_EXCLUIDAS["contracheque"]
+
+    # Estratégia 1: código de 3 dígitos seguido do nome (até um número longo, como o CBO)
+    for i, texto in enumerate(textos[:-1]):
+        if not re.fullmatch(r"\d{3}", texto):
+            continue
+        nome = []
+        for candidato in textos[i + 1:]:
+            if re.fullmatch(r"\d{5,}", candidato):
+                break
+            if re.fullmatch(PALAVRA_MAIUSCULA + "+", candidato) and len(candidato) >= 2:
+                if candidato not in excluidas:
+                    nome.append(candidato)
+            elif nome:
+                break
+        if len(" ".join(nome)) >= 5:
+            return " ".join(nome)
+
+    # Estratégia 2: texto seguinte ao rótulo "Nome do Funcionário"
+    for i, linha in enumerate(linhas[:-1]):
+        if "nome" in linha.lower() and "funcionário" in linha.lower():
+            if re.fullmatch(r"[A-ZÁÉÍÓÚÃÕÇ\s]{5,}", linhas[i + 1]):
+                return linhas[i + 1]
+
+    # Estratégia 3: palavras maiúsculas consecutivas formando um nome
+    for i, texto in enumerate(textos):
+        if re.fullmatch(PALAVRA_MAIUSCULA + "{3,}", texto) and texto not in excluidas:
+            nome = concatenar_nome(textos, i, excluidas)
+            if " " in nome and len(nome) >= 10:
+                return nome
+
+    # Estratégia 4: linha inteira em maiúsculas
+    for linha in linhas:
+        if re.fullmatch(r"[A-ZÁÉÍÓÚÃÕÇ\s]{10,}", linha) and not any(p in linha for p in excluidas):
+            return linha
+
+    # Estratégia 5: padrão "código + nome + número"
+    encontrado = re.search(r"(\d{3})\s+([A-ZÁÉÍÓÚÃÕÇ\s]+?)\s+(\d{5,})", " ".join(textos))
+    if encontrado:
+        return encontrado.group(2).strip()
+    return None
+
+
+# Função para extrair o nome do favorecido de um recibo (estratégias do documentsv2)
+def nome_recibo(textos, linhas):
+    excluidas = PALAVRAS_EXCLUIDAS["recibo"]
+
+    # Estratégia 1: padrão "Favorecido / Banco / Ag / Conta : NOME - 123"
+    encontrado = re.search(
+        r"Favorecido\s*/?\s*Banco\s*/?\s*Ag\s*/?\s*Conta\s*:\s*([A-ZÁÀÂÃÉÊÍÓÔÕÚÇ\s]+?)(?:\s*-\s*\d|$)",
+        " ".join(textos), re.IGNORECASE
+    )
+    if encontrado and encontrado.group(1).strip():
+        return encontrado.group(1).strip()
+
+    # Estratégia 2: primeira linha em maiúsculas depois de "Favorecido"
+    for i, linha in enumerate(linhas):
+        if "favorecido" in linha.lower():
+            for candidato in linhas[i + 1:i + 10]:
+                if re.fullmatch(r"[A-ZÁÀÂÃÉÊÍÓÔÕÚÇ\s]{5,}", candidato) and "CASA" not in candidato and "BANCO" not in candidato:
+                    return candidato.strip()
+            break
+
+    # Estratégia 3: palavras maiúsculas consecutivas formando um nome
+    for i, texto in enumerate(textos):
+        if re.fullmatch(PALAVRA_MAIUSCULA + "{3,}", texto) and texto not in excluidas:
+            nome = concatenar_nome(textos, i, excluidas, limite=5)
+            if " " in nome and len(nome) >= 8:
+                return nome
+    return None
+
+
+# Função para normalizar o nome extraído para o nome do arquivo (maiúsculas, sem acentos)
+def normalizar_nome_arquivo(nome):
+    nome = unicodedata.normalize("NFKD", nome)
+    nome = "".join(c for c in nome if not unicodedata.combining(c)).upper()
+    return " ".join(re.sub(r"[^A-Z ]", " ", nome).split())
+
+
+# Função executada no pool: divide as páginas [primeira, ultima) e grava cada pedaço em `destino`
+def dividir_paginas(caminho_pdf, primeira, ultima, cortes, tipo, destino):
+    leitor = PdfReader(caminho_pdf)
+    extrair_nome = nome_recibo if tipo == "recibo" else nome_contracheque
+    pedacos = []
+
+    for indice in range(primeira, ultima):
+        pagina = leitor.pages[indice]
+        largura = float(pagina.mediabox.width)
+        base = float(pagina.mediabox.bottom)
+
+        for numero, corte in enumerate(cortes, start=1):
+            textos, linhas = extrair_textos(pagina, base + corte["inicio"], base + corte["fim"])
+            nome = extrair_nome(textos, linhas)
+
+            escritor = PdfWriter()
+            nova = escritor.add_page(pagina)
+            caixa = RectangleObject((0, base + corte["inicio"], largura, base + corte["fim"]))
+            nova.mediabox = caixa
+            nova.cropbox = caixa
+
+            caminho = os.path.join(destino, f"p{indice + 1:04d}_c{numero}.pdf")
+            with open(caminho, "wb") as f:
+                escritor.write(f)
+            pedacos.append({
+                "pagina": indice + 1,
+                "corte": numero,
+                "posicao": corte["posicao"],
+                "nome": normalizar_nome_arquivo(nome) if nome else None,
+                "caminho": caminho
+            })
+    return pedacos
+
+
+# Função para dividir todas as páginas do PDF em um pool de processos
+# Retorna os pedaços na ordem das páginas e dos cortes
+def dividir_pdf(caminho_pdf, cortes, tipo, destino, processos=None):
+    total_paginas = len(PdfReader(caminho_pdf).pages)
+    faixas = [(inicio, min(inicio + PAGINAS_POR_TAREFA, total_paginas)) for inicio in range(0, total_paginas, PAGINAS_POR_TAREFA)]
+    processos = max(1, min(processos or os.cpu_count() or 1, len(faixas)))
+
+    if processos == 1:
+        resultados = [dividir_paginas(caminho_pdf, inicio, fim, cortes, tipo, destino) for inicio, fim in faixas]
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as pool:
+            futuros = [pool.submit(dividir_paginas, caminho_pdf, inicio, fim, cortes, tipo, destino) for inicio, fim in faixas]
+            resultados = [futuro.result() for futuro in futuros]
+    return total_paginas, [pedaco for lista in resultados for pedaco in lista]
+
+
+# Função executada no pool: junta cada par (recibo, contracheque) em um PDF de destino
+# O destino é gravado em um temporário e trocado com os.replace: o arquivo existente pode ser um
+# hardlink do armazém de objetos do app.py, e gravar por cima alteraria o objeto compartilhado
+def juntar_lote(tarefas):
+    for recibo, contracheque, destino in tarefas:
+        escritor = PdfWriter()
+        escritor.append(recibo)
+        escritor.append(contracheque)
+        temporario = destino + ".parcial"
+        with open(temporario, "wb") as f:
+            escritor.write(f)
+        os.replace(temporario, destino)
+    return len(tarefas)
+
+
+# Função para juntar todos os pares em um pool de processos
+def juntar_pdfs(tarefas, processos=None):
+    lotes = [tarefas[i:i + PARES_POR_TAREFA] for i in range(0, len(tarefas), PARES_POR_TAREFA)]
+    processos = max(1, min(processos or os.cpu_count() or 1, len(lotes) or 1))
+
+    if processos == 1:
+        return sum(juntar_lote(lote) for lote in lotes)
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        return sum(pool.map(juntar_lote, lotes))
+
+
+# Função para recomprimir um PDF: reduz as imagens grandes (requer Pillow) e comprime os conteúdos das páginas
+def recomprimir_pdf(caminho_pdf, destino):
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None  # Sem Pillow, apenas a compressão dos conteúdos (sem perdas)
+
+    escritor = PdfWriter(clone_from=caminho_pdf)
+    for pagina in escritor.pages:
+        if Image is not None:
+            for imagem in pagina.images:
+                try:
+                    figura = imagem.image
+                    # Imagens com transparência ou paleta ficam como estão (o JPEG perderia a máscara)
+                    if figura.mode not in ("RGB", "L"):
+                        continue
+                    if max(figura.size) > LADO_MAXIMO_IMAGEM:
+                        figura = figura.copy()
+                        figura.thumbnail((LADO_MAXIMO_IMAGEM, LADO_MAXIMO_IMAGEM), Image.LANCZOS)
+                    imagem.replace(figura, quality=QUALIDADE_JPEG)
+                except Exception:
+                    continue  # Imagens embutidas ou em formatos não suportados
+        pagina.compress_content_streams()
+
+    # Temporário com nome único: duas pré-verificações podem recomprimir o mesmo conteúdo ao mesmo tempo
+    os.makedirs(os.path.dirname(destino) or ".", exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(suffix=".parcial", dir=os.path.dirname(destino) or ".")
+    try:
+        with os.fdopen(descritor, "wb") as f:
+            escritor.write(f)
+        os.replace(temporario, destino)
+    except BaseException:
+        os.remove(temporario)
+        raise
+    return os.path.getsize(destino)
+
+
+# Função para verificar um PDF: abre, conta as páginas e lê o conteúdo de cada uma
+# Acima de `limite_bytes`, grava em `destino` uma versão recomprimida (mantida só se ficar menor)
+def inspecionar_pdf(caminho_pdf, limite_bytes, destino):
+    resultado = {
+        "arquivo": os.path.basename(caminho_pdf),
+        "valido": False,
+        "erro": None,
+        "aviso": None,
+        "paginas": 0,
+        "tamanho": os.path.getsize(caminho_pdf),
+        "otimizado": None,
+        "tamanho_otimizado": None
+    }
+    try:
+        leitor = PdfReader(caminho_pdf)
+        if leitor.is_encrypted:
+            raise ValueError("PDF protegido por senha")
+        if not leitor.pages:
+            raise ValueError("PDF sem páginas")
+        for pagina in leitor.pages:
+            pagina.get_contents()
+        resultado.update(valido=True, paginas=len(leitor.pages))
+    except Exception as e:
+        resultado["erro"] = str(e) or e.__class__.__name__
+        return resultado
+
+    if limite_bytes and resultado["tamanho"] > limite_bytes:
+        try:
+            tamanho = recomprimir_pdf(caminho_pdf, destino)
+            if tamanho < resultado["tamanho"]:
+                resultado.update(otimizado=destino, tamanho_otimizado=tamanho)
+            else:
+                os.remove(destino)
+                try:
+                    os.rmdir(os.path.dirname(destino))  # A pasta do hash só existe para o recomprimido
+                except OSError:
+                    pass
+        except Exception as e:
+            # O original continua válido; só não é reduzido
+            resultado["aviso"] = f"Não foi possível recomprimir: {e}"
+    return resultado
+
+
+# Função executada no pool: verifica um lote de PDFs [(caminho, limite_bytes, destino), ...]
+def inspecionar_lote(tarefas):
+    return [inspecionar_pdf(*tarefa) for tarefa in tarefas]
+
+
+# Função para verificar todos os PDFs em um pool de processos; retorna os resultados na ordem das tarefas
+def inspecionar_pdfs(tarefas, processos=None):
+    lotes = [tarefas[i:i + ARQUIVOS_POR_TAREFA] for i in range(0, len(tarefas), ARQUIVOS_POR_TAREFA)]
+    processos = max(1, min(processos or os.cpu_count() or 1, len(lotes) or 1))
+
+    if processos == 1:
+        return [resultado for lote in lotes for resultado in inspecionar_lote(lote)]
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        return [resultado for lista in pool.map(inspecionar_lote, lotes) for resultado in lista]
@@ -0,0 +1,354 @@
+import argparse
+import threading
+import time
+from flask import Flask, request, redirect, make_response, jsonify
+
+# ========= SGP SIMULADO =========
+# Reproduz as páginas e os XPaths do sgp.procempa.com.br usados pelo robô (app.py),
+# com latência artificial configurável, para medir e testar o robô sem o servidor real.
+
+app = Flask(__name__)
+
+# Latências artificiais (em segundos)
+LATENCIA = {
+    "pagina": 0.0,  # carregamento das páginas (login e seleção de parceria)
+    "consulta_cpf": 0.5,  # consulta do credor pelo CPF
+    "upload": 0.5,  # envio do PDF
+    "salvar": 0.3,  # gravação do desembolso
+    "recursos": 0.0  # cada imagem/fonte/script de terceiros da página (bloqueados no modo enxuto)
+}
+
+# Recursos pesados referenciados pelas páginas, como os logos, fontes e scripts de análise do SGP real
+RECURSOS = """
+<link rel="stylesheet" href="/recursos/fonts.googleapis.com/fontes.css">
+<img src="/recursos/logo.png" alt="" width="1" height="1">
+<img src="/recursos/banner.jpg" alt="" width="1" height="1">
+<script async src="/recursos/google-analytics.com/analytics.js"></script>
+"""
+
+# Desembolsos gravados (também exibidos na tabela paginada da tela de desembolsos)
+desembolsos = []
+POR_PAGINA = 10
+_lock = threading.Lock()
+
+PAGINA_LOGIN = """<!DOCTYPE html>
+<html><head><title>Keycloak (simulado)</title></head>
+<body>
+__RECURSOS__
+<form id="kc-form-login" method="post" action="/login">
+    <input id="username" name="username" type="text">
+    <input id="password" name="password" type="password">
+    <input id="kc-login" type="submit" value="Entrar">
+</form>
+</body></html>"""
+
+PAGINA_PARCERIA = """<!DOCTYPE html>
+<html><head><title>SGP (simulado)</title>
+<style>
+    .oculto { display: none; }
+    .spinner-border { display: inline-block; width: 1rem; height: 1rem; border: 2px solid #333; }
+</style>
+</head>
+<body>
+__RECURSOS__
+<app-root><app-exibe-parceria-usuario>
+<div>
+    <div>
+        <div><div><select id="orgao">__ORGAOS__</select></div></div>
+        <div><div><select id="parceria">__PARCERIAS__</select></div></div>
+    </div>
+    <div id="area-desembolsos" class="oculto">
+        <div id="desembolsos-header"><h3>Desembolsos</h3><button type="button">Incluir Desembolsos</button></div>
+        <div id="area-inclusao" class="oculto"><button id="button-insert" type="button">Adicionar Novo Registro</button></div>
+        <table id="tabela-desembolsos">
+            <thead><tr><th>Credor</th><th>CPF/CNPJ</th><th>Nº Documento</th><th>Valor</th><th>Data de Pagamento</th></tr></thead>
+            <tbody></tbody>
+        </table>
+        <ngb-pagination><ul class="pagination">
+            <li class="page-item"><a class="page-link" aria-label="Previous" href="#">«</a></li>
+            <li class="page-item"><a class="page-link" aria-label="Next" href="#">»</a></li>
+        </ul></ngb-pagination>
+    </div>
+</div>
+</app-exibe-parceria-usuario></app-root>
+
+<template id="modelo-modal">
+<ngb-modal-window>
+<div><div>
+    <div class="modal-header">Novo Desembolso</div>
+    <form>
+    <div>
+        <div>
+            <div><div><select id="natureza">
+                <option>Selecione</option><option>Pagamento de Pessoal</option><option>Outras</option>
+            </select></div></div>
+            <div><div><select id="tipoDocumento">__TIPOS__</select></div></div>
+        </div>
+        <div>
+            <input id="nroDoc" type="text">
+            <input id="cpfCnpj" type="text">
+        </div>
+        <div><input id="nomeCredor" type="text" readonly></div>
+        <div>
+            <div><input id="dataEmissao" type="text"></div>
+            <div><input id="valor" type="text"></div>
+            <div><input id="dataPagamento" type="text"></div>
+            <div><input id="valorTotal" type="text"></div>
+        </div>
+        <div></div>
+        <div></div>
+        <div>
+            <div>Anexo</div>
+            <div><div><div><div><input id="anexo" type="file"></div></div></div></div>
+        </div>
+        <div>
+            <button type="button" id="cancelar">Cancelar</button>
+            <button type="button" id="salvar">Salvar</button>
+        </div>
+    </div>
+    </form>
+</div></div>
+</ngb-modal-window>
+</template>
+
+<script>
+var arquivoEnviado = null;
+
+document.getElementById('parceria').addEventListener('change', function () {
+    document.getElementById('area-desembolsos').classList.remove('oculto');
+});
+document.querySelector('#desembolsos-header button').addEventListener('click', function () {
+    document.getElementById('area-inclusao').classList.remove('oculto');
+});
+
+function spinner(modal, ativo) {
+    var atual = modal.querySelector('.spinner-border');
+    if (ativo && !atual) {
+        var s = document.createElement('span');
+        s.className = 'spinner-border';
+        modal.querySelector('.modal-header').appendChild(s);
+    } else if (!ativo && atual) {
+        atual.remove();
+    }
+}
+
+function fecharModal() {
+    var modal = document.querySelector('ngb-modal-window');
+    if (modal) modal.remove();
+}
+
+// Tabela paginada como a do SGP (ngb-pagination, __POR_PAGINA__ linhas por página)
+var linhasTabela = [];
+var paginaAtual = 0;
+var porPagina = __POR_PAGINA__;
+
+function desenharTabela() {
+    var tbody = document.querySelector('#tabela-desembolsos tbody');
+    tbody.innerHTML = '';
+    linhasTabela.slice(paginaAtual * porPagina, (paginaAtual + 1) * porPagina).forEach(function (d) {
+        var tr = document.createElement('tr');
+        [d.nomeCredor, d.cpfCnpj, d.nroDoc, 'R$ ' + d.valor, d.dataPagamento].forEach(function (v) {
+            var td = document.createElement('td');
+            td.textContent = v;
+            tr.appendChild(td);
+        });
+        tbody.appendChild(tr);
+    });
+    var ultima = Math.max(0, Math.ceil(linhasTabela.length / porPagina) - 1);
+    document.querySelector('.pagination a[aria-label="Previous"]').parentNode.classList.toggle('disabled', paginaAtual === 0);
+    document.querySelector('.pagination a[aria-label="Next"]').parentNode.classList.toggle('disabled', paginaAtual >= ultima);
+}
+
+function adicionarLinha(d) {
+    linhasTabela.push(d);
+    desenharTabela();
+}
+
+document.querySelector('.pagination a[aria-label="Previous"]').addEventListener('click', function (e) {
+    e.preventDefault();
+    if (paginaAtual > 0) { paginaAtual--; desenharTabela(); }
+});
+document.querySelector('.pagination a[aria-label="Next"]').addEventListener('click', function (e) {
+    e.preventDefault();
+    if ((paginaAtual + 1) * porPagina < linhasTabela.length) { paginaAtual++; desenharTabela(); }
+});
+
+document.getElementById('button-insert').addEventListener('click', function () {
+    fecharModal();
+    var modelo = document.getElementById('modelo-modal').content.cloneNode(true);
+    document.body.appendChild(modelo);
+    var modal = document.querySelector('ngb-modal-window');
+    arquivoEnviado = null;
+
+    var cpf = modal.querySelector('#cpfCnpj');
+    function consultarCpf() {
+        if (!cpf.value || cpf.dataset.consultado === cpf.value) return;
+        cpf.dataset.consultado = cpf.value;
+        spinner(modal, true);
+        fetch('/api/credor?cpf=' + encodeURIComponent(cpf.value))
+            .then(function (r) { return r.json(); })
+            .then(function (d) {
+                modal.querySelector('#nomeCredor').value = d.nome;
+                spinner(modal, false);
+            });
+    }
+    cpf.addEventListener('change', consultarCpf);
+    cpf.addEventListener('blur', consultarCpf);
+
+    var anexo = modal.querySelector('#anexo');
+    anexo.addEventListener('change', function () {
+        var barra = document.createElement('div');
+        barra.className = 'progress-bar';
+        barra.setAttribute('aria-valuenow', '0');
+        anexo.parentNode.appendChild(barra);
+        var dados = new FormData();
+        dados.append('arquivo', anexo.files[0]);
+        fetch('/api/upload', { method: 'POST', body: dados })
+            .then(function (r) { return r.json(); })
+            .then(function (d) {
+                arquivoEnviado = d.arquivo;
+                barra.setAttribute('aria-valuenow', '100');
+            });
+    });
+
+    modal.querySelector('#cancelar').addEventListener('click', fecharModal);
+    modal.querySelector('#salvar').addEventListener('click', function () {
+        var d = {
+            natureza: modal.querySelector('#natureza').selectedIndex,
+            tipoDocumento: modal.querySelector('#tipoDocumento').selectedIndex,
+            nroDoc: modal.querySelector('#nroDoc').value,
+            cpfCnpj: modal.querySelector('#cpfCnpj').value,
+            nomeCredor: modal.querySelector('#nomeCredor').value,
+            dataEmissao: modal.querySelector('#dataEmissao').value,
+            valor: modal.querySelector('#valor').value,
+            dataPagamento: modal.querySelector('#dataPagamento').value,
+            valorTotal: modal.querySelector('#valorTotal').value,
+            arquivo: arquivoEnviado
+        };
+        spinner(modal, true);
+        fetch('/api/desembolsos', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(d)
+        }).then(function () {
+            adicionarLinha(d);
+            fecharModal();
+        });
+    });
+});
+
+fetch('/api/desembolsos').then(function (r) { return r.json(); }).then(function (d) {
+    linhasTabela = d.desembolsos;
+    desenharTabela();
+});
+</script>
+</body></html>"""
+
+
+def opcoes(quantidade, rotulo):
+    return "".join(f"<option value=\"{i}\">{rotulo} {i}</option>" for i in range(1, quantidade + 1))
+
+
+def logado():
+    return request.cookies.get("sessao_sgp") == "ok"
+
+
+@app.route("/execucao")
+def execucao():
+    time.sleep(LATENCIA["pagina"])
+    if not logado():
+        return PAGINA_LOGIN.replace("__RECURSOS__", RECURSOS)
+    return (PAGINA_PARCERIA
+            .replace("__RECURSOS__", RECURSOS)
+            .replace("__ORGAOS__", opcoes(4, "Órgão"))
+            .replace("__PARCERIAS__", opcoes(13, "Parceria"))
+            .replace("__TIPOS__", opcoes(20, "Tipo"))
+            .replace("__POR_PAGINA__", str(POR_PAGINA)))
+
+
+@app.route("/login", methods=["POST"])
+def login():
+    time.sleep(LATENCIA["pagina"])
+    resposta = make_response(redirect("/execucao"))
+    if request.form.get("username") and request.form.get("password"):
+        resposta.set_cookie("sessao_sgp", "ok")
+    return resposta
+
+
+@app.route("/recursos/<path:nome>")
+def recursos(nome):
+    time.sleep(LATENCIA["recursos"])
+    tipos = {".png": "image/png", ".jpg": "image/jpeg", ".css": "text/css", ".js": "application/javascript"}
+    tipo = next((t for extensao, t in tipos.items() if nome.endswith(extensao)), "application/octet-stream")
+    return app.response_class(b"", mimetype=tipo)
+
+
+@app.route("/api/credor")
+def credor():
+    time.sleep(LATENCIA["consulta_cpf"])
+    cpf = request.args.get("cpf", "")
+    return jsonify({"cpf": cpf, "nome": f"CREDOR {cpf[-4:]}"})
+
+
+@app.route("/api/upload", methods=["POST"])
+def upload():
+    time.sleep(LATENCIA["upload"])
+    arquivo = request.files.get("arquivo")
+    return jsonify({"arquivo": arquivo.filename if arquivo else None})
+
+
+@app.route("/api/desembolsos", methods=["GET", "POST"])
+def api_desembolsos():
+    if request.method == "POST":
+        time.sleep(LATENCIA["salvar"])
+        with _lock:
+            desembolsos.append(request.json)
+        return jsonify({"status": "success"})
+    with _lock:
+        return jsonify({"desembolsos": list(desembolsos)})
+
+
+# Permite pré-carregar desembolsos (como se já tivessem sido lançados em uma execução anterior)
+@app.route("/api/desembolsos/importar", methods=["POST"])
+def importar_desembolsos():
+    with _lock:
+        desembolsos.extend(request.json.get("desembolsos", []))
+    return jsonify({"status": "success", "total": len(desembolsos)})
+
+
+@app.route("/api/limpar", methods=["POST"])
+def limpar():
+    with _lock:
+        desembolsos.clear()
+    return jsonify({"status": "success"})
+
+
+# Função para iniciar o SGP simulado em segundo plano (usado pelo benchmark)
+def iniciar_em_thread(porta=0, latencias=None):
+    from werkzeug.serving import make_server
+
+    LATENCIA.update(latencias or {})
+    servidor = make_server("127.0.0.1", porta, app, threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_port}/execucao"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SGP simulado para testes e benchmark do robô")
+    parser.add_argument("--porta", type=int, default=5050)
+    parser.add_argument("--latencia-pagina", type=float, default=LATENCIA["pagina"])
+    parser.add_argument("--latencia-cpf", type=float, default=LATENCIA["consulta_cpf"])
+    parser.add_argument("--latencia-upload", type=float, default=LATENCIA["upload"])
+    parser.add_argument("--latencia-salvar", type=float, default=LATENCIA["salvar"])
+    parser.add_argument("--latencia-recursos", type=float, default=LATENCIA["recursos"])
+    args = parser.parse_args()
+
+    LATENCIA.update({
+        "pagina": args.latencia_pagina,
+        "consulta_cpf": args.latencia_cpf,
+        "upload": args.latencia_upload,
+        "salvar": args.latencia_salvar,
+        "recursos": args.latencia_recursos
+    })
+    print(f"SGP simulado em http://127.0.0.1:{args.porta}/execucao")
+    app.run(port=args.porta, threaded=True)
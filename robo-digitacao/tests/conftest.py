@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+# Cada teste roda em uma pasta temporária (o app.py usa caminhos relativos: arquivos/, logs/, espacos/)
+@pytest.fixture
+def pasta(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+# Fábrica de PDFs válidos com N páginas em branco
+@pytest.fixture
+def gerar_pdf():
+    from pypdf import PdfWriter
+
+    def gerar(caminho, paginas=1):
+        escritor = PdfWriter()
+        for _ in range(paginas):
+            escritor.add_blank_page(595, 842)
+        with open(caminho, "wb") as f:
+            escritor.write(f)
+        return str(caminho)
+
+    return gerar
+
+
+# Cliente HTTP do Flask com espaços de trabalho e envios parciais novos, na pasta temporária
+@pytest.fixture
+def cliente(pasta, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, "_inicializado", True)  # Sem log em arquivo nem pré-aquecimento
+    espacos = app.EspacosTrabalho(str(pasta / "espacos"))
+    espacos.carregar()
+    monkeypatch.setattr(app, "espacos_trabalho", espacos)
+    uploads = app.UploadsParciais(str(pasta / "uploads_parciais"))
+    uploads.preparar()
+    monkeypatch.setattr(app, "uploads_parciais", uploads)
+    return app.app.test_client()
@@ -0,0 +1,127 @@
+import hashlib
+import io
+import os
+import time
+
+import app
+import processamento_pdf
+
+
+def test_gravar_por_cima_de_arquivo_materializado_nao_altera_o_objeto(pasta, gerar_pdf):
+    armazem = app.ArmazemObjetos(str(pasta / "objetos"))
+    armazem.preparar()
+    os.makedirs("arquivos")
+
+    original = gerar_pdf(pasta / "original.pdf")
+    hash_objeto, _, _ = armazem.gravar_arquivo(original)
+    destino = os.path.join("arquivos", "001 - ANA - CMDCA.PDF")
+    armazem.materializar(hash_objeto, destino)
+
+    # Junção gravando um PDF com o mesmo nome de um arquivo enviado
+    recibo = gerar_pdf(pasta / "recibo.pdf")
+    contracheque = gerar_pdf(pasta / "contracheque.pdf", paginas=2)
+    processamento_pdf.juntar_lote([(recibo, contracheque, destino)])
+    assert app.DiarioExecucao.hash_arquivo(armazem.caminho(hash_objeto)) == hash_objeto
+    assert app.DiarioExecucao.hash_arquivo(destino) != hash_objeto
+
+    # Divisão movendo um pedaço para cima do arquivo materializado
+    armazem.materializar(hash_objeto, destino)
+    pedaco = gerar_pdf(pasta / "pedaco.pdf", paginas=3)
+    app.mover_substituindo(pedaco, destino)
+    assert app.DiarioExecucao.hash_arquivo(armazem.caminho(hash_objeto)) == hash_objeto
+
+
+def test_materializar_reaproveita_conteudo_igual(pasta):
+    armazem = app.ArmazemObjetos(str(pasta / "objetos"))
+    armazem.preparar()
+    hash_objeto, tamanho, novo = armazem.gravar_fluxo(io.BytesIO(b"%PDF conteudo"))
+    assert (tamanho, novo) == (13, True)
+    assert armazem.gravar_fluxo(io.BytesIO(b"%PDF conteudo")) == (hash_objeto, 13, False)
+
+    destino = str(pasta / "a.pdf")
+    assert armazem.materializar(hash_objeto, destino) is True
+    assert armazem.materializar(hash_objeto, destino) is False
+
+
+def envelhecer(caminho, segundos=2 * app.OBJETO_CARENCIA):
+    antigo = time.time() - segundos
+    os.utime(caminho, (antigo, antigo))
+
+
+def test_conteudo_igual_e_gravado_uma_vez(pasta, monkeypatch):
+    armazem = app.ArmazemObjetos(str(pasta / "objetos"))
+    armazem.preparar()
+    conteudo = b"planilha" * 1000
+    hash_objeto, tamanho, novo = armazem.gravar_fluxo(io.BytesIO(conteudo))
+    assert (tamanho, novo) == (len(conteudo), True)
+    assert armazem.gravar_fluxo(io.BytesIO(conteudo)) == (hash_objeto, len(conteudo), False)
+
+    # Acima do limite em memória o fluxo vai para um temporário: mesmo hash, nenhum .tmp sobrando
+    monkeypatch.setattr(app, "LIMITE_MEMORIA_OBJETO", 10)
+    grande = io.BytesIO(conteudo * 300)
+    hash_grande, _, _ = armazem.gravar_fluxo(grande)
+    assert hash_grande == hashlib.sha256(conteudo * 300).hexdigest()
+    assert not [nome for nome in os.listdir(armazem.pasta) if nome.endswith(".tmp")]
+
+
+def test_backups_iguais_em_sequencia_nao_se_repetem(pasta):
+    armazem = app.ArmazemObjetos(str(pasta / "objetos"))
+    armazem.preparar()
+    planilha = pasta / "planilha.xlsx"
+    planilha.write_bytes(b"v1")
+    primeiro, _ = armazem.registrar_backup(str(planilha), "padrao", "upload")
+    repetido, novo = armazem.registrar_backup(str(planilha), "padrao", "upload")
+    assert repetido == primeiro and not novo
+    planilha.write_bytes(b"v2")
+    armazem.registrar_backup(str(planilha), "padrao", "upload")
+    armazem.registrar_backup(str(planilha), "outro", "upload")  # Outro espaço tem seu próprio histórico
+    assert len(armazem.listar_backups("padrao")) == 2
+    assert len(armazem.listar_backups("outro")) == 1
+
+
+def test_coletar_remove_so_objetos_sem_referencia(pasta):
+    armazem = app.ArmazemObjetos(str(pasta / "objetos"))
+    armazem.preparar()
+    os.makedirs("arquivos")
+
+    def objeto(conteudo):
+        return armazem.gravar_fluxo(io.BytesIO(conteudo))[0]
+
+    solto, materializado, com_backup, recente = objeto(b"solto"), objeto(b"pdf"), objeto(b"planilha"), objeto(b"novo")
+    armazem.materializar(materializado, os.path.join("arquivos", "001 - ANA - CMDCA.PDF"))
+    planilha = pasta / "planilha.xlsx"
+    planilha.write_bytes(b"planilha")
+    armazem.registrar_backup(str(planilha), "padrao", "upload")
+    for hash_objeto in (solto, materializado, com_backup):
+        envelhecer(armazem.caminho(hash_objeto))
+
+    assert armazem.coletar() == (1, len(b"solto"))
+    assert not os.path.exists(armazem.caminho(solto))
+    for hash_objeto in (materializado, com_backup, recente):
+        assert os.path.exists(armazem.caminho(hash_objeto))
+
+    # Sem o hardlink no espaço, o PDF também é coletado
+    os.remove(os.path.join("arquivos", "001 - ANA - CMDCA.PDF"))
+    assert armazem.coletar() == (1, len(b"pdf"))
+
+
+def test_coleta_desligada_quando_materializa_por_copia(pasta, monkeypatch):
+    armazem = app.ArmazemObjetos(str(pasta / "objetos"))
+    armazem.preparar()
+    os.makedirs("arquivos")
+    hash_objeto = armazem.gravar_fluxo(io.BytesIO(b"pdf"))[0]
+
+    def sem_hardlink(origem, destino):
+        raise OSError("hardlink não suportado")
+
+    monkeypatch.setattr(os, "link", sem_hardlink)
+    destino = os.path.join("arquivos", "001 - ANA - CMDCA.PDF")
+    assert armazem.materializar(hash_objeto, destino) is True
+    assert os.stat(armazem.caminho(hash_objeto)).st_nlink == 1
+    envelhecer(armazem.caminho(hash_objeto))
+
+    # A cópia no espaço não aparece na contagem de links: o objeto em uso não pode ser coletado,
+    # nem por outra instância (subida do servidor)
+    assert armazem.coletar() == (0, 0)
+    assert app.ArmazemObjetos(str(pasta / "objetos")).coletar() == (0, 0)
+    assert os.path.exists(armazem.caminho(hash_objeto))
@@ -0,0 +1,109 @@
+import itertools
+import logging
+import os
+import random
+
+import app
+
+
+def criar_pdfs(pasta, nomes):
+    os.makedirs(pasta, exist_ok=True)
+    for i, nome in enumerate(nomes):
+        open(os.path.join(pasta, f"{i:03d} - {nome} - CMDCA.PDF"), "w").close()
+
+
+# Pontuação de referência, nome a nome (a regra que o IndiceArquivos conta pelo índice)
+def pontuacao_direta(nomes_planilha, nomes_arquivo):
+    compat_primeiro = app.compatibilidade_nome(nomes_planilha[0], nomes_arquivo[0])
+    if compat_primeiro < 0.5:
+        return 0.0
+    pontuacao = compat_primeiro * 0.5
+    for nome_planilha in nomes_planilha[1:]:
+        if any(app.compatibilidade_nome(nome_planilha, nome_arquivo) > 0.7 for nome_arquivo in nomes_arquivo):
+            pontuacao += 0.2
+    for nome_planilha in nomes_planilha:
+        if len(nome_planilha) > 3 and any(nome_planilha.startswith(n) or n.startswith(nome_planilha) for n in nomes_arquivo):
+            pontuacao += 0.1
+    if compat_primeiro >= 0.9:
+        pontuacao += 0.15
+    return min(pontuacao, 1.0)
+
+
+def test_pontuacao_do_indice_igual_a_pontuacao_direta(pasta):
+    aleatorio = random.Random(3)
+    letras = "ABCDEILMNORS"
+
+    def nome():
+        return "".join(aleatorio.choice(letras) for _ in range(aleatorio.randint(1, 7)))
+
+    base = [nome() for _ in range(30)]
+
+    def nomes():
+        return [aleatorio.choice(base) if aleatorio.random() < 0.7 else nome() for _ in range(aleatorio.randint(1, 4))]
+
+    criar_pdfs("arquivos", [" ".join(nomes()) for _ in range(300)])
+    indice = app.IndiceArquivos("arquivos")
+    for _ in range(300):
+        planilha = nomes()
+        obtidos = {arquivo: pontuacao for arquivo, _, _, pontuacao in indice.candidatos(planilha)}
+        fortes = {arquivo for arquivo, _, _, _ in indice.candidatos(planilha, somente_fortes=True)}
+        esperados = {
+            arquivo: pontuacao_direta(planilha, tokens)
+            for arquivo, (_, tokens) in indice._arquivos.items()
+        }
+        assert {a: p for a, p in obtidos.items() if p} == {a: p for a, p in esperados.items() if p}
+        assert fortes == {a for a, p in esperados.items() if p > app.PONTUACAO_SO_PRIMEIRO_NOME}
+
+
+def test_nome_contido_em_outro_nao_e_ambiguo(pasta):
+    criar_pdfs("arquivos", ["MARIA SANTOS", "MARIA SILVA SANTOS"])
+    atribuicao = app.atribuir_arquivos(["MARIA SANTOS", "MARIA SILVA SANTOS"], "arquivos")
+    assert atribuicao.arquivos["MARIA SANTOS"][0] == "000 - MARIA SANTOS - CMDCA.PDF"
+    assert atribuicao.arquivos["MARIA SILVA SANTOS"][0] == "001 - MARIA SILVA SANTOS - CMDCA.PDF"
+    assert atribuicao.ambiguos == []
+
+
+def test_linha_sem_candidato_forte_usa_o_primeiro_nome(pasta):
+    criar_pdfs("arquivos", ["JOSE SOUZA", "JOSE LIMA"])
+    atribuicao = app.atribuir_arquivos(["JOSE SOUZA", "JOSE PEREIRA"], "arquivos")
+    assert atribuicao.arquivos["JOSE SOUZA"][0] == "000 - JOSE SOUZA - CMDCA.PDF"
+    assert atribuicao.arquivos["JOSE PEREIRA"][0] == "001 - JOSE LIMA - CMDCA.PDF"
+
+
+# Melhor soma por força bruta (matrizes pequenas)
+def melhor_soma(pesos):
+    n, m = len(pesos), len(pesos[0])
+    if n > m:
+        return melhor_soma([list(coluna) for coluna in zip(*pesos)])
+    return max(sum(pesos[i][j] for i, j in enumerate(colunas)) for colunas in itertools.permutations(range(m), n))
+
+
+def test_atribuicao_otima_igual_a_forca_bruta():
+    aleatorio = random.Random(5)
+    for _ in range(200):
+        n, m = aleatorio.randint(1, 5), aleatorio.randint(1, 5)
+        pesos = [[aleatorio.choice([0.0, 0.0, aleatorio.random()]) for _ in range(m)] for _ in range(n)]
+        pares = app.atribuicao_otima(pesos)
+
+        assert len({i for i, _ in pares}) == len(pares) == len({j for _, j in pares})
+        assert all(pesos[i][j] > 0 for i, j in pares)  # Pares de peso zero não são devolvidos
+        assert abs(sum(pesos[i][j] for i, j in pares) - melhor_soma(pesos)) < 1e-9
+
+
+def test_atribuicao_otima_prefere_o_total_ao_melhor_individual():
+    # Guloso daria (0, 0) = 0.9 e deixaria a linha 1 sem par; o ótimo é 0.8 + 0.7
+    assert sorted(app.atribuicao_otima([[0.9, 0.8], [0.7, 0.0]])) == [(0, 1), (1, 0)]
+    assert app.atribuicao_otima([]) == []
+
+
+def test_candidatos_so_sao_registrados_com_debug(pasta, caplog):
+    criar_pdfs("arquivos", ["JOSE SOUZA", "JOSE LIMA"])
+    with caplog.at_level(logging.INFO):
+        app.atribuir_arquivos(["JOSE SOUZA"], "arquivos")
+    assert not any("Candidato" in registro.getMessage() for registro in caplog.records)
+
+    with caplog.at_level(logging.DEBUG):
+        app.atribuir_arquivos(["JOSE SOUZA"], "arquivos")
+    mensagens = [registro.getMessage() for registro in caplog.records if registro.levelno == logging.DEBUG]
+    assert "  Analisando: JOSE SOUZA" in mensagens
+    assert any("000 - JOSE SOUZA - CMDCA.PDF" in mensagem for mensagem in mensagens)
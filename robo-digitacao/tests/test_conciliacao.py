@@ -0,0 +1,23 @@
+import app
+
+
+def item(linha, cpf, valor):
+    return app.ItemPlano(linha, f"NOME {linha}", cpf, valor, f"arquivos/{linha}.pdf", "01/01/2024", "02/01/2024")
+
+
+def test_valor_em_centavos():
+    assert app.valor_em_centavos("R$ 1.500,50") == 150050
+    assert app.valor_em_centavos("1.500") == 150000
+    assert app.valor_em_centavos("R$ 2.000") == 200000
+    assert app.valor_em_centavos("1500,5") == 150050
+    assert app.valor_em_centavos("1500.75") == 150075
+    assert app.valor_em_centavos("") is None
+
+
+def test_conciliar_plano_com_valor_sem_centavos_na_tabela():
+    plano = app.PlanoExecucao((item(2, "52998224725", "1500,00"), item(3, "52998224725", "1500,00"), item(4, "11144477735", "2000,00")), (), None)
+    lancados = [("529.982.247-25", "202407", "1.500"), ("111.444.777-35", "202407", "R$ 2.000,01")]
+    pendentes, ja_lancados = app.conciliar_plano(plano, lancados, "202407")
+    # Um lançamento cobre uma única linha repetida; valor diferente não concilia
+    assert [i.linha for i in ja_lancados] == [2]
+    assert [i.linha for i in pendentes.itens] == [3, 4]
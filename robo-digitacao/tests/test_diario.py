@@ -0,0 +1,60 @@
+import app
+
+
+def item(linha, cpf="52998224725", valor="100,00"):
+    return app.ItemPlano(linha, f"NOME {linha}", cpf, valor, f"arquivos/{linha}.pdf", "01/01/2024", "02/01/2024")
+
+
+def plano(*itens):
+    return app.PlanoExecucao(tuple(itens), (), None)
+
+
+def test_linha_truncada_e_descartada_e_o_proximo_registro_nao_se_perde(pasta):
+    itens = plano(item(2), item(3, cpf="11144477735"))
+    diario = app.DiarioExecucao("abc", str(pasta))
+    diario.preparar(itens)
+    diario.registrar(itens.itens[0], "salvo")
+    diario.registrar(itens.itens[1], "salvo")
+
+    # Queda do processo no meio da gravação do último registro
+    conteudo = open(diario.caminho, "rb").read()
+    with open(diario.caminho, "wb") as f:
+        f.write(conteudo[:-15])
+
+    retomado = app.DiarioExecucao("abc", str(pasta))
+    retomado.preparar(itens)
+    assert retomado.estados == {retomado.chave(itens.itens[0]): "salvo"}
+    assert open(retomado.caminho, "rb").read().endswith(b"\n")
+
+    retomado.registrar(itens.itens[1], "erro", "falhou")
+    relido = app.DiarioExecucao("abc", str(pasta))
+    relido.preparar(itens)
+    assert relido.estados[relido.chave(itens.itens[1])] == "erro"
+    assert relido.filtrar_pendentes(itens, modo_simulacao=False)[0].itens == (itens.itens[1],)
+
+
+def test_linhas_repetidas_tem_chaves_distintas(pasta):
+    repetidas = plano(item(2), item(3))  # Mesmo CPF e valor
+    diario = app.DiarioExecucao("abc", str(pasta))
+    diario.preparar(repetidas)
+    diario.registrar(repetidas.itens[0], "salvo")
+    pendentes, pulados = diario.filtrar_pendentes(repetidas, modo_simulacao=False)
+    assert pulados == 1 and pendentes.itens == (repetidas.itens[1],)
+
+
+def test_diario_separa_espaco_e_parceria(pasta):
+    itens = plano(item(2))
+    diario = app.DiarioExecucao.para_execucao("hash", "equipe-a", "10", "20", diretorio_logs=str(pasta))
+    diario.preparar(itens)
+    diario.registrar(itens.itens[0], "salvo")
+
+    # A mesma planilha em outro espaço ou para outra parceria começa do zero
+    for espaco, parceria in [("equipe-b", "20"), ("equipe-a", "21")]:
+        outro = app.DiarioExecucao.para_execucao("hash", espaco, "10", parceria, diretorio_logs=str(pasta))
+        outro.preparar(itens)
+        assert outro.caminho != diario.caminho and outro.chave(itens.itens[0]) != diario.chave(itens.itens[0])
+        assert outro.filtrar_pendentes(itens, modo_simulacao=False) == (itens, 0)
+
+    mesmo = app.DiarioExecucao.para_execucao("hash", "equipe-a", "10", "20", diretorio_logs=str(pasta))
+    mesmo.preparar(itens)
+    assert mesmo.filtrar_pendentes(itens, modo_simulacao=False)[1] == 1
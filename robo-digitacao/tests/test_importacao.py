@@ -0,0 +1,33 @@
+import json
+import subprocess
+import sys
+
+import benchmark
+
+# Mesmo orçamento padrão do `python benchmark.py --importacao`
+ORCAMENTO_IMPORTACAO = 0.5
+
+
+def medir_importacao(pasta):
+    saida = subprocess.run(
+        [sys.executable, "-c", benchmark.CODIGO_IMPORTACAO, benchmark.DIRETORIO_ROBO, *benchmark.MODULOS_PESADOS],
+        cwd=pasta, capture_output=True, text=True, check=True
+    )
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def test_importar_app_nao_carrega_modulos_pesados(tmp_path):
+    medicao = medir_importacao(tmp_path)
+    assert medicao["carregados"] == []
+
+
+def test_importar_app_dentro_do_orcamento(tmp_path):
+    # Melhor de 3, como no benchmark: a primeira importação paga o cache de disco e de bytecode
+    melhor = min(medir_importacao(tmp_path)["tempo"] for _ in range(3))
+    assert melhor <= ORCAMENTO_IMPORTACAO, f"import app levou {melhor:.3f}s (orçamento {ORCAMENTO_IMPORTACAO}s)"
+
+
+def test_importar_app_nao_cria_arquivos(tmp_path):
+    # Sem efeitos colaterais na importação (processos filhos do spawn reimportam o app.py)
+    medir_importacao(tmp_path)
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,102 @@
+import queue
+import threading
+
+import app
+
+
+def item(linha):
+    return app.ItemPlano(linha, f"NOME {linha}", "52998224725", "10,00", f"arquivos/{linha}.pdf", "01/01/2024", "02/01/2024")
+
+
+def test_progresso_do_lote_e_acumulado_entre_as_abas(pasta, monkeypatch):
+    # Worker falso: consome a fila sem navegador, contando como o worker real
+    def worker_falso(numero, fila, parametros, resultados, progresso, lock):
+        while True:
+            try:
+                proximo = fila.get_nowait()
+            except queue.Empty:
+                return
+            with lock:
+                resultados.append({"linha": proximo.linha, "nome": proximo.nome, "arquivo": proximo.arquivo, "status": "simulado",
+                                   "erro": None, "worker": numero, "duracao": 0})
+                progresso["processados"] += 1
+            parametros["canal"].linha_concluida(numero, proximo.nome, "simulado")
+
+    iniciados = []
+    canal = app.CanalProgresso(espaco="teste")
+    iniciar = canal.iniciar
+    monkeypatch.setattr(canal, "iniciar", lambda job_id, total: (iniciados.append(total), iniciar(job_id, total)))
+    monkeypatch.setattr(app, "executar_worker", worker_falso)
+
+    etapas = [
+        app.EtapaLote("Janeiro", "4", "11", app.PlanoExecucao([item(1), item(2), item(3)], [], None), None),
+        app.EtapaLote("Fevereiro", "4", "12", app.PlanoExecucao([item(4), item(5)], [], None), None),
+    ]
+    parametros = {"canal": canal, "preverificar": False, "conciliar": False, "job_id": "lote"}
+    progresso = {}
+    relatorio = app.processar_lote(etapas, parametros, num_workers=2, progresso=progresso)
+
+    assert iniciados == [5]
+    assert progresso["processados"] == 5 and progresso["total"] == 5
+    evento = canal.desde(0)[-1]
+    assert (evento["status"], evento["processados"], evento["total"]) == ("finalizado", 5, 5)
+    assert relatorio["resumo"] == {"simulado": 5}
+
+
+def test_pool_guarda_os_navegadores_reservados_pelo_lote(monkeypatch):
+    encerrados = []
+    monkeypatch.setattr(app, "driver_vivo", lambda driver: True)
+    monkeypatch.setattr(app, "encerrar_driver", encerrados.append)
+
+    class Driver:
+        _chave_sessao = ("url", "usuario", True, False)
+
+    gerenciador = app.GerenciadorSessoes()
+    drivers = [Driver() for _ in range(app.MAX_SESSOES_OCIOSAS + 2)]
+    with gerenciador.reservar(len(drivers)):
+        for driver in drivers:
+            gerenciador.devolver(driver)
+        assert len(gerenciador.status()) == len(drivers)
+        assert encerrados == []
+
+    # Fim do lote: o excedente acima de MAX_SESSOES_OCIOSAS é encerrado
+    assert len(gerenciador.status()) == app.MAX_SESSOES_OCIOSAS
+    assert len(encerrados) == 2
+
+
+# Progresso que só aceita alterações com o lock da execução
+class ProgressoComLock(dict):
+    def __init__(self, lock):
+        super().__init__(processados=0, total=2)
+        self.lock = lock
+
+    def __setitem__(self, chave, valor):
+        assert self.lock.locked(), f"progresso['{chave}'] alterado fora do lock"
+        super().__setitem__(chave, valor)
+
+
+def test_linhas_retiradas_contam_no_progresso_dentro_do_lock(monkeypatch):
+    lock = threading.Lock()
+    workers = []
+
+    def worker_falso(numero, fila, parametros, resultados, progresso, lock_worker):
+        workers.append(lock_worker)
+        with lock_worker:
+            while not fila.empty():
+                proximo = fila.get_nowait()
+                resultados.append({"linha": proximo.linha, "nome": proximo.nome, "arquivo": proximo.arquivo, "status": "simulado",
+                                   "erro": None, "worker": numero, "duracao": 0})
+                progresso["processados"] += 1
+
+    plano = app.PlanoExecucao((item(1), item(2)), (), None)
+    monkeypatch.setattr(app, "preverificar_plano", lambda plano, parametros: (plano._replace(itens=plano.itens[1:]), [(plano.itens[0], "PDF corrompido")]))
+    monkeypatch.setattr(app, "executar_worker", worker_falso)
+    monkeypatch.setattr(app, "gravar_resumo_tempos", lambda tempos, resumo: None)
+
+    progresso = ProgressoComLock(lock)
+    parametros = {"canal": app.CanalProgresso(espaco="teste"), "preverificar": True, "conciliar": False, "em_lote": True, "lock_progresso": lock}
+    relatorio = app.processar_plano(plano, parametros, resultados=[], progresso=progresso)
+
+    assert workers == [lock]
+    assert progresso["processados"] == 2
+    assert relatorio["resumo"] == {"pdf_invalido": 1, "simulado": 1}
@@ -0,0 +1,76 @@
+import random
+
+import pandas as pd
+import pytest
+
+import app
+import benchmark
+
+
+# Cálculo escalar dos dígitos verificadores, para conferir a versão vetorizada
+def cpf_valido(cpf):
+    if len(cpf) != 11 or not cpf.isdigit() or len(set(cpf)) == 1:
+        return False
+    digitos = [int(c) for c in cpf]
+    for posicao in (9, 10):
+        soma = sum(d * p for d, p in zip(digitos[:posicao], range(posicao + 1, 1, -1)))
+        if soma * 10 % 11 % 10 != digitos[posicao]:
+            return False
+    return True
+
+
+def test_validar_cpfs_confere_com_o_calculo_escalar():
+    random.seed(1)
+    cpfs = [benchmark.gerar_cpf() for _ in range(200)]
+    cpfs += [cpf[:10] + str((int(cpf[10]) + 1) % 10) for cpf in cpfs[:50]]  # Segundo dígito errado
+    cpfs += ["11111111111", "00000000000", "123", "", "5299822472"]
+    validos = app.validar_cpfs(pd.Series(cpfs))
+    assert list(validos) == [cpf_valido(cpf) for cpf in cpfs]
+    assert validos[:200].all()
+
+
+def test_validar_cpfs_sem_nenhum_com_11_digitos():
+    assert list(app.validar_cpfs(pd.Series(["", "123"]))) == [False, False]
+
+
+def test_normalizar_planilha():
+    df = pd.DataFrame({
+        "NOME": ["  José  da   Silva ", None, "Ana"],
+        "cpf": ["529.982.247-25", "111.111.111-11", None],
+        "Valor": ["R$ 1.500,5", "1500.75", "abc"],
+    })
+    registros = app.normalizar_planilha(df)
+
+    assert list(registros.linha) == [2, 3, 4]  # Linha no Excel, após o cabeçalho
+    assert list(registros.nome) == ["José  da   Silva", "", "Ana"]
+    assert list(registros.nome_normalizado) == ["JOSE DA SILVA", "", "ANA"]
+    assert list(registros.cpf) == ["52998224725", "11111111111", ""]
+    assert list(registros.cpf_valido) == [True, False, False]
+    assert list(registros.valor_formatado) == ["1500,50", "1500,75", ""]
+    assert registros.valor[0] == 1500.5
+
+
+def test_normalizar_planilha_com_colunas_numericas():
+    # Excel lê CPF e valor como números: os zeros à esquerda do CPF são recuperados
+    df = pd.DataFrame({"Nome": ["Ana", "Bia"], "CPF": [1144477735, None], "Valor": [1820.5, 0]})
+    registros = app.normalizar_planilha(df)
+    assert list(registros.cpf) == ["01144477735", ""]
+    assert list(registros.valor_formatado) == ["1820,50", ""]
+    assert registros.nome_normalizado[0] == app.normalizar_nome("Ana")
+
+
+def test_normalizar_planilha_sem_coluna():
+    with pytest.raises(KeyError, match="valor"):
+        app.normalizar_planilha(pd.DataFrame({"Nome": [], "CPF": []}))
+
+
+def test_converter_valores_com_ponto_de_milhar():
+    valores = app.converter_valores(pd.Series(["1.500", "R$ 2.000", "2.000.000", "1.500,5", "1500.75", "1.5", "abc", None]))
+    assert list(valores[:6]) == [1500.0, 2000.0, 2000000.0, 1500.5, 1500.75, 1.5]
+    assert valores[6:].isna().all()
+    assert list(app.formatar_valores(valores[:2])) == ["1500,00", "2000,00"]
+
+
+def test_limpar_cpfs_completa_zeros_em_coluna_mista():
+    cpfs = app.limpar_cpfs(pd.Series([1144477735, 1144477735.0, "011.444.777-35", "1144477735", None], dtype=object))
+    assert list(cpfs) == ["01144477735"] * 4 + [""]
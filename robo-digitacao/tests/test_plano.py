@@ -0,0 +1,61 @@
+import os
+import threading
+
+import pandas as pd
+
+import app
+
+
+def planilha(linhas):
+    return pd.DataFrame(linhas, columns=["Nome", "CPF", "Valor"])
+
+
+def criar_pdfs(nomes):
+    os.makedirs("arquivos", exist_ok=True)
+    for i, nome in enumerate(nomes):
+        open(os.path.join("arquivos", f"{i:03d} - {nome} - CMDCA.PDF"), "w").close()
+
+
+def test_linhas_com_cpf_ou_valor_invalido_ficam_fora_do_plano(pasta):
+    criar_pdfs(["ANA SOUZA", "JOSE LIMA", "MARIA ROCHA"])
+    df = planilha([
+        ["Ana Souza", "529.982.247-25", "1.500,50"],
+        ["José Lima", "529.982.247-24", "1500"],
+        ["Maria Rocha", "52998224725", ""],
+    ])
+    plano = app.montar_plano_execucao(df, "2024-07-24", "2024-08-11", "arquivos")
+
+    assert [item.nome for item in plano.itens] == ["Ana Souza"]
+    assert plano.faltando == ()
+    assert plano.invalidos == (
+        "José Lima (linha 3): CPF com dígito verificador inválido",
+        "Maria Rocha (linha 4): Valor ausente ou inválido",
+    )
+    assert app.plano_para_json(plano)["invalidos"] == list(plano.invalidos)
+
+
+def test_verificar_arquivos_recusa_planilha_com_linha_invalida(pasta):
+    criar_pdfs(["ANA SOUZA"])
+    df = planilha([["Ana Souza", "123456789012", "100"]])
+    canal = app.CanalProgresso(espaco="teste")
+    assert app.verificar_arquivos(df, "2024-07-24", "2024-08-11", "arquivos", canal) is None
+    assert any("CPF com 12 dígito(s)" in m["texto"] for e in canal.desde(0) for m in e["mensagens"])
+
+
+def test_esperas_ficam_no_coletor_de_cada_execucao():
+    coletores = [app.ColetorTempos(), app.ColetorTempos()]
+
+    # Execuções simultâneas (um thread cada) não misturam nem zeram as esperas uma da outra
+    def executar(coletor, segundos, atingiu_limite):
+        app._contexto_execucao.coletor = coletor
+        app.registrar_espera("upload", segundos, atingiu_limite)
+        app._contexto_execucao.coletor = None
+
+    threads = [threading.Thread(target=executar, args=args) for args in [(coletores[0], 1.0, True), (coletores[1], 3.0, False)]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert coletores[0].esperas() == {"upload": {"media": 1.0, "maximo": 1.0, "contagem": 1, "limite_atingido": 1}}
+    assert coletores[1].esperas() == {"upload": {"media": 3.0, "maximo": 3.0, "contagem": 1, "limite_atingido": 0}}
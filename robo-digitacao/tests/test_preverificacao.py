@@ -0,0 +1,63 @@
+import os
+
+import app
+import benchmark
+import processamento_pdf
+
+
+def test_pool_roda_fora_do_lock_e_o_cache_evita_reabrir(pasta, gerar_pdf, monkeypatch):
+    pre = app.PreVerificacaoPDFs(str(pasta / "preverificacao"))
+    pre.preparar()
+    valido = gerar_pdf(pasta / "valido.pdf", paginas=2)
+    corrompido = pasta / "corrompido.pdf"
+    corrompido.write_bytes(b"%PDF-1.4 truncado")
+
+    inspecionar = processamento_pdf.inspecionar_pdfs
+    chamadas = []
+
+    def inspecionar_sem_lock(tarefas, processos=None):
+        assert not pre._lock.locked()  # Outra verificação pode ler e gravar o cache enquanto esta roda
+        chamadas.append(len(tarefas))
+        return inspecionar(tarefas, 1)
+
+    monkeypatch.setattr(processamento_pdf, "inspecionar_pdfs", inspecionar_sem_lock)
+    resultados = pre.verificar([valido, str(corrompido)])
+    assert resultados[valido]["valido"] and resultados[valido]["paginas"] == 2
+    assert resultados[valido]["enviar"] == valido
+    assert not resultados[str(corrompido)]["valido"]
+
+    # Mesmo conteúdo, nova instância: vem do cache.json, sem abrir os PDFs de novo
+    outra = app.PreVerificacaoPDFs(str(pasta / "preverificacao"))
+    outra.preparar()
+    monkeypatch.setattr(processamento_pdf, "inspecionar_pdfs", lambda tarefas, processos=None: chamadas.append(len(tarefas)) or [])
+    assert outra.verificar([valido])[valido]["paginas"] == 2
+    assert chamadas == [2]
+
+
+def test_arquivo_ausente_e_recusado(pasta):
+    pre = app.PreVerificacaoPDFs(str(pasta / "preverificacao"))
+    pre.preparar()
+    resultado = pre.verificar([str(pasta / "nao_existe.pdf")])[str(pasta / "nao_existe.pdf")]
+    assert resultado["valido"] is False and resultado["enviar"] is None
+
+
+def test_recomprimido_e_enviado_com_o_nome_do_pdf_original(pasta, monkeypatch):
+    pre = app.PreVerificacaoPDFs(str(pasta / "preverificacao"))
+    pre.preparar()
+    monkeypatch.setattr(app, "pre_verificacao_pdfs", pre)
+    monkeypatch.setattr(processamento_pdf, "inspecionar_pdfs", lambda tarefas, processos=None: processamento_pdf.inspecionar_lote(tarefas))
+
+    # Conteúdo sem compressão acima do limite: a recompressão reduz o arquivo
+    os.makedirs("arquivos")
+    originais = [os.path.join("arquivos", f"{i:03d} - {nome} - CMDCA.PDF") for i, nome in enumerate(["ANA SOUZA", "JOSE LIMA"])]
+    for caminho in originais:
+        benchmark.gerar_pdf(caminho, "A" * 200_000)  # Mesmo conteúdo com nomes diferentes
+
+    itens = tuple(app.ItemPlano(i + 2, "NOME", "52998224725", "10,00", caminho, "", "") for i, caminho in enumerate(originais))
+    plano, recusados = app.preverificar_plano(app.PlanoExecucao(itens, (), None), {"limite_pdf_mb": 0.05})
+
+    assert recusados == []
+    for item, original in zip(plano.itens, originais):
+        assert item.arquivo_envio and item.arquivo_envio != original
+        assert os.path.basename(item.arquivo_envio) == os.path.basename(original)
+        assert os.path.getsize(item.arquivo_envio) < os.path.getsize(original)
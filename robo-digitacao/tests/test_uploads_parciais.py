@@ -0,0 +1,124 @@
+import hashlib
+import io
+import os
+import time
+import zipfile
+
+import pytest
+
+import app
+
+
+def impressao(conteudo):
+    return hashlib.sha256(conteudo[:app.TAMANHO_IMPRESSAO_UPLOAD]).hexdigest()
+
+
+def iniciar(cliente, espaco, conteudo):
+    resposta = cliente.post(f"/upload_zip?espaco={espaco}", json={"nome": "pdfs.zip", "tamanho": len(conteudo), "impressao": impressao(conteudo)})
+    return resposta.get_json()["upload"]
+
+
+# A extração roda em segundo plano depois do último bloco: consulta o GET até ela terminar
+def aguardar_extracao(cliente, url):
+    for _ in range(200):
+        upload = cliente.get(url).get_json()["upload"]
+        if upload["status"] != "extraindo":
+            return upload
+        time.sleep(0.05)
+    raise AssertionError("extração não terminou")
+
+
+def test_envio_de_outro_espaco_responde_404(cliente):
+    app.espacos_trabalho.criar("outro")
+    upload = iniciar(cliente, "padrao", b"x" * 10)
+    url = f"/upload_zip/{upload['upload_id']}"
+
+    assert cliente.get(f"{url}?espaco=padrao").status_code == 200
+    assert cliente.get(f"{url}?espaco=outro").status_code == 404
+    assert cliente.put(f"{url}?espaco=outro", data=b"x" * 10, headers={"X-Offset": "0"}).status_code == 404
+    assert app.uploads_parciais.obter(upload["upload_id"])["recebido"] == 0
+
+
+def zip_com_pdf(pasta, gerar_pdf):
+    pdf = gerar_pdf(pasta / "recibo.pdf")
+    caminho = pasta / "pdfs.zip"
+    with zipfile.ZipFile(caminho, "w") as arquivo_zip:
+        arquivo_zip.write(pdf, "lote/001 - ana souza - cmdca.pdf")
+    return caminho.read_bytes()
+
+
+def test_blocos_fora_de_ordem_respondem_409_e_o_envio_retoma(cliente, pasta, gerar_pdf, monkeypatch):
+    armazem = app.ArmazemObjetos(str(pasta / "objetos"))
+    armazem.preparar()
+    monkeypatch.setattr(app, "armazem_objetos", armazem)
+    conteudo = zip_com_pdf(pasta, gerar_pdf)
+    meio = len(conteudo) // 2
+    upload = iniciar(cliente, "padrao", conteudo)
+    url = f"/upload_zip/{upload['upload_id']}?espaco=padrao"
+
+    resposta = cliente.put(url, data=conteudo[:meio], headers={"X-Offset": "0"})
+    assert resposta.status_code == 200 and resposta.get_json()["upload"]["recebido"] == meio
+
+    # Bloco repetido (resposta perdida na rede) e bloco adiantado: 409 com o ponto de retomada
+    for deslocamento in (0, meio + 10):
+        resposta = cliente.put(url, data=conteudo[:10], headers={"X-Offset": str(deslocamento)})
+        assert resposta.status_code == 409
+        assert resposta.get_json()["upload"]["recebido"] == meio
+    assert cliente.put(url, data=b"", headers={"X-Offset": "abc"}).status_code == 400
+
+    # Reabrir o mesmo arquivo no mesmo espaço devolve o envio incompleto
+    assert iniciar(cliente, "padrao", conteudo)["upload_id"] == upload["upload_id"]
+
+    resposta = cliente.put(url, data=conteudo[meio:], headers={"X-Offset": str(meio)})
+    assert resposta.get_json()["upload"]["status"] == "extraindo"
+    final = aguardar_extracao(cliente, url)
+    assert final["status"] == "concluido"
+    assert os.listdir(app.espacos_trabalho.obter("padrao").diretorio) == ["001 - ANA SOUZA - CMDCA.PDF"]
+    assert not os.path.exists(app.uploads_parciais.caminho_zip(upload["upload_id"]))
+
+
+def test_bloco_interrompido_e_descartado(pasta):
+    uploads = app.UploadsParciais(str(pasta / "uploads"))
+    uploads.preparar()
+    estado = uploads.iniciar("pdfs.zip", 10, "padrao")
+    estado, aceito = uploads.receber_bloco(estado["upload_id"], 0, io.BytesIO(b"abcd"))
+    assert aceito and estado["recebido"] == 4
+
+    # Bytes gravados no .part além do `recebido` (queda no meio de um bloco) são sobrescritos
+    with open(uploads.caminho_zip(estado["upload_id"]), "ab") as f:
+        f.write(b"lixo")
+    estado, aceito = uploads.receber_bloco(estado["upload_id"], 4, io.BytesIO(b"efghij"))
+    assert aceito and estado["status"] == "extraindo"
+    assert open(uploads.caminho_zip(estado["upload_id"]), "rb").read() == b"abcdefghij"
+
+
+def test_outro_arquivo_com_mesmo_nome_e_tamanho_nao_retoma_o_envio(cliente):
+    upload = iniciar(cliente, "padrao", b"a" * 10)
+    outro = iniciar(cliente, "padrao", b"b" * 10)
+    assert outro["upload_id"] != upload["upload_id"]
+
+    # Impressão que não confere com os bytes recebidos encerra o envio em vez de misturar arquivos
+    url = f"/upload_zip/{upload['upload_id']}?espaco=padrao"
+    resposta = cliente.put(url, data=b"b" * 10, headers={"X-Offset": "0"})
+    assert resposta.get_json()["upload"]["status"] == "erro"
+    assert not os.path.exists(app.uploads_parciais.caminho_zip(upload["upload_id"]))
+
+
+def test_zip_acima_dos_limites_e_recusado_sem_extrair(cliente, pasta, monkeypatch):
+    caminho = pasta / "bomba.zip"
+    with zipfile.ZipFile(caminho, "w", zipfile.ZIP_DEFLATED) as arquivo_zip:
+        arquivo_zip.writestr("001 - ANA SOUZA - CMDCA.PDF", b"\0" * 1_000_000)
+    conteudo = caminho.read_bytes()
+    upload = iniciar(cliente, "padrao", conteudo)
+    url = f"/upload_zip/{upload['upload_id']}?espaco=padrao"
+
+    cliente.put(url, data=conteudo, headers={"X-Offset": "0"})
+    final = aguardar_extracao(cliente, url)
+    assert final["status"] == "erro" and "taxa de compressão" in final["relatorio"]["erro"]
+    assert os.listdir(app.espacos_trabalho.obter("padrao").diretorio) == []
+
+    monkeypatch.setattr(app, "LIMITE_ZIP_DESCOMPACTADO", 999_999)
+    with zipfile.ZipFile(caminho) as arquivo_zip:
+        entradas = arquivo_zip.infolist()
+    with pytest.raises(ValueError, match="descompactado"):
+        app.verificar_limites_zip(entradas)